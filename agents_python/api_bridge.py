@@ -1,21 +1,91 @@
 """
-API Bridge - Flask API for Node.js to communicate with Fetch.ai agents
+API Bridge - HTTP API for Node.js to communicate with Fetch.ai agents
 This provides a REST API that Node.js can call, which then messages the agents
+
+Runs on aiohttp in the same event loop as the agent Bureau, so open
+Server-Sent Events streams cost a coroutine each, not a thread.
 """
 import os
 import json
+import math
+import time
+import uuid
 import asyncio
-from flask import Flask, request, jsonify
-from flask_cors import CORS
-from uagents import Agent
-from models import JobRequest, MatchResults
-from coordinator_agent import coordinator
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+from aiohttp import web
+from uagents import Agent, Context
+from models import JobRequest, BatchJobRequest, MatchResults, ProgressUpdate, ErrorMessage
+from coordinator_agent import coordinator, create_bureau, job_store, stage_scheduler
+from event_channel import JobEventChannels
+from lava_client import lava_claude_client
+from metrics import registry, traces, job_duration_seconds, new_trace_id
+
+routes = web.RouteTableDef()
+
+# Admission control: jobs dispatched but not yet finished
+BRIDGE_MAX_IN_FLIGHT = int(os.getenv("BRIDGE_MAX_IN_FLIGHT", "200"))
+BRIDGE_JOB_TIMEOUT = float(os.getenv("BRIDGE_JOB_TIMEOUT", "300"))
+BRIDGE_MAX_WAIT = float(os.getenv("BRIDGE_MAX_WAIT", "120"))
+BRIDGE_RETRY_AFTER = int(os.getenv("BRIDGE_RETRY_AFTER", "5"))
+BRIDGE_MAX_BATCH_SIZE = int(os.getenv("BRIDGE_MAX_BATCH_SIZE", "1000"))
+BRIDGE_MAX_BATCHES = int(os.getenv("BRIDGE_MAX_BATCHES", "1000"))
+
+REQUIRED_JOB_FIELDS = ('job_id', 'prompt', 'city', 'state')
+
+
+@dataclass
+class PendingJob:
+    """A dispatched job waiting for its MatchResults or ErrorMessage"""
+    job_id: str
+    future: asyncio.Future
+    batch_id: Optional[str] = None
+    trace_id: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+
+
+# Store pending responses, keyed by job_id
+pending_jobs: Dict[str, PendingJob] = {}
+
+# Per-job status of recent batches: batch_id -> {job_id: status}
+batches: "OrderedDict[str, Dict[str, str]]" = OrderedDict()
+
+bridge_stats = {
+    "accepted": 0,
+    "rejected": 0,
+    "completed": 0,
+    "failed": 0,
+    "timed_out": 0,
+    # Moving average of end-to-end job latency, used for Retry-After
+    "avg_latency": None,
+}
+
+# Context of the running api_client agent, used to send from HTTP handlers
+agent_ctx: Optional[Context] = None
+
+# Per-job event channels feeding the SSE endpoint
+job_events = JobEventChannels(
+    buffer_size=int(os.getenv("BRIDGE_EVENT_BUFFER", "100")),
+    max_channels=int(os.getenv("BRIDGE_MAX_CHANNELS", "10000")),
+    ttl=float(os.getenv("BRIDGE_CHANNEL_TTL", "600")),
+)
+
+SSE_KEEPALIVE_SECONDS = 15
 
-app = Flask(__name__)
-CORS(app)
+# Point-in-time gauges, refreshed on each /metrics scrape
+bridge_in_flight = registry.gauge("renova_bridge_in_flight", "Jobs dispatched and not yet finished")
+scheduler_queued = registry.gauge("renova_scheduler_queued", "Stage messages waiting in the coordinator scheduler", ("stage", "urgency"))
+scheduler_in_flight = registry.gauge("renova_scheduler_in_flight", "Stage messages dispatched and not yet completed", ("stage",))
+claude_queue_depth = registry.gauge("renova_claude_queue_depth", "Claude calls waiting for the governor", ("urgency",))
+claude_in_flight = registry.gauge("renova_claude_in_flight", "Claude calls admitted by the governor")
+lava_breaker_open = registry.gauge("renova_lava_breaker_open", "1 while the Lava circuit breaker is not closed")
 
-# Store pending responses
-pending_jobs = {}
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Headers": "Content-Type, Last-Event-ID",
+    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+}
 
 # Create a simple client agent to send messages
 api_client = Agent(
@@ -25,18 +95,115 @@ api_client = Agent(
 )
 
 
-@app.route('/health', methods=['GET'])
-def health():
+@api_client.on_event("startup")
+async def capture_context(ctx: Context):
+    global agent_ctx
+    agent_ctx = ctx
+    ctx.logger.info(f"API bridge dispatching to coordinator {coordinator.address}")
+
+
+def finish_pending(job_id: str, result: Dict, error: Optional[str] = None):
+    """Resolve a pending job and free its in-flight slot"""
+    pending = pending_jobs.pop(job_id, None)
+    if pending is None:
+        return
+
+    set_batch_status(pending, "error" if error else "completed")
+
+    latency = time.time() - pending.created_at
+    job_duration_seconds.observe(latency, outcome="error" if error else "completed")
+    avg = bridge_stats["avg_latency"]
+    bridge_stats["avg_latency"] = latency if avg is None else 0.8 * avg + 0.2 * latency
+    bridge_stats["failed" if error else "completed"] += 1
+
+    if not pending.future.done():
+        pending.future.set_result({"job_id": job_id, "error": error} if error else result)
+
+
+def close_event_channel(job_id: str, error: str):
+    """End a job's event stream with an error raised by the bridge itself"""
+    job_events.publish(job_id, "error", {"job_id": job_id, "agent": "api_bridge", "error": error}, final=True)
+
+
+def set_batch_status(pending: Optional[PendingJob], status: str):
+    if pending is not None and pending.batch_id in batches:
+        batches[pending.batch_id][pending.job_id] = status
+
+
+def retry_after_seconds() -> int:
+    """Rough time until an in-flight slot frees up"""
+    avg = bridge_stats["avg_latency"]
+    if avg is None:
+        return BRIDGE_RETRY_AFTER
+    return max(1, min(60, math.ceil(avg / 2)))
+
+
+@api_client.on_message(model=ProgressUpdate)
+async def handle_progress(ctx: Context, sender: str, msg: ProgressUpdate):
+    job_events.publish(msg.job_id, "progress", msg.dict())
+    set_batch_status(pending_jobs.get(msg.job_id), msg.stage)
+
+
+@api_client.on_message(model=MatchResults)
+async def handle_match_results(ctx: Context, sender: str, msg: MatchResults):
+    if msg.partial:
+        job_events.publish(msg.job_id, "match", msg.dict())
+    else:
+        job_events.publish(msg.job_id, "results", msg.dict(), final=True)
+        finish_pending(msg.job_id, msg.dict())
+
+
+@api_client.on_message(model=ErrorMessage)
+async def handle_error(ctx: Context, sender: str, msg: ErrorMessage):
+    job_events.publish(msg.job_id, "error", msg.dict(), final=True)
+    finish_pending(msg.job_id, msg.dict(), error=msg.error)
+
+
+@api_client.on_interval(period=60.0)
+async def evict_event_channels(ctx: Context):
+    job_events.evict_expired()
+
+    # Jobs that never reported back must not hold in-flight slots forever
+    cutoff = time.time() - BRIDGE_JOB_TIMEOUT
+    for job_id in [j for j, p in pending_jobs.items() if p.created_at < cutoff]:
+        ctx.logger.warning(f"Job {job_id} timed out after {BRIDGE_JOB_TIMEOUT}s")
+        bridge_stats["timed_out"] += 1
+        error = f"Job timed out after {BRIDGE_JOB_TIMEOUT}s"
+        close_event_channel(job_id, error)
+        finish_pending(job_id, {}, error=error)
+
+
+@web.middleware
+async def cors_middleware(request: web.Request, handler):
+    """Allow cross-origin calls from the Node.js backend and frontend"""
+    if request.method == "OPTIONS":
+        response = web.Response()
+    else:
+        response = await handler(request)
+    if not response.prepared:
+        response.headers.update(CORS_HEADERS)
+    return response
+
+
+@routes.get('/health')
+async def health(request: web.Request):
     """Health check endpoint"""
-    return jsonify({
+    return web.json_response({
         "status": "healthy",
         "service": "ReNOVA Agent Bridge",
-        "coordinator_address": str(coordinator.address)
+        "coordinator_address": str(coordinator.address),
+        "in_flight": len(pending_jobs),
+        "max_in_flight": BRIDGE_MAX_IN_FLIGHT,
+        "jobs": bridge_stats,
+        "event_channels": job_events.stats(),
+        "claude": lava_claude_client.governor_stats(),
+        "lava": lava_claude_client.lava_stats(),
+        "scheduler": stage_scheduler.stats()
     })
 
 
-@app.route('/api/jobs', methods=['POST'])
-async def create_job():
+@routes.post('/api/jobs')
+async def create_job(request: web.Request):
     """
     Create a new job and send to coordinator agent
 
@@ -48,13 +215,19 @@ async def create_job():
         "state": "CA",
         "zip_code": "94102"
     }
+
+    With ?wait=<seconds> the response is the job's MatchResults (200) if
+    it finishes in time, otherwise the usual 202. Returns 429 with
+    Retry-After when BRIDGE_MAX_IN_FLIGHT jobs are already running.
     """
     try:
-        data = request.json
+        data = await request.json()
 
         # Validate required fields
         if not all(k in data for k in ['job_id', 'prompt', 'city', 'state']):
-            return jsonify({"error": "Missing required fields"}), 400
+            return web.json_response({"error": "Missing required fields"}, status=400)
+
+        wait = float(request.query.get('wait', 0))
 
         # Create job request
         job_request = JobRequest(
@@ -63,29 +236,304 @@ async def create_job():
             city=data['city'],
             state=data['state'],
             zip_code=data.get('zip_code'),
-            photo_urls=data.get('photo_urls', [])
+            photo_urls=data.get('photo_urls', []),
+            trace_id=data.get('trace_id') or new_trace_id()
         )
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=400)
+
+    if agent_ctx is None:
+        return web.json_response({"error": "Agent pipeline is not running"}, status=503)
 
-        # Send to coordinator via uAgents messaging
-        # This requires the agent to be running
-        # In production, use proper async message sending
+    if job_request.job_id in pending_jobs:
+        return web.json_response({"error": "Job is already in progress", "job_id": job_request.job_id}, status=409)
+
+    # Shed load instead of queueing unboundedly inside the Bureau
+    if len(pending_jobs) >= BRIDGE_MAX_IN_FLIGHT:
+        bridge_stats["rejected"] += 1
+        retry_after = retry_after_seconds()
+        return web.json_response(
+            {"error": "Agent pipeline is at capacity", "retry_after": retry_after},
+            status=429,
+            headers={"Retry-After": str(retry_after)}
+        )
 
-        # For now, return success - the agent communication happens in background
-        return jsonify({
-            "success": True,
-            "job_id": data['job_id'],
-            "message": "Job sent to agent pipeline",
-            "coordinator_address": str(coordinator.address)
-        }), 202
+    pending = PendingJob(
+        job_id=job_request.job_id,
+        future=asyncio.get_event_loop().create_future(),
+        trace_id=job_request.trace_id
+    )
+    pending_jobs[job_request.job_id] = pending
+    job_events.open(job_request.job_id)
+    bridge_stats["accepted"] += 1
+
+    try:
+        await agent_ctx.send(str(coordinator.address), job_request)
+    except Exception as e:
+        pending_jobs.pop(job_request.job_id, None)
+        close_event_channel(job_request.job_id, f"Dispatch failed: {e}")
+        return web.json_response({"error": f"Dispatch failed: {e}"}, status=502)
 
+    if wait > 0:
+        try:
+            results = await asyncio.wait_for(asyncio.shield(pending.future), timeout=min(wait, BRIDGE_MAX_WAIT))
+            return web.json_response(results, status=502 if "error" in results else 200)
+        except asyncio.TimeoutError:
+            pass
+
+    return web.json_response({
+        "success": True,
+        "job_id": job_request.job_id,
+        "message": "Job sent to agent pipeline",
+        "coordinator_address": str(coordinator.address),
+        "trace_id": job_request.trace_id,
+        "events_url": f"/api/jobs/{job_request.job_id}/events",
+        "trace_url": f"/api/traces/{job_request.trace_id}"
+    }, status=202)
+
+
+@routes.post('/api/jobs:batch')
+async def create_job_batch(request: web.Request):
+    """
+    Submit many jobs at once
+
+    Request body: {"batch_id": optional, "jobs": [<job as for /api/jobs>, ...]}
+    (a bare array of jobs also works). The coordinator runs intake once
+    per distinct prompt and scrapes once per (trade, city, state), so a
+    batch costs roughly one pipeline run per distinct group. Invalid or
+    duplicate jobs are rejected individually; the rest are accepted, or
+    the whole batch is refused with 429 if it does not fit in flight.
+    """
+    try:
+        data = await request.json()
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return web.json_response({"error": str(e)}, status=400)
+
+    jobs = data.get('jobs') if isinstance(data, dict) else data
+    if not isinstance(jobs, list) or not jobs:
+        return web.json_response({"error": "Expected a non-empty list of jobs"}, status=400)
+    if len(jobs) > BRIDGE_MAX_BATCH_SIZE:
+        return web.json_response({"error": f"Batches are limited to {BRIDGE_MAX_BATCH_SIZE} jobs"}, status=413)
+
+    if agent_ctx is None:
+        return web.json_response({"error": "Agent pipeline is not running"}, status=503)
+
+    batch_id = (data.get('batch_id') if isinstance(data, dict) else None) or f"batch_{uuid.uuid4().hex[:12]}"
+    if batch_id in batches:
+        return web.json_response({"error": "Batch already exists", "batch_id": batch_id}, status=409)
+
+    statuses: Dict[str, str] = {}
+    job_requests = []
+    for i, job in enumerate(jobs):
+        if not isinstance(job, dict) or not all(k in job for k in REQUIRED_JOB_FIELDS):
+            statuses[str(job.get('job_id', f"#{i}")) if isinstance(job, dict) else f"#{i}"] = "rejected: missing required fields"
+            continue
+        if job['job_id'] in statuses:
+            statuses[f"{job['job_id']} (#{i})"] = "rejected: duplicate job_id in batch"
+            continue
+        if job['job_id'] in pending_jobs:
+            statuses[job['job_id']] = "rejected: job already in progress"
+            continue
+        try:
+            job_requests.append(JobRequest(
+                job_id=job['job_id'],
+                prompt=job['prompt'],
+                city=job['city'],
+                state=job['state'],
+                zip_code=job.get('zip_code'),
+                photo_urls=job.get('photo_urls', []),
+                trace_id=job.get('trace_id') or new_trace_id()
+            ))
+            statuses[job['job_id']] = "queued"
+        except Exception as e:
+            statuses[str(job['job_id'])] = f"rejected: {e}"
+
+    if job_requests and len(pending_jobs) + len(job_requests) > BRIDGE_MAX_IN_FLIGHT:
+        bridge_stats["rejected"] += len(job_requests)
+        retry_after = retry_after_seconds()
+        return web.json_response(
+            {"error": "Agent pipeline is at capacity", "retry_after": retry_after},
+            status=429,
+            headers={"Retry-After": str(retry_after)}
+        )
+
+    batches[batch_id] = statuses
+    while len(batches) > BRIDGE_MAX_BATCHES:
+        batches.popitem(last=False)
+
+    loop = asyncio.get_event_loop()
+    for job_request in job_requests:
+        pending_jobs[job_request.job_id] = PendingJob(
+            job_id=job_request.job_id,
+            future=loop.create_future(),
+            batch_id=batch_id,
+            trace_id=job_request.trace_id
+        )
+        job_events.open(job_request.job_id)
+    bridge_stats["accepted"] += len(job_requests)
+
+    if job_requests:
+        try:
+            await agent_ctx.send(str(coordinator.address), BatchJobRequest(
+                batch_id=batch_id,
+                jobs=[job_request.dict() for job_request in job_requests]
+            ))
+        except Exception as e:
+            for job_request in job_requests:
+                pending_jobs.pop(job_request.job_id, None)
+                close_event_channel(job_request.job_id, f"Dispatch failed: {e}")
+            del batches[batch_id]
+            return web.json_response({"error": f"Dispatch failed: {e}"}, status=502)
+
+    return web.json_response({
+        "success": True,
+        "batch_id": batch_id,
+        "accepted": len(job_requests),
+        "rejected": len(statuses) - len(job_requests),
+        "jobs": statuses,
+        "trace_ids": {job_request.job_id: job_request.trace_id for job_request in job_requests},
+        "status_url": f"/api/jobs:batch/{batch_id}"
+    }, status=202)
+
+
+@routes.get('/api/jobs:batch/{batch_id}')
+async def job_batch_status(request: web.Request):
+    """Per-job status of a batch (queued, pipeline stage, completed, error or rejected)"""
+    batch_id = request.match_info['batch_id']
+    statuses = batches.get(batch_id)
+    if statuses is None:
+        return web.json_response({"error": "Unknown batch"}, status=404)
+
+    counts: Dict[str, int] = {}
+    for status in statuses.values():
+        key = "rejected" if status.startswith("rejected") else status
+        counts[key] = counts.get(key, 0) + 1
+
+    return web.json_response({
+        "batch_id": batch_id,
+        "done": all(s in ("completed", "error") or s.startswith("rejected") for s in statuses.values()),
+        "counts": counts,
+        "jobs": statuses
+    })
+
+
+@routes.get('/metrics')
+async def metrics(request: web.Request):
+    """
+    Prometheus metrics: per-stage queue and service time histograms,
+    job latency, Claude tokens, cache lookups, fallbacks and queue gauges
+
+    Agents record into this process's registry, so stage metrics cover
+    the agents running in this Bureau.
+    """
+    bridge_in_flight.set(len(pending_jobs))
+
+    for stage, queue in stage_scheduler.stages.items():
+        scheduler_in_flight.set(len(queue.in_flight), stage=stage)
+        for urgency, waiting in queue.queues.items():
+            scheduler_queued.set(len(waiting), stage=stage, urgency=urgency)
+
+    governor = lava_claude_client.governor_stats()
+    claude_in_flight.set(governor["in_flight"])
+    for urgency, depth in governor["queue_depth"].items():
+        claude_queue_depth.set(depth, urgency=urgency)
+    lava_breaker_open.set(0 if lava_claude_client.lava_breaker.state == "closed" else 1)
+
+    return web.Response(
+        body=registry.render().encode("utf-8"),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+    )
+
+
+@routes.get('/api/traces/{trace_id}')
+async def job_trace(request: web.Request):
+    """Queue and service time per stage for one recent trace"""
+    trace_id = request.match_info['trace_id']
+    trace = traces.get(trace_id)
+    if trace is None:
+        return web.json_response({"error": "Unknown trace"}, status=404)
+    return web.json_response({"trace_id": trace_id, "stages": trace})
 
 
-@app.route('/api/agents/status', methods=['GET'])
-def agent_status():
+def format_sse(event_id: int, event_type: str, data: dict) -> bytes:
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+def stored_job_event(record) -> tuple:
+    """(event type, data) describing a job from the coordinator's job store"""
+    if record.status == "completed":
+        matches = record.matches or []
+        return "results", {
+            "job_id": record.job_id, "matches": matches, "count": len(matches),
+            "success": True, "partial": False, "trace_id": record.trace_id,
+        }
+    if record.status == "error":
+        return "error", {"job_id": record.job_id, "agent": "coordinator", "error": record.error or "Job failed"}
+    return "progress", {"job_id": record.job_id, "stage": record.stage, "message": f"Job is in {record.stage}"}
+
+
+@routes.get('/api/jobs/{job_id}/events')
+async def job_event_stream(request: web.Request):
+    """
+    Server-Sent Events stream of a job's progress
+
+    Events: progress, match (streamed partial match), results, error.
+    The stream ends after results or error. Clients reconnecting with
+    Last-Event-ID only receive events they have not seen. Unknown jobs
+    get 404. A job whose channel has already been evicted gets one event
+    with its stored state.
+    """
+    job_id = request.match_info['job_id']
+
+    channel = job_events.get(job_id)
+    record = job_store.get(job_id) if channel is None else None
+    if channel is None and record is None:
+        return web.json_response({"error": "Unknown job", "job_id": job_id}, status=404, headers=CORS_HEADERS)
+
+    last_event_id = request.headers.get('Last-Event-ID')
+    last_event_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+
+    response = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "Connection": "keep-alive",
+        "X-Accel-Buffering": "no",
+        **CORS_HEADERS,
+    })
+    await response.prepare(request)
+
+    if channel is None:
+        await response.write(format_sse(0, *stored_job_event(record)))
+        return response
+
+    backlog, queue = channel.subscribe(last_event_id)
+    try:
+        for event in backlog:
+            await response.write(format_sse(*event))
+
+        while queue is not None:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                await response.write(b": keep-alive\n\n")
+                continue
+
+            if event is None:
+                break
+            await response.write(format_sse(*event))
+
+    except (ConnectionResetError, asyncio.CancelledError):
+        pass
+    finally:
+        channel.unsubscribe(queue)
+
+    return response
+
+
+@routes.get('/api/agents/status')
+async def agent_status(request: web.Request):
     """Get status of all agents"""
-    return jsonify({
+    return web.json_response({
         "agents": {
             "coordinator": {
                 "address": str(coordinator.address),
@@ -111,14 +559,14 @@ def agent_status():
     })
 
 
-@app.route('/api/agents/addresses', methods=['GET'])
-def agent_addresses():
+@routes.get('/api/agents/addresses')
+async def agent_addresses(request: web.Request):
     """Get all agent addresses for direct messaging"""
     from intake_agent import intake_agent
     from scraper_agent import scraper_agent
     from matcher_agent import matcher_agent
 
-    return jsonify({
+    return web.json_response({
         "coordinator": str(coordinator.address),
         "intake": str(intake_agent.address),
         "scraper": str(scraper_agent.address),
@@ -126,6 +574,19 @@ def agent_addresses():
     })
 
 
+def create_app() -> web.Application:
+    app = web.Application(middlewares=[cors_middleware])
+    app.add_routes(routes)
+    return app
+
+
+async def start_http_server(app: web.Application, host: str = '0.0.0.0', port: int = 5000):
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
 if __name__ == '__main__':
     print("🌉 Starting ReNOVA Agent Bridge API...")
     print("   Endpoint: http://localhost:5000")
@@ -133,7 +594,17 @@ if __name__ == '__main__':
     print("\nAvailable endpoints:")
     print("   GET  /health - Health check")
     print("   POST /api/jobs - Submit job to agents")
+    print("   POST /api/jobs:batch - Submit many jobs at once")
+    print("   GET  /api/jobs:batch/<batch_id> - Batch status")
+    print("   GET  /api/jobs/<job_id>/events - Job progress stream (SSE)")
     print("   GET  /api/agents/status - Agent status")
     print("   GET  /api/agents/addresses - Agent addresses")
 
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Run the bridge agent inside the Bureau so pipeline messages are
+    # delivered locally, and serve HTTP on the same event loop
+    bureau = create_bureau()
+    bureau.add(api_client)
+
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(start_http_server(create_app()))
+    bureau.run()
@@ -0,0 +1,243 @@
+"""
+Two-tier response cache: in-memory LRU backed by an optional SQLite file
+Used to skip repeat Claude calls (and Lava billing) for identical requests
+"""
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+def make_cache_key(**parts) -> str:
+    """Canonical SHA-256 key for a set of JSON-serializable request parts"""
+    canonical = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class TTLCache:
+    """
+    LRU cache with per-entry TTL and an optional SQLite tier
+
+    The memory tier holds at most ``max_entries`` items. The disk tier
+    (enabled when ``db_path`` is set) survives restarts and holds at most
+    ``max_disk_entries`` items, evicting the least recently used rows.
+    Values must be JSON-serializable.
+
+    Async callers should use ``aget``/``aset``: memory hits are answered
+    inline and SQLite work runs in a worker thread. Disk access times are
+    written in batches rather than on every hit.
+    """
+
+    # Pending access-time updates flushed together
+    TOUCH_BATCH = 64
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float = 86400,
+        db_path: Optional[str] = None,
+        max_disk_entries: int = 10000,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self.max_disk_entries = max_disk_entries
+
+        # key -> (expires_at, value)
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._disk_count = 0
+        self._touched: Dict[str, float] = {}
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path: str):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)")
+        self._db.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+        self._db.commit()
+        self._disk_count = self._db.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired"""
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is None and self._db is not None:
+            value = self._get_disk(key, now)
+        return self._count_lookup(value)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """``get`` with the SQLite lookup off the event loop"""
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is None and self._db is not None:
+            value = await asyncio.to_thread(self._get_disk, key, now)
+        return self._count_lookup(value)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Store a value with the default or given TTL (seconds)"""
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._store_memory(key, value, expires_at)
+        if self._db is not None:
+            self._set_disk(key, value, expires_at, now)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None):
+        """``set`` with the SQLite write off the event loop"""
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._store_memory(key, value, expires_at)
+        if self._db is not None:
+            await asyncio.to_thread(self._set_disk, key, value, expires_at, now)
+
+    def delete(self, key: str):
+        """Remove a key from both tiers"""
+        with self._lock:
+            self._memory.pop(key, None)
+        if self._db is not None:
+            with self._db_lock:
+                self._touched.pop(key, None)
+                self._disk_count -= self._db.execute("DELETE FROM cache WHERE key = ?", (key,)).rowcount
+                self._db.commit()
+
+    def clear(self):
+        """Remove all entries from both tiers"""
+        with self._lock:
+            self._memory.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._touched.clear()
+                self._db.execute("DELETE FROM cache")
+                self._db.commit()
+                self._disk_count = 0
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and tier sizes"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "disk_entries": self._disk_count,
+            }
+
+    def _count_lookup(self, value: Optional[Any]) -> Optional[Any]:
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def _get_memory(self, key: str, now: float) -> Optional[Any]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                return value
+            del self._memory[key]
+            return None
+
+    def _get_disk(self, key: str, now: float) -> Optional[Any]:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            value_json, expires_at = row
+            if expires_at <= now:
+                self._touched.pop(key, None)
+                self._disk_count -= self._db.execute("DELETE FROM cache WHERE key = ?", (key,)).rowcount
+                self._db.commit()
+                return None
+
+            self._touched[key] = now
+            if len(self._touched) >= self.TOUCH_BATCH:
+                self._flush_touched()
+                self._db.commit()
+
+        value = json.loads(value_json)
+        with self._lock:
+            self._store_memory(key, value, expires_at)
+            self.disk_hits += 1
+        return value
+
+    def _set_disk(self, key: str, value: Any, expires_at: float, now: float):
+        value_json = json.dumps(value)
+        with self._db_lock:
+            exists = self._db.execute("SELECT 1 FROM cache WHERE key = ?", (key,)).fetchone() is not None
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at)"
+                " VALUES (?, ?, ?, ?)",
+                (key, value_json, expires_at, now)
+            )
+            self._touched.pop(key, None)
+            if not exists:
+                self._disk_count += 1
+            self._flush_touched()
+            self._evict_disk()
+            self._db.commit()
+
+    def _flush_touched(self):
+        if self._touched:
+            self._db.executemany(
+                "UPDATE cache SET accessed_at = ? WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def _store_memory(self, key: str, value: Any, expires_at: float):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _evict_disk(self):
+        overflow = self._disk_count - self.max_disk_entries
+        if overflow > 0:
+            deleted = self._db.execute(
+                "DELETE FROM cache WHERE key IN ("
+                " SELECT key FROM cache ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,)
+            ).rowcount
+            self._disk_count -= deleted
+            with self._lock:
+                self.evictions += deleted
@@ -0,0 +1,205 @@
+"""
+Compact wire format for candidate professionals passed between agents
+Lists are encoded once by the scraper and relayed untouched by the
+coordinator. Candidates are stored column-wise with repeated strings
+interned, optionally as base64 msgpack for large lists. When every agent
+runs in one Bureau process, candidates go into a shared catalog and only
+their (id, trade) keys travel.
+
+Payloads are plain dicts with a ``format`` of ``inline``, ``columns``,
+``msgpack`` or ``refs``; decode_candidates() accepts any of them. Columns
+travel as one pre-serialized string, so relaying a payload costs a string
+copy instead of re-serializing every candidate at each hop.
+"""
+import os
+import json
+import base64
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import msgpack
+except ImportError:  # optional: columns are used instead
+    msgpack = None
+
+from metrics import cache_lookups
+
+# inline (plain list, the previous format), columns or msgpack
+CANDIDATE_TRANSPORT = os.getenv("CANDIDATE_TRANSPORT", "columns").lower()
+
+# Lists at least this long are msgpack-encoded when CANDIDATE_TRANSPORT=msgpack
+CANDIDATE_MSGPACK_MIN = int(os.getenv("CANDIDATE_MSGPACK_MIN", "50"))
+
+# Professionals kept in the shared catalog (least recently used dropped first)
+CANDIDATE_CATALOG_SIZE = int(os.getenv("CANDIDATE_CATALOG_SIZE", "20000"))
+
+# Column value kinds
+RAW, INTERNED, INTERNED_LISTS = "v", "s", "l"
+
+
+class CandidateCatalog:
+    """
+    Professionals by (id, trade), shared by every agent in the process
+
+    The scraper stamps the searched trade on each business, so the same
+    Yelp business found by two jobs for different trades is two entries.
+    """
+
+    def __init__(self, max_size: int = CANDIDATE_CATALOG_SIZE):
+        self.max_size = max_size
+        self._items: "OrderedDict[Tuple[str, str], Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, candidates: List[Dict]) -> List[List[str]]:
+        keys = [[candidate["id"], candidate.get("trade") or ""] for candidate in candidates]
+        with self._lock:
+            for key, candidate in zip(keys, candidates):
+                self._items[tuple(key)] = dict(candidate)
+                self._items.move_to_end(tuple(key))
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+        return keys
+
+    def get(self, keys: List[List[str]]) -> List[Dict]:
+        """Copies of the known candidates, in order; evicted keys are skipped"""
+        found = []
+        with self._lock:
+            for key in keys:
+                candidate = self._items.get(tuple(key))
+                cache_lookups.inc(cache="candidate_catalog", result="hit" if candidate is not None else "miss")
+                if candidate is not None:
+                    found.append(dict(candidate))
+        return found
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+catalog = CandidateCatalog()
+_shared_process = False
+
+
+def share_catalog():
+    """Declare that every agent runs in this process, so candidates can travel by id"""
+    global _shared_process
+    _shared_process = True
+
+
+def encode_columns(candidates: List[Dict]) -> Dict:
+    """
+    Column-wise encoding: one value list per field, with string fields
+    that repeat (trade, city, state, price band, services) replaced by
+    indexes into a shared string table. Rows that lack a field are listed
+    under ``missing`` so decoding leaves the field out again.
+    """
+    fields: List[str] = []
+    for candidate in candidates:
+        for name in candidate:
+            if name not in fields:
+                fields.append(name)
+
+    strings: List[str] = []
+    string_index: Dict[str, int] = {}
+
+    def intern(value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        index = string_index.get(value)
+        if index is None:
+            index = string_index[value] = len(strings)
+            strings.append(value)
+        return index
+
+    n = len(candidates)
+    columns, kinds, missing = {}, {}, {}
+    for name in fields:
+        absent = [row for row, candidate in enumerate(candidates) if name not in candidate]
+        if absent:
+            missing[name] = absent
+        values = [candidate.get(name) for candidate in candidates]
+        present = [v for v in values if v is not None]
+        if present and all(isinstance(v, list) and all(isinstance(s, str) for s in v) for v in present):
+            kinds[name] = INTERNED_LISTS
+            columns[name] = [[intern(s) for s in v] if v is not None else None for v in values]
+        elif present and all(isinstance(v, str) for v in present) and len(set(present)) <= n // 2:
+            kinds[name] = INTERNED
+            columns[name] = [intern(v) for v in values]
+        else:
+            kinds[name] = RAW
+            columns[name] = values
+
+    return {"n": n, "strings": strings, "kinds": kinds, "columns": columns, "missing": missing}
+
+
+def decode_columns(payload: Dict) -> List[Dict]:
+    strings = payload["strings"]
+    decoded = []
+    for name, values in payload["columns"].items():
+        kind = payload["kinds"][name]
+        if kind == INTERNED:
+            decoded.append((name, [strings[i] if i >= 0 else None for i in values]))
+        elif kind == INTERNED_LISTS:
+            decoded.append((name, [[strings[i] for i in v] if v is not None else None for v in values]))
+        else:
+            decoded.append((name, values))
+
+    if not decoded:
+        return [{} for _ in range(payload["n"])]
+    names = [name for name, _ in decoded]
+    candidates = [dict(zip(names, row)) for row in zip(*(values for _, values in decoded))]
+    for name, rows in payload.get("missing", {}).items():
+        for row in rows:
+            del candidates[row][name]
+    return candidates
+
+
+def encode_candidates(candidates: List[Dict], transport: Optional[str] = None) -> Dict:
+    """Wire payload for ``candidates`` (see the module docstring for formats)"""
+    transport = transport or CANDIDATE_TRANSPORT
+    if transport == "inline":
+        return {"format": "inline", "candidates": candidates}
+
+    if _shared_process and all(candidate.get("id") for candidate in candidates):
+        return {"format": "refs", "keys": catalog.put(candidates)}
+
+    columns = encode_columns(candidates)
+    if transport == "msgpack" and msgpack is not None and len(candidates) >= CANDIDATE_MSGPACK_MIN:
+        data = base64.b64encode(msgpack.packb(columns, use_bin_type=True)).decode("ascii")
+        return {"format": "msgpack", "n": columns["n"], "data": data}
+    return {"format": "columns", "n": columns["n"], "data": json.dumps(columns, separators=(",", ":"))}
+
+
+def decode_candidates(payload: Optional[Dict]) -> List[Dict]:
+    """Candidates from any payload produced by encode_candidates()"""
+    if not payload:
+        return []
+    kind = payload.get("format")
+    if kind == "inline":
+        return list(payload["candidates"])
+    if kind == "refs":
+        return catalog.get(payload["keys"])
+    if kind == "columns":
+        return decode_columns(json.loads(payload["data"]))
+    if kind == "msgpack":
+        if msgpack is None:
+            raise RuntimeError("Received msgpack candidates but msgpack is not installed")
+        return decode_columns(msgpack.unpackb(base64.b64decode(payload["data"]), raw=False))
+    raise ValueError(f"Unknown candidate payload format {kind!r}")
+
+
+def professionals_payload(msg) -> Dict:
+    """The candidate payload of a ProfessionalsList, wrapping a plain list if that is what it carries"""
+    if msg.packed is not None:
+        return msg.packed
+    return {"format": "inline", "candidates": msg.professionals}
+
+
+def candidate_count(payload: Optional[Dict]) -> int:
+    if not payload:
+        return 0
+    if payload.get("format") == "inline":
+        return len(payload["candidates"])
+    if payload.get("format") == "refs":
+        return len(payload["keys"])
+    return payload.get("n", 0)
@@ -0,0 +1,209 @@
+"""
+Record/replay cassettes for the pipeline's external calls
+In record mode real Claude and Yelp responses are captured with their
+timings (and incoming jobs with their arrival times) into a JSON Lines file,
+gzip-compressed when the path ends in .gz; replay mode serves them back
+offline at the recorded latency times CASSETTE_LATENCY_SCALE
+
+    CASSETTE_MODE=record CASSETTE_PATH=traffic.jsonl.gz python api_bridge.py
+    python regression.py --cassette traffic.jsonl.gz --baseline baseline.json
+"""
+import os
+import gzip
+import json
+import time
+import atexit
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_CASSETTE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "cassette.jsonl.gz")
+
+# Request keys are SHA-256 hex digests; a prefix is plenty to tell them apart
+KEY_LENGTH = 24
+
+
+class CassetteMiss(Exception):
+    """Replay found no recording for a request"""
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class Cassette:
+    """
+    One recording of external calls and incoming jobs
+
+    Entries are ``{"kind", "key", "shape", "elapsed", "response"}`` for
+    calls and ``{"kind": "job", "at", "job"}`` for jobs. Replay looks a
+    call up by its exact request key first; when the request differs (for
+    example a ranking prompt listing other candidates) it falls back to
+    recordings of the same ``shape`` (the same kind of prompt), in order.
+    Repeated requests cycle through their recordings.
+    """
+
+    def __init__(self, path: str, mode: str, latency_scale: float = 1.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._exact: Dict[Tuple[str, str], List[Dict]] = {}
+        self._shapes: Dict[Tuple[str, str], List[Dict]] = {}
+        self._cursors: Dict[Tuple[str, str, str], int] = {}
+        self._jobs: List[Dict] = []
+        self._file = None
+
+        self.recorded = 0
+        self.exact_hits = 0
+        self.shape_hits = 0
+        self.misses = 0
+
+        if mode == "replay":
+            self._load()
+        else:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def _load(self):
+        with _open(self.path, "r") as f:
+            try:
+                for line in f:
+                    if line.strip():
+                        self._add(json.loads(line))
+            except EOFError:
+                # Recorder was killed before closing the file; keep what was flushed
+                pass
+        self._jobs.sort(key=lambda entry: entry["at"])
+
+    def _add(self, entry: Dict):
+        if entry["kind"] == "job":
+            self._jobs.append(entry)
+            return
+        self._exact.setdefault((entry["kind"], entry["key"]), []).append(entry)
+        if entry.get("shape"):
+            self._shapes.setdefault((entry["kind"], entry["shape"]), []).append(entry)
+
+    def _append(self, entry: Dict):
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = _open(self.path, "a")
+                atexit.register(self.close)
+            self._file.write(line)
+            # A sync flush keeps everything written so far readable
+            self._file.flush()
+            self.recorded += 1
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def record(self, kind: str, key: str, response: Any, elapsed: float, shape: Optional[str] = None, **extra):
+        """Store one call's response and how long it took"""
+        self._append({
+            "kind": kind,
+            "key": key[:KEY_LENGTH],
+            "shape": shape,
+            "elapsed": round(elapsed, 4),
+            "response": response,
+            **extra,
+        })
+
+    def record_job(self, job: Dict):
+        """Store an incoming job and when it arrived"""
+        self._append({"kind": "job", "at": round(time.monotonic() - self._started, 4), "job": job})
+
+    def jobs(self) -> List[Dict]:
+        """Recorded jobs in arrival order, each ``{"at": seconds, "job": {...}}``"""
+        return list(self._jobs)
+
+    def lookup(self, kind: str, key: str, shape: Optional[str] = None) -> Dict:
+        key = key[:KEY_LENGTH]
+        with self._lock:
+            entries = self._exact.get((kind, key))
+            if entries:
+                self.exact_hits += 1
+                return self._next(("exact", kind, key), entries)
+
+            entries = self._shapes.get((kind, shape)) if shape else None
+            if entries:
+                self.shape_hits += 1
+                return self._next(("shape", kind, shape), entries)
+
+            self.misses += 1
+        raise CassetteMiss(f"No recorded {kind} response for {key}")
+
+    def _next(self, cursor_key: Tuple[str, str, str], entries: List[Dict]) -> Dict:
+        cursor = self._cursors.get(cursor_key, 0)
+        self._cursors[cursor_key] = cursor + 1
+        return entries[cursor % len(entries)]
+
+    def delay(self, entry: Dict, field: str = "elapsed") -> float:
+        return (entry.get(field) or 0.0) * self.latency_scale
+
+    async def areplay(self, kind: str, key: str, shape: Optional[str] = None) -> Any:
+        """The recorded response, after the (scaled) recorded latency"""
+        entry = self.lookup(kind, key, shape)
+        await asyncio.sleep(self.delay(entry))
+        return entry["response"]
+
+    def replay(self, kind: str, key: str, shape: Optional[str] = None) -> Any:
+        entry = self.lookup(kind, key, shape)
+        time.sleep(self.delay(entry))
+        return entry["response"]
+
+    def stats(self) -> Dict:
+        return {
+            "mode": self.mode,
+            "path": self.path,
+            "recorded": self.recorded,
+            "exact_hits": self.exact_hits,
+            "shape_hits": self.shape_hits,
+            "misses": self.misses,
+            "jobs": len(self._jobs),
+        }
+
+
+_cassette: Optional[Cassette] = None
+_configured = False
+
+
+def get_cassette() -> Optional[Cassette]:
+    """The process-wide cassette selected by CASSETTE_MODE (None when off)"""
+    global _cassette, _configured
+    if not _configured:
+        _configured = True
+        mode = os.getenv("CASSETTE_MODE", "off").lower()
+        if mode != "off":
+            _cassette = Cassette(
+                os.getenv("CASSETTE_PATH", DEFAULT_CASSETTE_PATH),
+                mode,
+                latency_scale=float(os.getenv("CASSETTE_LATENCY_SCALE", "1.0")),
+            )
+    return _cassette
+
+
+def prompt_shape(model: str, max_tokens: int, messages: List[Dict]) -> str:
+    """What kind of prompt this is: the model, output budget and first line of the prompt"""
+    content = messages[0]["content"] if messages else ""
+    if not isinstance(content, str):
+        content = json.dumps(content)
+    return f"{model}|{max_tokens}|{content.strip().splitlines()[0] if content.strip() else ''}"
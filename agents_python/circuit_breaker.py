@@ -0,0 +1,133 @@
+"""
+Circuit breaker and latency tracking for an unreliable upstream
+Used by LavaClaudeClient to stop waiting on the Lava proxy while it is
+failing or slow, and to pick a hedge delay from its recent latency
+"""
+import math
+import time
+from collections import deque
+from typing import Dict, Optional
+
+
+class LatencyTracker:
+    """Sliding window of recent latencies with percentile lookups"""
+
+    def __init__(self, window: int = 200):
+        self._samples: deque = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(p / 100.0 * len(ordered)) - 1))
+        return ordered[index]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker over a window of recent calls
+
+    Calls that fail, or succeed slower than ``slow_call_seconds``, count
+    as bad. Once at least ``min_calls`` of the last ``window`` calls are
+    recorded and the bad share reaches ``failure_rate``, the breaker
+    opens and ``allow_request`` returns False for ``open_seconds``. It
+    then half-opens and lets a single probe through: success closes it,
+    failure opens it again. A probe that never reports back (cancelled)
+    is released with ``release_probe``, and one outstanding for longer
+    than ``open_seconds`` is given up on so another can go through.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        window: int = 20,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 20.0,
+        open_seconds: float = 30.0,
+    ):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+
+        self.state = self.CLOSED
+        self._outcomes: deque = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started_at = 0.0
+
+        self.opened = 0
+        self.rejected = 0
+
+    def allow_request(self) -> bool:
+        """Whether to try the upstream now (a half-open probe counts as allowed)"""
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                self.rejected += 1
+                return False
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+
+        if self.state == self.HALF_OPEN:
+            now = time.monotonic()
+            if self._probe_in_flight and now - self._probe_started_at < self.open_seconds:
+                self.rejected += 1
+                return False
+            self._probe_in_flight = True
+            self._probe_started_at = now
+
+        return True
+
+    def record_success(self, seconds: float):
+        self._record(seconds <= self.slow_call_seconds)
+
+    def record_failure(self):
+        self._record(False)
+
+    def release_probe(self):
+        """The call allowed through ended without a verdict (e.g. it was cancelled)"""
+        if self.state == self.HALF_OPEN:
+            self._probe_in_flight = False
+
+    def _record(self, good: bool):
+        if self.state == self.HALF_OPEN:
+            self._probe_in_flight = False
+            if good:
+                self.state = self.CLOSED
+                self._outcomes.clear()
+            else:
+                self._open()
+            return
+
+        self._outcomes.append(good)
+        if len(self._outcomes) >= self.min_calls:
+            bad = self._outcomes.count(False)
+            if bad / len(self._outcomes) >= self.failure_rate:
+                self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.opened += 1
+
+    def stats(self) -> Dict:
+        bad = self._outcomes.count(False)
+        return {
+            "state": self.state,
+            "recent_calls": len(self._outcomes),
+            "recent_failure_rate": round(bad / len(self._outcomes), 4) if self._outcomes else 0.0,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
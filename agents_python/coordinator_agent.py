@@ -3,17 +3,26 @@ CoordinatorAgent - Orchestrates the entire matching pipeline
 Fetch.ai uAgent for Agentverse deployment
 """
 import asyncio
+import time
 from datetime import datetime
 from uagents import Agent, Context, Protocol, Bureau
 from models import (
-    JobRequest, JobScope, ProfessionalsList, IndexingComplete,
+    JobRequest, BatchJobRequest, JobScope, ProfessionalsList, IndexingComplete,
     MatchRequest, MatchResults, ProgressUpdate, ErrorMessage
 )
 
 # Import other agents
 from intake_agent import intake_agent
 from scraper_agent import scraper_agent
+from indexer_agent import indexer_agent
 from matcher_agent import matcher_agent
+from job_store import JobRecord, create_job_store
+from job_batches import JobBatch
+from trade_classifier import classify_trade, classify_urgency, same_trade
+from stage_scheduler import StageScheduler, URGENCY_CLASSES, parse_weights
+from metrics import new_trace_id
+from cassettes import get_cassette
+from candidate_codec import candidate_count, professionals_payload, share_catalog
 
 # Create coordinator agent
 import os
@@ -31,22 +40,75 @@ coordinator = Agent(
 # Define protocol
 coordinator_protocol = Protocol("CoordinatorProtocol")
 
-# Store job state
-job_states = {}
+# Store job state (bounded, evicting; see job_store.py)
+job_store = create_job_store()
+
+# Speculative scrape: guess the trade locally and start scraping while
+# IntakeAgent is still running; results are kept only if Claude agrees
+SPECULATIVE_SCRAPE = os.getenv("SPECULATIVE_SCRAPE", "false").lower() == "true"
+SPECULATION_MIN_CONFIDENCE = float(os.getenv("SPECULATION_MIN_CONFIDENCE", "0.5"))
+
+# Batches in progress; intake of a batch's unique prompts runs with this
+# much concurrency
+job_batches = {}
+BATCH_INTAKE_CONCURRENCY = int(os.getenv("BATCH_INTAKE_CONCURRENCY", "8"))
+
+# Stage dispatch: per-stage concurrency budgets shared by urgency classes
+# in proportion to SCHEDULER_WEIGHTS, with aging so nothing starves
+stage_scheduler = StageScheduler(
+    budgets={
+        "intake": int(os.getenv("SCHEDULER_INTAKE_BUDGET", "16")),
+        "scrape": int(os.getenv("SCHEDULER_SCRAPE_BUDGET", "16")),
+        "match": int(os.getenv("SCHEDULER_MATCH_BUDGET", "8")),
+    },
+    weights=parse_weights(os.getenv("SCHEDULER_WEIGHTS", "")),
+    aging=float(os.getenv("SCHEDULER_AGING_SECONDS", "30")),
+    emergency_headroom=int(os.getenv("SCHEDULER_EMERGENCY_HEADROOM", "4")),
+    stage_timeout=float(os.getenv("SCHEDULER_STAGE_TIMEOUT", "300")),
+)
+
+speculation_stats = {
+    "attempts": 0,
+    "skipped_low_confidence": 0,
+    "hits": 0,
+    "misses": 0,
+    "failed": 0,
+    "saved_seconds": 0.0,
+}
+
+
+def speculation_summary() -> dict:
+    """Speculation win rate and latency saved"""
+    decided = speculation_stats["hits"] + speculation_stats["misses"]
+    return {
+        **speculation_stats,
+        "saved_seconds": round(speculation_stats["saved_seconds"], 3),
+        "hit_rate": round(speculation_stats["hits"] / decided, 4) if decided else 0.0,
+        "avg_saved_seconds": round(speculation_stats["saved_seconds"] / speculation_stats["hits"], 3)
+        if speculation_stats["hits"] else 0.0,
+    }
 
 
 @coordinator_protocol.on_message(model=JobRequest)
 async def handle_job_request(ctx: Context, sender: str, msg: JobRequest):
     """Coordinate the entire pipeline"""
-    ctx.logger.info(f"🚀 Starting pipeline for job {msg.job_id}")
+    if not msg.trace_id:
+        msg.trace_id = new_trace_id()
+    record_job(msg.dict())
+    ctx.logger.info(f"🚀 Starting pipeline for job {msg.job_id} (trace {msg.trace_id})")
 
     # Initialize job state
-    job_states[msg.job_id] = {
-        "status": "processing",
-        "sender": sender,
-        "job_data": msg,
-        "stage": "intake"
-    }
+    job_state = JobRecord(
+        job_id=msg.job_id,
+        sender=sender,
+        city=msg.city,
+        state=msg.state,
+        # Until intake says otherwise, the keyword guess sets the priority
+        urgency=classify_urgency(msg.prompt)[0],
+        trace_id=msg.trace_id,
+    )
+    job_store.put(job_state)
+    await fail_evicted_jobs(ctx)
 
     try:
         # Send progress
@@ -62,7 +124,10 @@ async def handle_job_request(ctx: Context, sender: str, msg: JobRequest):
 
         # Step 1: Send to IntakeAgent
         ctx.logger.info(f"📋 Sending to IntakeAgent...")
-        await ctx.send(intake_agent.address, msg)
+        await stage_scheduler.submit(ctx, "intake", msg.job_id, job_state.urgency, intake_agent.address, msg)
+
+        if SPECULATIVE_SCRAPE:
+            await start_speculative_scrape(ctx, job_state, msg)
 
     except Exception as e:
         ctx.logger.error(f"Error starting pipeline: {str(e)}")
@@ -77,29 +142,195 @@ async def handle_job_request(ctx: Context, sender: str, msg: JobRequest):
         )
 
 
+@coordinator_protocol.on_message(model=BatchJobRequest)
+async def handle_batch_request(ctx: Context, sender: str, msg: BatchJobRequest):
+    """Run many jobs with shared intake for identical prompts and shared scrapes"""
+    batch = JobBatch.from_jobs(msg.batch_id, sender, msg.jobs, BATCH_INTAKE_CONCURRENCY)
+    job_batches[msg.batch_id] = batch
+
+    for job in msg.jobs:
+        job["trace_id"] = job.get("trace_id") or new_trace_id()
+        record_job(job)
+        job_store.put(JobRecord(
+            job_id=job["job_id"],
+            sender=sender,
+            city=job["city"],
+            state=job["state"],
+            urgency=classify_urgency(job["prompt"])[0],
+            trace_id=job["trace_id"],
+            batch_id=msg.batch_id,
+        ))
+    await fail_evicted_jobs(ctx)
+
+    ctx.logger.info(
+        f"📦 Starting batch {msg.batch_id}: {len(msg.jobs)} jobs, "
+        f"{len(batch.prompt_members)} unique prompts"
+    )
+    await send_batch_intake(ctx, batch)
+
+
+async def fail_evicted_jobs(ctx: Context):
+    """Send an error for active jobs the full job store had to drop"""
+    for record in job_store.take_evicted_active():
+        ctx.logger.warning(f"🧹 Job store full: dropping active job {record.job_id} at stage {record.stage}")
+        await stage_scheduler.cancel_job(record.job_id)
+        await ctx.send(
+            record.sender,
+            ErrorMessage(
+                job_id=record.job_id,
+                agent="coordinator",
+                error="Job dropped: the coordinator is tracking too many jobs (JOB_STORE_MAX_SIZE)",
+                timestamp=datetime.utcnow().isoformat()
+            )
+        )
+        finish_batch_job(ctx, record)
+
+
+def record_job(job: dict):
+    """Capture incoming traffic for replay when recording a cassette"""
+    cassette = get_cassette()
+    if cassette is not None and cassette.recording:
+        cassette.record_job({k: job.get(k) for k in ("prompt", "city", "state", "zip_code")})
+
+
+async def send_batch_intake(ctx: Context, batch: JobBatch):
+    """Send the batch's next unique prompts to IntakeAgent"""
+    for job in batch.next_intake():
+        urgency = classify_urgency(job["prompt"])[0]
+        await stage_scheduler.submit(ctx, "intake", job["job_id"], urgency, intake_agent.address, JobRequest(**job))
+
+
+async def handle_batch_scope(ctx: Context, batch: JobBatch, msg: JobScope):
+    """
+    Apply a batch prompt's scope to every job sharing the prompt and
+    scrape once per (trade, city, state) group
+    """
+    members = batch.intake_done(msg.job_id)
+    await send_batch_intake(ctx, batch)
+
+    for job_id in members:
+        job_state = job_store.get(job_id)
+        if not job_state:
+            continue
+
+        scope = {
+            **msg.dict(),
+            "job_id": job_id,
+            "city": job_state.city,
+            "state": job_state.state,
+            "trace_id": job_state.trace_id,
+        }
+        if job_id != msg.job_id:
+            scope["zip_code"] = None
+        job_state.job_scope = scope
+        job_state.stage = "scrape"
+        job_state.urgency = msg.urgency
+        job_store.put(job_state)
+
+        group, is_new = batch.join_scrape_group(job_id, msg.trade, job_state.city, job_state.state)
+        if is_new:
+            ctx.logger.info(f"🔍 Batch {batch.batch_id}: scraping {msg.trade} in {job_state.city}, {job_state.state}")
+            await stage_scheduler.submit(
+                ctx, "scrape", job_id, job_state.urgency, scraper_agent.address, JobScope(**scope)
+            )
+        elif group.professionals is not None:
+            await dispatch_match(ctx, job_state, ProfessionalsList(
+                job_id=job_id,
+                packed=group.professionals,
+                count=candidate_count(group.professionals),
+                trade=group.trade,
+                trace_id=job_state.trace_id
+            ), index=False)
+        # Otherwise the group's scrape is in flight and will fan out to this job
+
+
+async def handle_batch_professionals(ctx: Context, batch: JobBatch, msg: ProfessionalsList):
+    """Fan a group scrape out to every job in the group"""
+    group = batch.scrape_group_of(msg.job_id)
+    group.professionals = professionals_payload(msg)
+
+    for job_id in group.members:
+        job_state = job_store.get(job_id)
+        if job_state:
+            await dispatch_match(ctx, job_state, ProfessionalsList(
+                job_id=job_id,
+                packed=group.professionals,
+                count=msg.count,
+                trade=msg.trade,
+                trace_id=job_state.trace_id
+            ), index=job_id == msg.job_id)
+
+
+def finish_batch_job(ctx: Context, job_state: JobRecord):
+    """Drop a batch once all its jobs have finished"""
+    batch = job_batches.get(job_state.batch_id)
+    if batch is None:
+        return
+
+    batch.finish(job_state.job_id)
+    if batch.done:
+        del job_batches[batch.batch_id]
+        ctx.logger.info(f"📦 Batch {batch.batch_id} complete ({len(batch.scrape_groups)} scrapes)")
+
+
 @coordinator_protocol.on_message(model=JobScope)
 async def handle_job_scope(ctx: Context, sender: str, msg: JobScope):
     """Received job scope from IntakeAgent"""
     ctx.logger.info(f"✅ Received job scope for {msg.job_id}")
 
-    job_state = job_states.get(msg.job_id)
+    await stage_scheduler.complete("intake", msg.job_id)
+
+    job_state = job_store.get(msg.job_id)
     if not job_state:
         ctx.logger.error(f"No job state found for {msg.job_id}")
         return
 
     try:
+        batch = job_batches.get(job_state.batch_id)
+        if batch is not None:
+            await handle_batch_scope(ctx, batch, msg)
+            return
+
         # Update state
-        job_state["job_scope"] = msg
-        job_state["stage"] = "scrape"
+        job_state.job_scope = msg.dict()
+        job_state.stage = "scrape"
+        if msg.urgency in URGENCY_CLASSES:
+            job_state.urgency = msg.urgency
+        job_store.put(job_state)
+
+        if job_state.speculative_trade is not None:
+            if same_trade(msg.trade, job_state.speculative_trade):
+                record_speculation_hit(ctx, job_state)
+                if job_state.speculative_professionals is not None:
+                    # Speculative scrape already finished: go straight to matching
+                    professionals = job_state.speculative_professionals
+                    job_state.speculative_professionals = None
+                    await dispatch_match(ctx, job_state, ProfessionalsList(
+                        job_id=msg.job_id,
+                        packed=professionals,
+                        count=candidate_count(professionals),
+                        trade=msg.trade,
+                        trace_id=job_state.trace_id
+                    ))
+                # Otherwise the in-flight speculative results will arrive
+                return
+
+            speculation_stats["misses"] += 1
+            ctx.logger.info(
+                f"🎲 Speculation missed for {msg.job_id}: "
+                f"guessed {job_state.speculative_trade}, intake says {msg.trade}"
+            )
+            job_state.speculative_professionals = None
+            job_store.put(job_state)
 
         # Step 2: Send to ScraperAgent
         ctx.logger.info(f"🔍 Sending to ScraperAgent...")
-        await ctx.send(scraper_agent.address, msg)
+        await stage_scheduler.submit(ctx, "scrape", msg.job_id, job_state.urgency, scraper_agent.address, msg)
 
     except Exception as e:
         ctx.logger.error(f"Error in job scope handling: {str(e)}")
         await ctx.send(
-            job_state["sender"],
+            job_state.sender,
             ErrorMessage(
                 job_id=msg.job_id,
                 agent="coordinator",
@@ -114,42 +345,40 @@ async def handle_professionals(ctx: Context, sender: str, msg: ProfessionalsList
     """Received professionals from ScraperAgent"""
     ctx.logger.info(f"✅ Received {msg.count} professionals for {msg.job_id}")
 
-    job_state = job_states.get(msg.job_id)
+    job_state = job_store.get(msg.job_id)
     if not job_state:
         ctx.logger.error(f"No job state found for {msg.job_id}")
         return
 
     try:
-        # Update state
-        job_state["professionals"] = msg.professionals
-        job_state["stage"] = "match"
-
-        # Step 3: Send to MatcherAgent
-        ctx.logger.info(f"🎯 Sending to MatcherAgent...")
-
-        # Prepare match request with candidates
-        job_scope_dict = {
-            "trade": job_state["job_scope"].trade,
-            "services": job_state["job_scope"].services,
-            "urgency": job_state["job_scope"].urgency,
-            "candidates": msg.professionals  # Include for ranking
-        }
+        if job_state.job_scope is None:
+            # Speculative results arrived before intake finished: hold them
+            job_state.speculative_professionals = professionals_payload(msg)
+            job_state.speculative_finished_at = time.time()
+            job_store.put(job_state)
+            return
 
-        match_request = MatchRequest(
-            job_id=msg.job_id,
-            job_scope=job_scope_dict,
-            location={
-                "city": job_state["job_data"].city,
-                "state": job_state["job_data"].state
-            }
-        )
+        batch = job_batches.get(job_state.batch_id)
+        if batch is not None and batch.scrape_group_of(msg.job_id) is not None:
+            await stage_scheduler.complete("scrape", msg.job_id)
+            await handle_batch_professionals(ctx, batch, msg)
+            return
 
-        await ctx.send(matcher_agent.address, match_request)
+        if msg.trade and not same_trade(msg.trade, job_state.job_scope["trade"]):
+            ctx.logger.info(f"🗑️  Discarding speculative {msg.trade} professionals for {msg.job_id}")
+            return
+
+        await stage_scheduler.complete("scrape", msg.job_id)
+
+        if job_state.speculative_started_at is not None and job_state.speculative_finished_at is None:
+            job_state.speculative_finished_at = time.time()
+
+        await dispatch_match(ctx, job_state, msg)
 
     except Exception as e:
         ctx.logger.error(f"Error handling professionals: {str(e)}")
         await ctx.send(
-            job_state["sender"],
+            job_state.sender,
             ErrorMessage(
                 job_id=msg.job_id,
                 agent="coordinator",
@@ -159,28 +388,137 @@ async def handle_professionals(ctx: Context, sender: str, msg: ProfessionalsList
         )
 
 
+async def dispatch_match(ctx: Context, job_state: JobRecord, msg: ProfessionalsList, index: bool = True):
+    """Index the professionals and send them to MatcherAgent"""
+    # Update state
+    job_state.professional_count = msg.count
+    job_state.stage = "match"
+    job_store.put(job_state)
+
+    # Index the new professionals for future jobs; matching does not
+    # wait for this since the candidates travel with the MatchRequest
+    if index:
+        await ctx.send(indexer_agent.address, msg)
+
+    # Step 3: Send to MatcherAgent
+    ctx.logger.info(f"🎯 Sending to MatcherAgent...")
+
+    # Prepare match request; candidates travel in their packed form
+    job_scope_dict = {
+        "trade": job_state.job_scope["trade"],
+        "services": job_state.job_scope["services"],
+        "urgency": job_state.job_scope["urgency"],
+        "project_type": job_state.job_scope["project_type"],
+        "budget_hint": job_state.job_scope["budget_hint"],
+    }
+
+    match_request = MatchRequest(
+        job_id=msg.job_id,
+        job_scope=job_scope_dict,
+        location={
+            "city": job_state.city,
+            "state": job_state.state
+        },
+        trace_id=job_state.trace_id,
+        candidates=professionals_payload(msg)  # Include for ranking
+    )
+
+    await stage_scheduler.submit(ctx, "match", msg.job_id, job_state.urgency, matcher_agent.address, match_request)
+
+
+async def start_speculative_scrape(ctx: Context, job_state: JobRecord, msg: JobRequest):
+    """Guess the trade locally and start scraping alongside intake"""
+    trade, confidence = classify_trade(msg.prompt)
+    if confidence < SPECULATION_MIN_CONFIDENCE:
+        speculation_stats["skipped_low_confidence"] += 1
+        return
+
+    speculation_stats["attempts"] += 1
+    job_state.speculative_trade = trade
+    job_state.speculative_started_at = time.time()
+    job_store.put(job_state)
+
+    ctx.logger.info(f"🎲 Speculative scrape for {msg.job_id}: {trade} (confidence {confidence:.2f})")
+    await ctx.send(
+        scraper_agent.address,
+        JobScope(
+            job_id=msg.job_id,
+            trade=trade,
+            services=[],
+            urgency="normal",
+            project_type="general",
+            city=msg.city,
+            state=msg.state,
+            zip_code=msg.zip_code,
+            trace_id=msg.trace_id
+        )
+    )
+
+
+def record_speculation_hit(ctx: Context, job_state: JobRecord):
+    """
+    Count a speculation win and the scrape time it hid behind intake
+
+    If the speculative scrape already finished, all of it was saved;
+    otherwise the time it has been running so far was.
+    """
+    now = time.time()
+    finished_at = job_state.speculative_finished_at or now
+    saved = finished_at - job_state.speculative_started_at
+
+    speculation_stats["hits"] += 1
+    speculation_stats["saved_seconds"] += saved
+    ctx.logger.info(
+        f"🎲 Speculation hit for {job_state.job_id}: saved {saved:.2f}s "
+        f"(hit rate {speculation_summary()['hit_rate']:.0%})"
+    )
+
+
+@coordinator_protocol.on_message(model=IndexingComplete)
+async def handle_indexing_complete(ctx: Context, sender: str, msg: IndexingComplete):
+    """Received indexing confirmation from IndexerAgent"""
+    ctx.logger.info(f"🗂️  Indexed {msg.count} professionals for {msg.job_id}")
+
+    job_state = job_store.get(msg.job_id)
+    if job_state:
+        job_state.indexed_count = msg.count
+        job_store.put(job_state)
+
+
+@coordinator_protocol.on_message(model=ProgressUpdate)
+async def handle_progress(ctx: Context, sender: str, msg: ProgressUpdate):
+    """Relay stage progress to the original sender"""
+    job_state = job_store.get(msg.job_id)
+    if job_state and job_state.status == "processing":
+        await ctx.send(job_state.sender, msg)
+
+
 @coordinator_protocol.on_message(model=MatchResults)
 async def handle_match_results(ctx: Context, sender: str, msg: MatchResults):
     """Received final matches from MatcherAgent"""
-    ctx.logger.info(f"✅ Received {msg.count} matches for {msg.job_id}")
-
-    job_state = job_states.get(msg.job_id)
+    job_state = job_store.get(msg.job_id)
     if not job_state:
         ctx.logger.error(f"No job state found for {msg.job_id}")
         return
 
+    if msg.partial:
+        # Streamed match: pass it straight through to the original sender
+        await ctx.send(job_state.sender, msg)
+        return
+
+    ctx.logger.info(f"✅ Received {msg.count} matches for {msg.job_id}")
+    await stage_scheduler.complete("match", msg.job_id)
+
     try:
         # Update state
-        job_state["matches"] = msg.matches
-        job_state["status"] = "completed"
-        job_state["stage"] = "done"
+        job_state.matches = msg.matches
+        job_state.status = "completed"
+        job_state.stage = "done"
+        job_store.put(job_state)
 
-        # Send final results back to original sender
-        await ctx.send(job_state["sender"], msg)
-
-        # Send completion progress
+        # Send completion progress (ahead of the results, which end the job's event stream)
         await ctx.send(
-            job_state["sender"],
+            job_state.sender,
             ProgressUpdate(
                 job_id=msg.job_id,
                 stage="done",
@@ -189,21 +527,104 @@ async def handle_match_results(ctx: Context, sender: str, msg: MatchResults):
             )
         )
 
+        # Send final results back to original sender
+        await ctx.send(job_state.sender, msg)
+
         ctx.logger.info(f"🎉 Pipeline complete for {msg.job_id}")
+        finish_batch_job(ctx, job_state)
 
     except Exception as e:
         ctx.logger.error(f"Error sending final results: {str(e)}")
 
 
+def is_stale_scrape_error(ctx: Context, job_state: JobRecord, msg: ErrorMessage) -> bool:
+    """
+    True if a scraper error is for a scrape the job no longer waits on: a
+    speculative scrape whose guess intake has since overruled, or one that
+    failed before intake finished (intake's scope then starts a normal scrape)
+    """
+    if job_state.job_scope is not None:
+        if same_trade(msg.trade, job_state.job_scope["trade"]):
+            return False
+        ctx.logger.info(f"🗑️  Ignoring error from discarded {msg.trade} scrape for {msg.job_id}")
+        return True
+
+    if job_state.speculative_trade is None:
+        return False
+    speculation_stats["failed"] += 1
+    job_state.speculative_trade = None
+    job_state.speculative_started_at = None
+    job_store.put(job_state)
+    ctx.logger.info(f"🎲 Speculative scrape failed for {msg.job_id}; intake's scope will start a new one")
+    return True
+
+
 @coordinator_protocol.on_message(model=ErrorMessage)
 async def handle_error(ctx: Context, sender: str, msg: ErrorMessage):
     """Handle error from any agent"""
     ctx.logger.error(f"❌ Error from {msg.agent} for job {msg.job_id}: {msg.error}")
 
-    job_state = job_states.get(msg.job_id)
-    if job_state:
+    # Indexing failures don't affect the current job's matches
+    if msg.agent == "indexer_agent":
+        return
+
+    job_state = job_store.get(msg.job_id)
+    if not job_state:
+        return
+
+    if msg.agent == "scraper_agent" and msg.trade and is_stale_scrape_error(ctx, job_state, msg):
+        return
+
+    # In a batch, jobs sharing the failed intake or scrape fail with it
+    batch = job_batches.get(job_state.batch_id)
+    failed_ids = batch.failed(msg.job_id) if batch is not None else [msg.job_id]
+    if batch is not None:
+        await send_batch_intake(ctx, batch)
+
+    for job_id in failed_ids:
+        failed_state = job_state if job_id == msg.job_id else job_store.get(job_id)
+        if not failed_state:
+            continue
+
+        failed_state.status = "error"
+        failed_state.error = msg.error
+        job_store.put(failed_state)
+        await stage_scheduler.cancel_job(job_id)
+
         # Forward error to original sender
-        await ctx.send(job_state["sender"], msg)
+        await ctx.send(failed_state.sender, msg if job_id == msg.job_id else ErrorMessage(
+            job_id=job_id,
+            agent=msg.agent,
+            error=msg.error,
+            timestamp=msg.timestamp
+        ))
+        finish_batch_job(ctx, failed_state)
+
+
+@coordinator.on_interval(period=60.0)
+async def evict_finished_jobs(ctx: Context):
+    """Drop finished jobs past their TTL to keep memory bounded"""
+    expired = job_store.evict_expired()
+    if expired:
+        ctx.logger.info(f"🧹 Evicted {expired} finished jobs, {len(job_store)} remaining")
+    await fail_evicted_jobs(ctx)
+
+    expired = await stage_scheduler.expire_stale()
+    if expired:
+        ctx.logger.warning(f"⏱️  Freed {expired} scheduler slots held by stages that never reported back")
+    ctx.logger.info(f"🚦 Scheduler: {stage_scheduler.stats()}")
+
+    # Batches whose jobs never all reported back
+    cutoff = time.time() - job_store.ttl
+    for batch_id in [b for b, batch in job_batches.items() if batch.created_at < cutoff]:
+        ctx.logger.warning(f"🧹 Dropping stale batch {batch_id}: {job_batches[batch_id].summary()}")
+        del job_batches[batch_id]
+
+
+@coordinator.on_event("shutdown")
+async def close_job_store(ctx: Context):
+    """Write queued job-state changes before exiting"""
+    await asyncio.to_thread(job_store.close)
 
 
 # Include protocol
@@ -214,9 +635,13 @@ def create_bureau():
     """Create a bureau to run all agents together"""
     bureau = Bureau(port=8888, endpoint="http://localhost:8888/submit")
 
+    # Every agent shares this process, so candidates can travel by id
+    share_catalog()
+
     bureau.add(coordinator)
     bureau.add(intake_agent)
     bureau.add(scraper_agent)
+    bureau.add(indexer_agent)
     bureau.add(matcher_agent)
 
     return bureau
@@ -229,6 +654,7 @@ if __name__ == "__main__":
     print(f"  🎮 Coordinator:  {coordinator.address} (port 8000)")
     print(f"  📋 IntakeAgent:  {intake_agent.address} (port 8001)")
     print(f"  🔍 ScraperAgent: {scraper_agent.address} (port 8002)")
+    print(f"  🗂️  IndexerAgent: {indexer_agent.address} (port 8003)")
     print(f"  🎯 MatcherAgent:  {matcher_agent.address} (port 8004)")
     print("=" * 50)
     print("\n✨ All agents ready for deployment to Agentverse!")
@@ -0,0 +1,145 @@
+"""
+Per-job in-memory event channels for the API bridge
+Agents' ProgressUpdate / MatchResults / ErrorMessage messages are published
+here and fanned out to Server-Sent Events subscribers
+"""
+import time
+import asyncio
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+
+# (sequence id, event type, data)
+Event = Tuple[int, str, Dict]
+
+
+class JobEventChannel:
+    """
+    Event log for one job with live subscribers
+
+    The last ``buffer_size`` events are kept so late subscribers (or
+    reconnecting ones sending Last-Event-ID) can catch up. Each
+    subscriber gets a bounded queue; a subscriber that falls too far
+    behind is disconnected rather than growing memory.
+    """
+
+    def __init__(self, buffer_size: int = 100, subscriber_queue_size: int = 100):
+        self.events: deque = deque(maxlen=buffer_size)
+        self.subscriber_queue_size = subscriber_queue_size
+        self.subscribers: set = set()
+        self.sequence = 0
+        self.closed = False
+        self.updated_at = time.time()
+
+    def publish(self, event_type: str, data: Dict, final: bool = False):
+        """Append an event; ``final`` closes the channel after it"""
+        if self.closed:
+            return
+
+        self.sequence += 1
+        event = (self.sequence, event_type, data)
+        self.events.append(event)
+        self.updated_at = time.time()
+
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Slow consumer: drop it, it can reconnect with Last-Event-ID
+                self.subscribers.discard(queue)
+                self._close_queue(queue)
+
+        if final:
+            self.closed = True
+            for queue in list(self.subscribers):
+                self._close_queue(queue)
+            self.subscribers.clear()
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> Tuple[List[Event], Optional[asyncio.Queue]]:
+        """
+        Buffered events after ``last_event_id`` and a queue for new ones
+
+        The queue is None if the channel is already closed; a None item
+        on the queue means the stream is over.
+        """
+        backlog = [e for e in self.events if last_event_id is None or e[0] > last_event_id]
+        if self.closed:
+            return backlog, None
+
+        queue = asyncio.Queue(maxsize=self.subscriber_queue_size)
+        self.subscribers.add(queue)
+        return backlog, queue
+
+    def unsubscribe(self, queue: Optional[asyncio.Queue]):
+        if queue is not None:
+            self.subscribers.discard(queue)
+
+    @staticmethod
+    def _close_queue(queue: asyncio.Queue):
+        try:
+            queue.put_nowait(None)
+        except asyncio.QueueFull:
+            # Make room for the end-of-stream marker
+            queue.get_nowait()
+            queue.put_nowait(None)
+
+
+class JobEventChannels:
+    """
+    All job channels, bounded in count
+
+    Closed channels without subscribers are dropped ``ttl`` seconds after
+    their last event; beyond ``max_channels`` the least recently updated
+    channel is dropped.
+    """
+
+    def __init__(self, buffer_size: int = 100, max_channels: int = 10000, ttl: float = 600):
+        self.buffer_size = buffer_size
+        self.max_channels = max_channels
+        self.ttl = ttl
+        self._channels: "OrderedDict[str, JobEventChannel]" = OrderedDict()
+
+    def open(self, job_id: str) -> JobEventChannel:
+        """Channel for a newly submitted job (a resubmitted job id starts a fresh one)"""
+        channel = self._channels.get(job_id)
+        if channel is None or channel.closed:
+            channel = JobEventChannel(buffer_size=self.buffer_size)
+            self._channels[job_id] = channel
+            self._channels.move_to_end(job_id)
+            self._evict()
+        return channel
+
+    def get(self, job_id: str) -> Optional[JobEventChannel]:
+        """Channel of a submitted job, or None if unknown or evicted"""
+        return self._channels.get(job_id)
+
+    def publish(self, job_id: str, event_type: str, data: Dict, final: bool = False):
+        """Publish to a job's channel; events for jobs without one are dropped"""
+        channel = self._channels.get(job_id)
+        if channel is None:
+            return
+        channel.publish(event_type, data, final=final)
+        self._channels.move_to_end(job_id)
+
+    def evict_expired(self) -> int:
+        cutoff = time.time() - self.ttl
+        expired = [
+            job_id for job_id, channel in self._channels.items()
+            if channel.closed and not channel.subscribers and channel.updated_at < cutoff
+        ]
+        for job_id in expired:
+            del self._channels[job_id]
+        return len(expired)
+
+    def stats(self) -> Dict:
+        return {
+            "channels": len(self._channels),
+            "open_channels": sum(1 for c in self._channels.values() if not c.closed),
+            "subscribers": sum(len(c.subscribers) for c in self._channels.values()),
+        }
+
+    def _evict(self):
+        while len(self._channels) > self.max_channels:
+            _, channel = self._channels.popitem(last=False)
+            for queue in list(channel.subscribers):
+                JobEventChannel._close_queue(queue)
+            channel.subscribers.clear()
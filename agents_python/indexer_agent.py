@@ -0,0 +1,78 @@
+"""
+IndexerAgent - Indexes professionals into the local vector index
+Fetch.ai uAgent for Agentverse deployment
+"""
+import asyncio
+from datetime import datetime
+from uagents import Agent, Context, Protocol
+from models import ProfessionalsList, IndexingComplete, ErrorMessage
+from vector_index import get_professional_index
+from metrics import timed_stage
+from candidate_codec import decode_candidates, professionals_payload
+
+# Create agent
+indexer_agent = Agent(
+    name="indexer_agent",
+    seed="renova_indexer_seed_phrase_2025",
+    port=8003,
+    endpoint=["http://localhost:8003/submit"],
+)
+
+# Define protocol
+indexer_protocol = Protocol("ProfessionalIndexingProtocol")
+
+
+@indexer_agent.on_event("startup")
+async def open_index(ctx: Context):
+    """Map the index files before the first batch arrives"""
+    index = get_professional_index()
+    ctx.logger.info(f"Professional index loaded: {len(index)} professionals")
+
+
+@indexer_protocol.on_message(model=ProfessionalsList)
+@timed_stage("index")
+async def handle_professionals(ctx: Context, sender: str, msg: ProfessionalsList):
+    """Upsert scraped professionals into the index"""
+    ctx.logger.info(f"Indexing {msg.count} professionals for {msg.job_id}")
+
+    try:
+        index = get_professional_index()
+        # Template fallbacks are not real businesses; indexing them would
+        # surface them (with their made-up ratings) in later jobs
+        professionals = [p for p in decode_candidates(professionals_payload(msg)) if not p.get("template")]
+        # Writes (and occasional IVF retraining) stay off the event loop
+        indexed_ids = await asyncio.to_thread(index.upsert, professionals)
+
+        ctx.logger.info(f"Indexed {len(indexed_ids)} professionals (total {len(index)})")
+
+        await ctx.send(
+            sender,
+            IndexingComplete(
+                job_id=msg.job_id,
+                count=len(indexed_ids),
+                indexed_ids=indexed_ids
+            )
+        )
+
+    except Exception as e:
+        ctx.logger.error(f"Error indexing professionals: {str(e)}")
+        await ctx.send(
+            sender,
+            ErrorMessage(
+                job_id=msg.job_id,
+                agent="indexer_agent",
+                error=str(e),
+                timestamp=datetime.utcnow().isoformat()
+            )
+        )
+
+
+# Include protocol
+indexer_agent.include(indexer_protocol)
+
+
+if __name__ == "__main__":
+    print("🗂️  IndexerAgent starting...")
+    print(f"   Address: {indexer_agent.address}")
+    print(f"   Port: 8003")
+    indexer_agent.run()
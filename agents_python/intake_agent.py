@@ -8,6 +8,9 @@ from datetime import datetime
 from uagents import Agent, Context, Protocol
 from models import JobRequest, JobScope, ProgressUpdate, ErrorMessage
 from lava_client import lava_claude_client
+from prompt_cache import SimilarPromptCache
+from trade_classifier import TRADE_KEYWORDS, NaiveBayesTradeModel, canonical_trade, classify_job, classify_urgency
+from metrics import cache_lookups, fallbacks, timed_stage
 
 # Create agent
 intake_agent = Agent(
@@ -15,15 +18,72 @@ intake_agent = Agent(
     seed="renova_intake_seed_phrase_2025",
     port=8001,
     endpoint=["http://localhost:8001/submit"],
+    handle_messages_concurrently=True,
 )
 
 # Use Lava-enabled Claude client
 claude_client = lava_claude_client
 
+# Near-duplicate prompt cache: similar prompts reuse a previous JobScope
+PROMPT_CACHE_PATH = os.getenv(
+    "INTAKE_PROMPT_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "intake_prompts.json")
+)
+prompt_cache = SimilarPromptCache(
+    threshold=float(os.getenv("INTAKE_SIMILARITY_THRESHOLD", "0.85")),
+    max_entries=int(os.getenv("INTAKE_PROMPT_CACHE_SIZE", "2000")),
+    path=PROMPT_CACHE_PATH or None,
+)
+
+# Local fast path: confident prompts skip Claude entirely. The naive Bayes
+# model learns from every Claude analysis (and the cached ones at startup)
+FAST_PATH_THRESHOLD = float(os.getenv("INTAKE_FAST_PATH_THRESHOLD", "0.8"))
+trade_model = NaiveBayesTradeModel(min_examples=int(os.getenv("INTAKE_MODEL_MIN_EXAMPLES", "20")))
+for cached_prompt, cached_scope in prompt_cache.items():
+    trade_model.learn(cached_prompt, cached_scope.get("trade", ""))
+
+intake_stats = {"cache_hits": 0, "fast_path": 0, "escalated": 0}
+
+
+def intake_summary() -> dict:
+    """How intake analyses were served, and how often Claude was needed"""
+    total = sum(intake_stats.values())
+    return {
+        **intake_stats,
+        "fast_path_threshold": FAST_PATH_THRESHOLD,
+        "escalation_rate": round(intake_stats["escalated"] / total, 4) if total else 0.0,
+    }
+
+
 # Define protocol
 intake_protocol = Protocol("JobIntakeProtocol")
 
 
+async def analyze_job(prompt: str, ctx: Context) -> dict:
+    """
+    Analyze a job request as cheaply as possible: a cached scope for a
+    near-duplicate prompt, then the local classifier, then Claude
+    """
+    cached = prompt_cache.lookup(prompt)
+    if cached:
+        scope, similarity = cached
+        intake_stats["cache_hits"] += 1
+        cache_lookups.inc(cache="intake_prompt", result="hit")
+        ctx.logger.info(f"Reusing cached job scope (similarity={similarity:.2f})")
+        return scope
+
+    cache_lookups.inc(cache="intake_prompt", result="miss")
+    local = classify_job(prompt, trade_model)
+    if local["confidence"] >= FAST_PATH_THRESHOLD:
+        intake_stats["fast_path"] += 1
+        ctx.logger.info(f"Local classifier: trade={local['trade']} (confidence {local['confidence']:.2f})")
+        return local
+
+    intake_stats["escalated"] += 1
+    ctx.logger.info(f"Local classifier unsure (confidence {local['confidence']:.2f}), escalating to Claude")
+    return await analyze_job_with_claude(prompt, ctx)
+
+
 async def analyze_job_with_claude(prompt: str, ctx: Context) -> dict:
     """Call Claude API to analyze job request"""
     try:
@@ -42,7 +102,7 @@ Extract:
 
 Respond with ONLY a JSON object matching this schema:
 {{
-  "trade": "primary trade category",
+  "trade": "{'|'.join(TRADE_KEYWORDS)}",
   "services": ["service1", "service2"],
   "urgency": "low|normal|high|emergency",
   "budget_hint": "low|medium|high|premium",
@@ -50,10 +110,12 @@ Respond with ONLY a JSON object matching this schema:
   "location_requirements": "any specific location notes"
 }}"""
 
-        response = claude_client.create_message(
+        # Urgency isn't known until analysis; the keyword guess sets queue priority
+        response = await claude_client.acreate_message(
             model="claude-3-opus-20240229",
             max_tokens=1024,
-            messages=[{"role": "user", "content": message}]
+            messages=[{"role": "user", "content": message}],
+            urgency=classify_urgency(prompt)[0]
         )
 
         content = response["content"][0]["text"]
@@ -66,12 +128,17 @@ Respond with ONLY a JSON object matching this schema:
         if json_start >= 0 and json_end > json_start:
             json_str = content[json_start:json_end]
             result = json.loads(json_str)
+            # Keep trade names comparable with the local classifier's
+            result["trade"] = canonical_trade(result.get("trade", "")) or result.get("trade") or "General Contractor"
+            prompt_cache.add(prompt, result)
+            trade_model.learn(prompt, result.get("trade", ""))
             return result
         else:
             raise ValueError("No JSON found in Claude response")
 
     except Exception as e:
         ctx.logger.error(f"Claude analysis failed: {str(e)}")
+        fallbacks.inc(component="intake", reason="default_scope")
         # Return fallback scope
         return {
             "trade": "General Contractor",
@@ -83,6 +150,7 @@ Respond with ONLY a JSON object matching this schema:
 
 
 @intake_protocol.on_message(model=JobRequest)
+@timed_stage("intake")
 async def handle_job_request(ctx: Context, sender: str, msg: JobRequest):
     """Process incoming job request"""
     ctx.logger.info(f"Received job request {msg.job_id} from {sender}")
@@ -99,8 +167,8 @@ async def handle_job_request(ctx: Context, sender: str, msg: JobRequest):
             )
         )
 
-        # Analyze with Claude
-        analysis = await analyze_job_with_claude(msg.prompt, ctx)
+        # Analyze (cache, local classifier, or Claude)
+        analysis = await analyze_job(msg.prompt, ctx)
 
         # Create job scope
         job_scope = JobScope(
@@ -110,7 +178,11 @@ async def handle_job_request(ctx: Context, sender: str, msg: JobRequest):
             urgency=analysis.get("urgency", "normal"),
             project_type=analysis.get("project_type", "general"),
             budget_hint=analysis.get("budget_hint"),
-            location_requirements=analysis.get("location_requirements")
+            location_requirements=analysis.get("location_requirements"),
+            city=msg.city,
+            state=msg.state,
+            zip_code=msg.zip_code,
+            trace_id=msg.trace_id
         )
 
         ctx.logger.info(f"Job scope created: trade={job_scope.trade}, services={job_scope.services}")
@@ -131,6 +203,29 @@ async def handle_job_request(ctx: Context, sender: str, msg: JobRequest):
         )
 
 
+@intake_agent.on_interval(period=60.0)
+async def persist_prompt_cache(ctx: Context):
+    """Periodically save the prompt cache so it survives restarts"""
+    ctx.logger.info(f"Intake stats: {intake_summary()}")
+    ctx.logger.info(f"Claude governor: {claude_client.governor_stats()}")
+    try:
+        prompt_cache.save()
+    except Exception as e:
+        ctx.logger.warning(f"Failed to save prompt cache: {str(e)}")
+
+
+@intake_agent.on_event("shutdown")
+async def save_prompt_cache(ctx: Context):
+    prompt_cache.save()
+    ctx.logger.info(f"Prompt cache stats: {prompt_cache.stats()}")
+
+
+@intake_agent.on_event("shutdown")
+async def close_claude_client(ctx: Context):
+    """Release pooled Claude/Lava connections"""
+    await claude_client.aclose()
+
+
 # Include protocol
 intake_agent.include(intake_protocol)
 
@@ -0,0 +1,132 @@
+"""
+Batch job bookkeeping for the coordinator
+Identical prompts in a batch share one intake run, intake runs with
+bounded concurrency, and jobs with the same (trade, city, state) share one
+scrape, so a batch costs one ScraperAgent fetch per distinct group
+"""
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional, Set, Tuple
+from locations import canonical_location
+
+GroupKey = Tuple[str, str]
+
+
+def prompt_key(prompt: str) -> str:
+    """Prompts that differ only in case or whitespace are identical"""
+    return " ".join(prompt.lower().split())
+
+
+def scrape_group_key(trade: str, city: str, state: str) -> GroupKey:
+    return trade, canonical_location(f"{city}, {state}")
+
+
+@dataclass
+class ScrapeGroup:
+    """Jobs sharing one scrape; the leader's job_id is the one sent to ScraperAgent"""
+    leader: str
+    members: List[str] = field(default_factory=list)
+    professionals: Optional[Dict] = None
+    trade: Optional[str] = None
+
+
+@dataclass
+class JobBatch:
+    """
+    State of one batch while its jobs move through intake and scraping
+
+    ``prompt_members`` maps each intake leader to every job with the same
+    prompt; ``scrape_groups`` maps (trade, location) to the jobs sharing a
+    scrape. ``remaining`` holds jobs without final results yet.
+    """
+    batch_id: str
+    sender: str
+    intake_concurrency: int
+    intake_queue: Deque[Dict] = field(default_factory=deque)
+    intake_in_flight: Set[str] = field(default_factory=set)
+    prompt_members: Dict[str, List[str]] = field(default_factory=dict)
+    scrape_groups: Dict[GroupKey, ScrapeGroup] = field(default_factory=dict)
+    scrape_leaders: Dict[str, GroupKey] = field(default_factory=dict)
+    remaining: Set[str] = field(default_factory=set)
+    created_at: float = field(default_factory=time.time)
+
+    @classmethod
+    def from_jobs(cls, batch_id: str, sender: str, jobs: List[Dict], intake_concurrency: int) -> "JobBatch":
+        batch = cls(batch_id=batch_id, sender=sender, intake_concurrency=intake_concurrency)
+        leaders: Dict[str, str] = {}
+        for job in jobs:
+            batch.remaining.add(job["job_id"])
+            key = prompt_key(job["prompt"])
+            leader = leaders.get(key)
+            if leader is None:
+                leaders[key] = job["job_id"]
+                batch.prompt_members[job["job_id"]] = [job["job_id"]]
+                batch.intake_queue.append(job)
+            else:
+                batch.prompt_members[leader].append(job["job_id"])
+        return batch
+
+    def next_intake(self) -> List[Dict]:
+        """Jobs to send to IntakeAgent now without exceeding the concurrency limit"""
+        ready = []
+        while self.intake_queue and len(self.intake_in_flight) < self.intake_concurrency:
+            job = self.intake_queue.popleft()
+            self.intake_in_flight.add(job["job_id"])
+            ready.append(job)
+        return ready
+
+    def intake_done(self, leader: str) -> List[str]:
+        """Free the leader's intake slot; returns every job sharing its prompt"""
+        self.intake_in_flight.discard(leader)
+        return self.prompt_members.pop(leader, [leader])
+
+    def join_scrape_group(self, job_id: str, trade: str, city: str, state: str) -> Tuple[ScrapeGroup, bool]:
+        """Add a job to its scrape group; True if the job leads a new group"""
+        key = scrape_group_key(trade, city, state)
+        group = self.scrape_groups.get(key)
+        is_new = group is None
+        if is_new:
+            group = ScrapeGroup(leader=job_id, trade=trade)
+            self.scrape_groups[key] = group
+            self.scrape_leaders[job_id] = key
+        group.members.append(job_id)
+        return group, is_new
+
+    def scrape_group_of(self, leader: str) -> Optional[ScrapeGroup]:
+        key = self.scrape_leaders.get(leader)
+        return self.scrape_groups.get(key) if key else None
+
+    def failed(self, job_id: str) -> List[str]:
+        """
+        Jobs that can no longer finish because ``job_id`` failed
+
+        An intake failure takes down every job sharing the prompt and a
+        scrape failure every job in the group (later jobs with the same
+        key start a fresh scrape); other failures only affect the job.
+        """
+        if job_id in self.intake_in_flight:
+            return self.intake_done(job_id)
+
+        key = self.scrape_leaders.get(job_id)
+        if key is not None and self.scrape_groups[key].professionals is None:
+            del self.scrape_leaders[job_id]
+            return self.scrape_groups.pop(key).members
+
+        return [job_id]
+
+    def finish(self, job_id: str):
+        self.remaining.discard(job_id)
+
+    @property
+    def done(self) -> bool:
+        return not self.remaining
+
+    def summary(self) -> Dict:
+        return {
+            "batch_id": self.batch_id,
+            "remaining_jobs": len(self.remaining),
+            "intake_queued": len(self.intake_queue),
+            "intake_in_flight": len(self.intake_in_flight),
+            "scrape_groups": len(self.scrape_groups),
+        }
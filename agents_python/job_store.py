@@ -0,0 +1,300 @@
+"""
+Job-state store for the coordinator
+Compact per-job records with TTL eviction of finished jobs, an LRU size
+cap and an optional SQLite (WAL) backend that survives restarts
+"""
+import os
+import json
+import time
+import sqlite3
+import resource
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional
+
+TERMINAL_STATUSES = ("completed", "error")
+
+
+@dataclass(slots=True)
+class JobRecord:
+    """Everything the coordinator needs to remember about one job"""
+    job_id: str
+    sender: str
+    city: str
+    state: str
+    status: str = "processing"
+    stage: str = "intake"
+    urgency: str = "normal"
+    trace_id: Optional[str] = None
+    job_scope: Optional[Dict] = None
+    professional_count: int = 0
+    indexed_count: int = 0
+    matches: Optional[List[Dict]] = None
+    error: Optional[str] = None
+    # Speculative scrape started before intake finished (see coordinator)
+    speculative_trade: Optional[str] = None
+    speculative_started_at: Optional[float] = None
+    speculative_finished_at: Optional[float] = None
+    speculative_professionals: Optional[Dict] = None
+    # Batch the job was submitted in (see job_batches.py)
+    batch_id: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+
+class MemoryJobStore:
+    """
+    In-memory job store
+
+    Completed or errored jobs are dropped ``ttl`` seconds after their
+    last update; the store never holds more than ``max_size`` jobs,
+    evicting the least recently updated finished job first. Active jobs
+    are evicted only when nothing else is left, and are kept for
+    take_evicted_active() so the coordinator can fail them properly.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._jobs: "OrderedDict[str, JobRecord]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._evicted_active: List[JobRecord] = []
+
+        self.expired = 0
+        self.evicted = 0
+
+    def get(self, job_id: str) -> Optional[JobRecord]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def put(self, record: JobRecord):
+        """Insert or update a record (call after mutating it)"""
+        record.updated_at = time.time()
+        with self._lock:
+            self._jobs[record.job_id] = record
+            self._jobs.move_to_end(record.job_id)
+            while len(self._jobs) > self.max_size:
+                self._evict_one()
+        self._persist(record)
+
+    def _evict_one(self):
+        """Drop the least recently updated finished job, or the oldest active one if none"""
+        victim = next(
+            (job_id for job_id, record in self._jobs.items() if record.status in TERMINAL_STATUSES),
+            None
+        )
+        if victim is None:
+            victim, record = self._jobs.popitem(last=False)
+            self._evicted_active.append(record)
+        else:
+            del self._jobs[victim]
+        self._delete_persisted(victim)
+        self.evicted += 1
+
+    def take_evicted_active(self) -> List[JobRecord]:
+        """Active jobs evicted since the last call (their senders still expect an answer)"""
+        with self._lock:
+            evicted, self._evicted_active = self._evicted_active, []
+        return evicted
+
+    def delete(self, job_id: str):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+        self._delete_persisted(job_id)
+
+    def evict_expired(self) -> int:
+        """Drop finished jobs older than the TTL; returns how many"""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired_ids = [
+                job_id for job_id, record in self._jobs.items()
+                if record.status in TERMINAL_STATUSES and record.updated_at < cutoff
+            ]
+            for job_id in expired_ids:
+                del self._jobs[job_id]
+                self._delete_persisted(job_id)
+        self.expired += len(expired_ids)
+        return len(expired_ids)
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            by_status: Dict[str, int] = {}
+            approx_bytes = 0
+            for record in self._jobs.values():
+                by_status[record.status] = by_status.get(record.status, 0) + 1
+                approx_bytes += len(json.dumps(asdict(record)))
+
+        return {
+            "jobs": len(self._jobs),
+            "by_status": by_status,
+            "approx_bytes": approx_bytes,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "evicted_active": len(self._evicted_active),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            # ru_maxrss is in kilobytes on Linux
+            "process_max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
+
+    def close(self):
+        """Finish pending persistence (nothing to do in memory)"""
+
+    # Persistence hooks (no-ops in memory)
+
+    def _persist(self, record: JobRecord):
+        pass
+
+    def _delete_persisted(self, job_id: str):
+        pass
+
+
+class SQLiteJobStore(MemoryJobStore):
+    """
+    Job store with write-behind persistence to SQLite in WAL mode
+
+    Writes are queued and committed in batches by a background thread, so
+    state changes never wait for SQLite on the event loop; only the latest
+    state of each job is written. Jobs reload on startup so their status
+    can still be queried. Jobs that were active at the restart cannot
+    resume, because their in-flight messages are gone. They are reloaded as
+    failed and expire like any other finished job.
+    """
+
+    # Seconds to gather writes into one commit
+    FLUSH_INTERVAL = 0.05
+
+    def __init__(self, db_path: str, max_size: int = 10000, ttl: float = 3600):
+        super().__init__(max_size=max_size, ttl=ttl)
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._db_lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY,"
+            " record TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+        # job_id -> (record JSON, updated_at), or None to delete
+        self._pending: Dict[str, Optional[tuple]] = {}
+        self._pending_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self.interrupted = 0
+
+        self._load()
+        self._writer = threading.Thread(target=self._write_loop, name="job-store-writer", daemon=True)
+        self._writer.start()
+
+    def _load(self):
+        rows = self._db.execute(
+            "SELECT record FROM jobs ORDER BY updated_at DESC LIMIT ?", (self.max_size,)
+        ).fetchall()
+        for (record_json,) in reversed(rows):
+            record = JobRecord(**json.loads(record_json))
+            self._jobs[record.job_id] = record
+            if record.status not in TERMINAL_STATUSES:
+                record.status = "error"
+                record.error = f"Interrupted by a coordinator restart during {record.stage}"
+                record.updated_at = time.time()
+                self._persist(record)
+                self.interrupted += 1
+        self.evict_expired()
+
+    def get(self, job_id: str) -> Optional[JobRecord]:
+        record = super().get(job_id)
+        if record is not None:
+            return record
+
+        with self._pending_lock:
+            if job_id in self._pending:
+                pending = self._pending[job_id]
+                return JobRecord(**json.loads(pending[0])) if pending is not None else None
+
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT record FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        record = JobRecord(**json.loads(row[0]))
+        with self._lock:
+            self._jobs[job_id] = record
+        return record
+
+    def stats(self) -> Dict:
+        stats = super().stats()
+        stats["pending_writes"] = len(self._pending)
+        stats["interrupted"] = self.interrupted
+        return stats
+
+    def close(self):
+        """Write everything still queued and stop the writer thread"""
+        self._closed = True
+        self._wake.set()
+        self._writer.join()
+        self._flush()
+
+    def _persist(self, record: JobRecord):
+        with self._pending_lock:
+            self._pending[record.job_id] = (json.dumps(asdict(record)), record.updated_at)
+        self._wake.set()
+
+    def _delete_persisted(self, job_id: str):
+        with self._pending_lock:
+            self._pending[job_id] = None
+        self._wake.set()
+
+    def _write_loop(self):
+        while not self._closed:
+            self._wake.wait()
+            # Let a burst of state changes collect into one commit
+            time.sleep(self.FLUSH_INTERVAL)
+            self._wake.clear()
+            self._flush()
+
+    def _flush(self):
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        upserts = [(job_id, entry[0], entry[1]) for job_id, entry in pending.items() if entry is not None]
+        deletes = [(job_id,) for job_id, entry in pending.items() if entry is None]
+        with self._db_lock:
+            if upserts:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO jobs (job_id, record, updated_at) VALUES (?, ?, ?)", upserts
+                )
+            if deletes:
+                self._db.executemany("DELETE FROM jobs WHERE job_id = ?", deletes)
+            self._db.commit()
+
+
+def create_job_store() -> MemoryJobStore:
+    """Job store selected by JOB_STORE_BACKEND (memory or sqlite)"""
+    max_size = int(os.getenv("JOB_STORE_MAX_SIZE", "10000"))
+    ttl = float(os.getenv("JOB_STORE_TTL", "3600"))
+
+    if os.getenv("JOB_STORE_BACKEND", "memory").lower() == "sqlite":
+        db_path = os.getenv(
+            "JOB_STORE_PATH",
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "jobs.sqlite")
+        )
+        return SQLiteJobStore(db_path, max_size=max_size, ttl=ttl)
+
+    return MemoryJobStore(max_size=max_size, ttl=ttl)
@@ -0,0 +1,79 @@
+"""
+Incremental parser for a streamed JSON array of objects
+Emits each top-level object as soon as its closing brace arrives
+"""
+import json
+from typing import List
+
+
+class IncrementalArrayParser:
+    """
+    Feed text chunks of a JSON array (possibly surrounded by prose) and
+    get back the objects completed so far
+
+    Only top-level ``{...}`` elements of the first ``[`` are emitted;
+    braces inside strings are ignored.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._in_array = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._object_start = -1
+
+    def feed(self, text: str) -> List[dict]:
+        """Consume a chunk and return newly completed objects"""
+        if self._done:
+            return []
+
+        self._buffer += text
+        completed = []
+
+        while self._pos < len(self._buffer):
+            char = self._buffer[self._pos]
+
+            if not self._in_array:
+                if char == "[":
+                    self._in_array = True
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                if self._depth == 0:
+                    self._object_start = self._pos
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    completed.append(json.loads(self._buffer[self._object_start:self._pos + 1]))
+                    self._object_start = -1
+            elif char == "]" and self._depth == 0:
+                self._done = True
+                self._pos += 1
+                break
+
+            self._pos += 1
+
+        # Drop consumed text that no pending object still needs
+        keep_from = self._object_start if self._object_start >= 0 else self._pos
+        self._buffer = self._buffer[keep_from:]
+        self._pos -= keep_from
+        if self._object_start >= 0:
+            self._object_start = 0
+
+        return completed
+
+    @property
+    def done(self) -> bool:
+        """True once the closing bracket of the array has been seen"""
+        return self._done
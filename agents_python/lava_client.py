@@ -4,9 +4,212 @@ Routes AI API calls through Lava proxy for usage tracking and billing
 """
 import os
 import json
+import time
+import heapq
+import asyncio
+import itertools
+from collections import deque
+import aiohttp
 import requests
 import anthropic
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from cache import TTLCache, make_cache_key
+from circuit_breaker import CircuitBreaker, LatencyTracker
+from metrics import cache_lookups, claude_requests, fallbacks, record_claude_usage
+from cassettes import get_cassette, prompt_shape
+
+DEFAULT_LLM_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "llm_cache.sqlite")
+
+# Queue priority per JobScope.urgency (lower is served first)
+URGENCY_PRIORITY = {"emergency": 0, "high": 1, "normal": 2, "low": 3}
+
+# Errors worth retrying; 529 overloaded is not an InternalServerError in
+# newer SDKs (and does not exist in older ones)
+RETRYABLE_ERRORS = (
+    anthropic.RateLimitError,
+    anthropic.InternalServerError,
+    anthropic.APIConnectionError,
+    getattr(anthropic, "OverloadedError", anthropic.InternalServerError),
+)
+
+
+class GovernorTicket:
+    """Permission to make one Claude call; release it when the call ends"""
+
+    def __init__(self, tokens: int):
+        self.window_entry = [0.0, tokens]
+
+
+class ClaudeGovernor:
+    """
+    Process-wide admission control for Claude calls
+
+    Callers wait in a priority queue ordered by urgency, then arrival,
+    and are admitted while in-flight calls, requests/min and tokens/min
+    stay under their limits. A share of every limit (``emergency_reserve``)
+    is held back for emergency calls so they are admitted even when the
+    rest of the traffic has saturated the limiter. A 429 pauses admission
+    and halves the effective rate; successes restore it gradually.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        requests_per_minute: int = 50,
+        tokens_per_minute: int = 100000,
+        emergency_reserve: float = 0.2,
+    ):
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.emergency_reserve = emergency_reserve
+
+        self._queue = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._request_times: deque = deque()
+        self._token_window: deque = deque()
+        self._window_tokens = 0
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+
+        # Adaptive backoff after 429s
+        self.rate_scale = 1.0
+        self._backoff = 0.0
+        self._paused_until = 0.0
+
+        self.rate_limited = 0
+        self._waits = {urgency: [0, 0.0, 0.0] for urgency in URGENCY_PRIORITY}
+
+    async def acquire(self, urgency: str = "normal", tokens: int = 0) -> GovernorTicket:
+        """Wait for admission; ``tokens`` is the call's estimated token usage"""
+        urgency = urgency if urgency in URGENCY_PRIORITY else "normal"
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (URGENCY_PRIORITY[urgency], next(self._sequence), future, tokens))
+        queued_at = time.monotonic()
+
+        self._dispatch()
+        try:
+            ticket = await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(future.result())
+            raise
+
+        waited = time.monotonic() - queued_at
+        stats = self._waits[urgency]
+        stats[0] += 1
+        stats[1] += waited
+        stats[2] = max(stats[2], waited)
+        return ticket
+
+    def release(self, ticket: GovernorTicket, actual_tokens: Optional[int] = None):
+        """End a call, correcting its token estimate with actual usage"""
+        self._in_flight -= 1
+        if actual_tokens is not None:
+            self._window_tokens += actual_tokens - ticket.window_entry[1]
+            ticket.window_entry[1] = actual_tokens
+        self._dispatch()
+
+    def on_success(self):
+        self._backoff = 0.0
+        self.rate_scale = min(1.0, self.rate_scale + 0.05)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None) -> float:
+        """Back off after a 429; returns how long admission is paused"""
+        self.rate_limited += 1
+        self.rate_scale = max(0.1, self.rate_scale * 0.5)
+        self._backoff = min(60.0, self._backoff * 2 if self._backoff else 1.0)
+        pause = max(self._backoff, retry_after or 0.0)
+        self._paused_until = max(self._paused_until, time.monotonic() + pause)
+        self._dispatch()
+        return pause
+
+    def _prune(self, now: float):
+        cutoff = now - 60.0
+        while self._request_times and self._request_times[0] <= cutoff:
+            self._request_times.popleft()
+        while self._token_window and self._token_window[0][0] <= cutoff:
+            self._window_tokens -= self._token_window.popleft()[1]
+
+    def _admission_delay(self, priority: int, tokens: int, now: float) -> Optional[float]:
+        """0 if a call can start now, seconds until it might, or None if it must wait for a release"""
+        if now < self._paused_until:
+            return self._paused_until - now
+
+        share = 1.0 if priority == 0 else 1.0 - self.emergency_reserve
+        if self._in_flight >= max(1, int(self.max_concurrency * share)):
+            return None
+
+        rpm = max(1, int(self.requests_per_minute * self.rate_scale * share))
+        if len(self._request_times) >= rpm:
+            return self._request_times[0] + 60.0 - now
+
+        tpm = self.tokens_per_minute * self.rate_scale * share
+        if self._token_window and self._window_tokens + tokens > tpm:
+            return self._token_window[0][0] + 60.0 - now
+
+        return 0.0
+
+    def _dispatch(self):
+        """Admit queued calls in priority order while limits allow"""
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+            self._wakeup = None
+
+        now = time.monotonic()
+        self._prune(now)
+
+        while self._queue:
+            priority, _, future, tokens = self._queue[0]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+
+            delay = self._admission_delay(priority, tokens, now)
+            if delay != 0.0:
+                if delay is not None:
+                    self._wakeup = asyncio.get_running_loop().call_later(max(delay, 0.01), self._dispatch)
+                break
+
+            heapq.heappop(self._queue)
+            ticket = GovernorTicket(tokens)
+            ticket.window_entry[0] = now
+            self._in_flight += 1
+            self._request_times.append(now)
+            self._token_window.append(ticket.window_entry)
+            self._window_tokens += tokens
+            future.set_result(ticket)
+
+    def stats(self) -> Dict:
+        self._prune(time.monotonic())
+        depth = {urgency: 0 for urgency in URGENCY_PRIORITY}
+        names = {priority: urgency for urgency, priority in URGENCY_PRIORITY.items()}
+        for priority, _, future, _ in self._queue:
+            if not future.done():
+                depth[names[priority]] += 1
+
+        return {
+            "in_flight": self._in_flight,
+            "queue_depth": depth,
+            "requests_last_minute": len(self._request_times),
+            "tokens_last_minute": self._window_tokens,
+            "rate_scale": round(self.rate_scale, 3),
+            "rate_limited": self.rate_limited,
+            "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 2),
+            "wait": {
+                urgency: {
+                    "count": count,
+                    "avg": round(total / count, 4) if count else 0.0,
+                    "max": round(longest, 4),
+                }
+                for urgency, (count, total, longest) in self._waits.items()
+            },
+        }
+
+
+def estimate_tokens(messages: List[Dict], max_tokens: int) -> int:
+    """Rough token count of a request (about 4 characters per token) plus its output budget"""
+    return len(json.dumps(messages)) // 4 + max_tokens
 
 
 class LavaClaudeClient:
@@ -18,17 +221,75 @@ class LavaClaudeClient:
         self.use_lava = os.getenv("USE_LAVA", "false").lower() == "true"
         self.anthropic_key = os.getenv("ANTHROPIC_API_KEY", "demo-key")
         self.lava_forward_token = os.getenv("LAVA_FORWARD_TOKEN", "")
-        self.lava_api_url = "https://api.lavapayments.com/v1/forward"
-        self.anthropic_base_url = "https://api.anthropic.com/v1/messages"
+        self.lava_api_url = os.getenv("LAVA_API_URL", "https://api.lavapayments.com/v1/forward")
+        # The Anthropic SDK clients also honour ANTHROPIC_BASE_URL
+        self.anthropic_base_url = f"{os.getenv('ANTHROPIC_BASE_URL', 'https://api.anthropic.com').rstrip('/')}/v1/messages"
+
+        # Max Claude requests in flight at once for the async API
+        self.max_concurrency = int(os.getenv("CLAUDE_MAX_CONCURRENCY", "8"))
+        self.request_timeout = float(os.getenv("CLAUDE_REQUEST_TIMEOUT", "60"))
+        # Retries of rate-limited or overloaded calls, with governor backoff
+        self.max_retries = int(os.getenv("CLAUDE_MAX_RETRIES", "2"))
+
+        # Shared by every async caller in the process (intake and matcher)
+        self.governor = ClaudeGovernor(
+            max_concurrency=self.max_concurrency,
+            requests_per_minute=int(os.getenv("CLAUDE_RPM_LIMIT", "50")),
+            tokens_per_minute=int(os.getenv("CLAUDE_TPM_LIMIT", "100000")),
+            emergency_reserve=float(os.getenv("CLAUDE_EMERGENCY_RESERVE", "0.2")),
+        )
 
         # Initialize standard Anthropic client for non-Lava mode
         self.anthropic_client = anthropic.Anthropic(api_key=self.anthropic_key)
 
+        # Lava health: the breaker sends calls straight to Anthropic while
+        # Lava is failing or slow, and a Lava call still running after the
+        # hedge delay (its recent p95) races a direct call
+        self.lava_breaker = CircuitBreaker(
+            window=int(os.getenv("LAVA_BREAKER_WINDOW", "20")),
+            min_calls=int(os.getenv("LAVA_BREAKER_MIN_CALLS", "5")),
+            failure_rate=float(os.getenv("LAVA_BREAKER_FAILURE_RATE", "0.5")),
+            slow_call_seconds=float(os.getenv("LAVA_SLOW_CALL_SECONDS", "20")),
+            open_seconds=float(os.getenv("LAVA_BREAKER_OPEN_SECONDS", "30")),
+        )
+        self.lava_latency = LatencyTracker()
+        self.hedge_enabled = os.getenv("LAVA_HEDGE_ENABLED", "true").lower() == "true"
+        self.hedge_percentile = float(os.getenv("LAVA_HEDGE_PERCENTILE", "95"))
+        self.hedge_min_delay = float(os.getenv("LAVA_HEDGE_MIN_DELAY", "2"))
+        self.hedge_default_delay = float(os.getenv("LAVA_HEDGE_DEFAULT_DELAY", "15"))
+        self.hedge_min_samples = int(os.getenv("LAVA_HEDGE_MIN_SAMPLES", "20"))
+        self.lava_counters = {
+            "lava_calls": 0,
+            "lava_failures": 0,
+            "breaker_bypassed": 0,
+            "hedged": 0,
+            "hedge_won": 0,
+        }
+
+        # Async clients share one connection pool each; created lazily on
+        # first use so they bind to the running event loop
+        self.async_anthropic_client: Optional[anthropic.AsyncAnthropic] = None
+        self._lava_session: Optional[aiohttp.ClientSession] = None
+
+        # Record/replay of Claude calls (CASSETTE_MODE, see cassettes.py)
+        self.cassette = get_cassette()
+
+        # Response cache: identical requests skip Claude (and Lava billing)
+        self.cache: Optional[TTLCache] = None
+        if os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true":
+            self.cache = TTLCache(
+                max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024")),
+                ttl=float(os.getenv("LLM_CACHE_TTL", "86400")),
+                db_path=os.getenv("LLM_CACHE_PATH", DEFAULT_LLM_CACHE_PATH) or None,
+                max_disk_entries=int(os.getenv("LLM_CACHE_MAX_DISK_ENTRIES", "10000")),
+            )
+
     def create_message(
         self,
         model: str,
         max_tokens: int,
         messages: List[Dict],
+        use_cache: bool = True,
         **kwargs
     ) -> Dict:
         """
@@ -38,23 +299,40 @@ class LavaClaudeClient:
             model: Claude model name
             max_tokens: Max tokens in response
             messages: List of message dicts
+            use_cache: Serve identical requests from the response cache
             **kwargs: Additional parameters
 
         Returns:
             Response dict from Claude API
         """
-        if not self.use_lava:
+        cache_key = self._cache_key(model, max_tokens, messages, kwargs) if use_cache else None
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+
+        started = time.monotonic()
+        if self._replaying():
+            claude_requests.inc(route="cassette")
+            result = self.cassette.replay("claude", *self._cassette_request(model, max_tokens, messages, kwargs))
+        elif not self.use_lava:
             # Direct Anthropic API call
+            claude_requests.inc(route="direct")
             response = self.anthropic_client.messages.create(
                 model=model,
                 max_tokens=max_tokens,
                 messages=messages,
                 **kwargs
             )
-            return response.model_dump()
+            result = response.model_dump()
+        else:
+            # Route through Lava
+            result = self._lava_request(model, max_tokens, messages, **kwargs)
+        self._record_call(model, max_tokens, messages, kwargs, result, time.monotonic() - started)
+        record_claude_usage(result.get("usage"))
 
-        # Route through Lava
-        return self._lava_request(model, max_tokens, messages, **kwargs)
+        if cache_key:
+            self.cache.set(cache_key, result)
+        return result
 
     def _lava_request(
         self,
@@ -73,40 +351,45 @@ class LavaClaudeClient:
             **kwargs
         }
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.lava_forward_token}",
-            "anthropic-version": "2023-06-01",
-            "x-api-key": self.anthropic_key,
-        }
-
-        url = f"{self.lava_api_url}?u={self.anthropic_base_url}"
+        if not self.lava_breaker.allow_request():
+            self.lava_counters["breaker_bypassed"] += 1
+            fallbacks.inc(component="lava", reason="breaker_open")
+            claude_requests.inc(route="direct")
+            response = self.anthropic_client.messages.create(
+                model=model,
+                max_tokens=max_tokens,
+                messages=messages,
+                **kwargs
+            )
+            return response.model_dump()
 
         try:
-            response = requests.post(url, json=payload, headers=headers, timeout=60)
+            self.lava_counters["lava_calls"] += 1
+            claude_requests.inc(route="lava")
+            started = time.monotonic()
+            response = requests.post(
+                self._lava_url(),
+                json=payload,
+                headers=self._lava_headers(),
+                timeout=self.request_timeout
+            )
             response.raise_for_status()
 
             result = response.json()
+            self._record_lava_success(time.monotonic() - started)
             print(f"✅ Lava request completed - Usage: {result.get('usage', {})}")
             return result
 
-        except requests.exceptions.RequestException as e:
-            # Check if it's a credit/payment error
-            is_payment_error = False
+        except (requests.exceptions.RequestException, ValueError) as e:
+            status = None
             if hasattr(e, 'response') and e.response is not None:
-                is_payment_error = (e.response.status_code == 402 or
-                                  e.response.status_code == 429)
-
-            error_msg = str(e).lower()
-            is_credit_error = 'credit' in error_msg or 'insufficient' in error_msg
-
-            if is_payment_error or is_credit_error:
-                print("⚠️  Lava credits exhausted or payment error detected")
-            else:
-                print(f"⚠️  Lava request failed: {str(e)}")
+                status = e.response.status_code
+            self._record_lava_failure()
+            self._report_lava_failure(e, status)
 
             # Fallback to direct API call
             print("🔄 Falling back to direct Anthropic API...")
+            claude_requests.inc(route="direct")
             try:
                 response = self.anthropic_client.messages.create(
                     model=model,
@@ -120,6 +403,518 @@ class LavaClaudeClient:
                 print(f"❌ Both Lava and direct API failed: {str(fallback_error)}")
                 raise fallback_error
 
+    async def acreate_message(
+        self,
+        model: str,
+        max_tokens: int,
+        messages: List[Dict],
+        use_cache: bool = True,
+        urgency: str = "normal",
+        **kwargs
+    ) -> Dict:
+        """
+        Async version of create_message for use inside agent handlers
+
+        Requests share pooled connections and are admitted by the
+        process-wide governor in ``urgency`` order, so a slow call never
+        blocks the event loop and a burst of low-urgency work cannot
+        starve an emergency job. Rate-limited or overloaded calls are
+        retried up to ``max_retries`` times after the governor's backoff.
+
+        Returns:
+            Response dict from Claude API
+        """
+        cache_key = self._cache_key(model, max_tokens, messages, kwargs) if use_cache else None
+        cached = self._count_cache_lookup(await self.cache.aget(cache_key) if cache_key else None, cache_key)
+        if cached is not None:
+            return cached
+
+        estimate = estimate_tokens(messages, max_tokens)
+        attempt = 0
+        while True:
+            ticket = await self.governor.acquire(urgency, estimate)
+            # Failed calls free their token estimate
+            usage = 0
+            backoff = 0.0
+            try:
+                started = time.monotonic()
+                if self._replaying():
+                    claude_requests.inc(route="cassette")
+                    result = await self.cassette.areplay(
+                        "claude", *self._cassette_request(model, max_tokens, messages, kwargs)
+                    )
+                elif not self.use_lava:
+                    claude_requests.inc(route="direct")
+                    result = await self._adirect_request(model, max_tokens, messages, **kwargs)
+                else:
+                    result = await self._alava_request(model, max_tokens, messages, **kwargs)
+                self._record_call(model, max_tokens, messages, kwargs, result, time.monotonic() - started)
+                record_claude_usage(result.get("usage"))
+                usage = result.get("usage") or {}
+                usage = usage.get("input_tokens", 0) + usage.get("output_tokens", 0) or None
+                self.governor.on_success()
+                break
+            except RETRYABLE_ERRORS as e:
+                if isinstance(e, anthropic.RateLimitError):
+                    pause = self.governor.on_rate_limited(self._retry_after(e))
+                    print(f"⏳ Claude rate limited, backing off {pause:.1f}s")
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                if not isinstance(e, anthropic.RateLimitError):
+                    backoff = min(8.0, 0.5 * 2 ** attempt)
+            finally:
+                self.governor.release(ticket, usage)
+
+            # Back off without holding a slot; the next attempt queues again
+            if backoff:
+                await asyncio.sleep(backoff)
+
+        if cache_key:
+            await self.cache.aset(cache_key, result)
+        return result
+
+    def governor_stats(self) -> Dict:
+        """Claude admission queue depth, wait times and rate usage"""
+        return self.governor.stats()
+
+    @staticmethod
+    def _retry_after(error: anthropic.APIStatusError) -> Optional[float]:
+        try:
+            return float(error.response.headers.get("retry-after"))
+        except (TypeError, ValueError, AttributeError):
+            return None
+
+    def cache_stats(self) -> Dict:
+        """Response cache hit/miss counters"""
+        if self.cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.cache.stats()}
+
+    def _cache_get(self, cache_key: Optional[str]) -> Optional[Dict]:
+        return self._count_cache_lookup(self.cache.get(cache_key) if cache_key else None, cache_key)
+
+    def _count_cache_lookup(self, cached: Optional[Dict], cache_key: Optional[str]) -> Optional[Dict]:
+        if not cache_key:
+            return None
+        cache_lookups.inc(cache="llm", result="miss" if cached is None else "hit")
+        if cached is not None:
+            claude_requests.inc(route="cache")
+        return cached
+
+    def _replaying(self) -> bool:
+        return self.cassette is not None and self.cassette.replaying
+
+    def _cassette_request(self, model: str, max_tokens: int, messages: List[Dict], kwargs: Dict) -> Tuple[str, str]:
+        """(request key, prompt shape) identifying a call in the cassette"""
+        key = make_cache_key(model=model, max_tokens=max_tokens, messages=messages, kwargs=kwargs)
+        return key, prompt_shape(model, max_tokens, messages)
+
+    def _record_call(
+        self,
+        model: str,
+        max_tokens: int,
+        messages: List[Dict],
+        kwargs: Dict,
+        result: Dict,
+        elapsed: float,
+        **extra
+    ):
+        """Add a real call to the cassette when recording"""
+        if self.cassette is None or not self.cassette.recording:
+            return
+        key, shape = self._cassette_request(model, max_tokens, messages, kwargs)
+        response = {field: result.get(field) for field in ("model", "content", "stop_reason", "usage")}
+        self.cassette.record("claude", key, response, elapsed, shape=shape, **extra)
+
+    def _cache_key(self, model: str, max_tokens: int, messages: List[Dict], kwargs: Dict) -> Optional[str]:
+        if self.cache is None:
+            return None
+        return make_cache_key(model=model, max_tokens=max_tokens, messages=messages, kwargs=kwargs)
+
+    async def _adirect_request(
+        self,
+        model: str,
+        max_tokens: int,
+        messages: List[Dict],
+        **kwargs
+    ) -> Dict:
+        """Direct Anthropic API call on the shared async client"""
+        response = await self._get_async_anthropic_client().messages.create(
+            model=model,
+            max_tokens=max_tokens,
+            messages=messages,
+            **kwargs
+        )
+        return response.model_dump()
+
+    async def _alava_request(
+        self,
+        model: str,
+        max_tokens: int,
+        messages: List[Dict],
+        **kwargs
+    ) -> Dict:
+        """
+        Async request through Lava proxy with automatic fallback
+
+        Goes direct while the Lava circuit breaker is open. Otherwise, if
+        Lava has not answered within the hedge delay, a direct call is
+        started alongside it and whichever succeeds first is used.
+        """
+        if not self.lava_breaker.allow_request():
+            self.lava_counters["breaker_bypassed"] += 1
+            fallbacks.inc(component="lava", reason="breaker_open")
+            claude_requests.inc(route="direct")
+            return await self._adirect_request(model, max_tokens, messages, **kwargs)
+
+        payload = {
+            "model": model,
+            "max_tokens": max_tokens,
+            "messages": messages,
+            **kwargs
+        }
+
+        self.lava_counters["lava_calls"] += 1
+        claude_requests.inc(route="lava")
+        started = time.monotonic()
+        lava_task = asyncio.ensure_future(self._alava_post(payload))
+        direct_task = None
+        settled = False
+
+        try:
+            if self.hedge_enabled:
+                done, _ = await asyncio.wait({lava_task}, timeout=self.hedge_delay())
+                if not done:
+                    self.lava_counters["hedged"] += 1
+                    claude_requests.inc(route="direct")
+                    print(f"🏁 Lava slower than {self.hedge_delay():.1f}s, hedging with a direct call")
+                    direct_task = asyncio.ensure_future(
+                        self._adirect_request(model, max_tokens, messages, **kwargs)
+                    )
+                    done, _ = await asyncio.wait({lava_task, direct_task}, return_when=asyncio.FIRST_COMPLETED)
+                    if direct_task in done and not direct_task.exception():
+                        self.lava_counters["hedge_won"] += 1
+                        fallbacks.inc(component="lava", reason="hedge")
+                        # Lava lost the race: a bad call for the breaker
+                        settled = True
+                        self.lava_latency.record(time.monotonic() - started)
+                        self.lava_breaker.record_failure()
+                        return direct_task.result()
+
+            result = await lava_task
+            settled = True
+            self._record_lava_success(time.monotonic() - started)
+            print(f"✅ Lava request completed - Usage: {result.get('usage', {})}")
+            return result
+
+        except Exception as e:
+            # Anything raised here came from Lava (HTTP, timeout, bad JSON, ...)
+            settled = True
+            self._record_lava_failure()
+            self._report_lava_failure(e, getattr(e, 'status', None))
+
+            if direct_task is not None:
+                # The hedge is already running: it is the fallback
+                return await direct_task
+
+            # Fallback to direct API call
+            print("🔄 Falling back to direct Anthropic API...")
+            claude_requests.inc(route="direct")
+            try:
+                result = await self._adirect_request(model, max_tokens, messages, **kwargs)
+                print("✅ Fallback request completed successfully")
+                return result
+            except Exception as fallback_error:
+                print(f"❌ Both Lava and direct API failed: {str(fallback_error)}")
+                raise fallback_error
+
+        finally:
+            if not settled:
+                # Cancelled before Lava answered: no verdict for the breaker
+                self.lava_breaker.release_probe()
+            for task in (lava_task, direct_task):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def _alava_post(self, payload: Dict) -> Dict:
+        session = await self._get_lava_session()
+        async with session.post(
+            self._lava_url(),
+            json=payload,
+            headers=self._lava_headers()
+        ) as response:
+            response.raise_for_status()
+            return await response.json()
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait on Lava before also calling Anthropic directly"""
+        if len(self.lava_latency) < self.hedge_min_samples:
+            return self.hedge_default_delay
+        p = self.lava_latency.percentile(self.hedge_percentile)
+        return min(self.request_timeout, max(self.hedge_min_delay, p))
+
+    def lava_stats(self) -> Dict:
+        """Lava breaker state, hedging counters and latency percentiles"""
+        return {
+            **self.lava_counters,
+            "breaker": self.lava_breaker.stats(),
+            "p50": self.lava_latency.percentile(50),
+            "p95": self.lava_latency.percentile(95),
+            "hedge_delay": round(self.hedge_delay(), 3),
+        }
+
+    def _record_lava_success(self, seconds: float):
+        self.lava_latency.record(seconds)
+        self.lava_breaker.record_success(seconds)
+
+    def _record_lava_failure(self):
+        self.lava_counters["lava_failures"] += 1
+        self.lava_breaker.record_failure()
+
+    async def astream_message(
+        self,
+        model: str,
+        max_tokens: int,
+        messages: List[Dict],
+        urgency: str = "normal",
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """
+        Stream a Claude message as text deltas, optionally through Lava
+
+        If the Lava stream fails before producing any text, the request
+        falls back to a direct Anthropic stream. Streamed responses are
+        not cached. Admission goes through the governor like
+        acreate_message; a 429 backs the governor off but is not retried.
+
+        Yields:
+            Text chunks as they arrive
+        """
+        ticket = await self.governor.acquire(urgency, estimate_tokens(messages, max_tokens))
+        # Failed streams free their token estimate; completed ones keep it
+        spent = 0
+        recording = self.cassette is not None and self.cassette.recording
+        chunks: List[str] = []
+        usage: Dict = {}
+        started = time.monotonic()
+        first_token = None
+        try:
+            if self._replaying():
+                stream = self._areplay_stream(model, max_tokens, messages, kwargs)
+            else:
+                stream = self._aupstream_stream(model, max_tokens, messages, usage, **kwargs)
+
+            async for text in stream:
+                if first_token is None:
+                    first_token = time.monotonic() - started
+                if recording:
+                    chunks.append(text)
+                yield text
+            spent = None
+            self.governor.on_success()
+
+            if recording:
+                result = {"content": [{"type": "text", "text": "".join(chunks)}], "usage": usage}
+                self._record_call(
+                    model, max_tokens, messages, kwargs, result, time.monotonic() - started,
+                    first_token=round(first_token or 0.0, 4)
+                )
+        except anthropic.RateLimitError as e:
+            self.governor.on_rate_limited(self._retry_after(e))
+            raise
+        finally:
+            self.governor.release(ticket, spent)
+
+    async def _aupstream_stream(
+        self,
+        model: str,
+        max_tokens: int,
+        messages: List[Dict],
+        usage: Dict,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """Stream from Lava, or directly when Lava is off, open or fails before any text"""
+        if self.use_lava and not self.lava_breaker.allow_request():
+            self.lava_counters["breaker_bypassed"] += 1
+            fallbacks.inc(component="lava", reason="breaker_open")
+        elif self.use_lava:
+            produced = False
+            settled = False
+            self.lava_counters["lava_calls"] += 1
+            claude_requests.inc(route="lava")
+            started = time.monotonic()
+            try:
+                async for text in self._alava_stream(model, max_tokens, messages, usage, **kwargs):
+                    if not produced:
+                        # Time to first token is what a slow proxy hurts
+                        self._record_lava_success(time.monotonic() - started)
+                        settled = True
+                    produced = True
+                    yield text
+                if not produced:
+                    # e.g. an error page instead of SSE: treat like any other Lava failure
+                    raise aiohttp.ClientPayloadError("Lava stream ended without any text")
+                return
+            except Exception as e:
+                # HTTP, timeout or malformed SSE data from Lava
+                if produced:
+                    raise
+                settled = True
+                self._record_lava_failure()
+                self._report_lava_failure(e, getattr(e, 'status', None))
+                print("🔄 Falling back to direct Anthropic API stream...")
+            finally:
+                if not settled:
+                    # Abandoned before the first token: no verdict for the breaker
+                    self.lava_breaker.release_probe()
+
+        claude_requests.inc(route="direct")
+        async for text in self._adirect_stream(model, max_tokens, messages, usage, **kwargs):
+            yield text
+
+    async def _areplay_stream(self, model: str, max_tokens: int, messages: List[Dict], kwargs: Dict) -> AsyncIterator[str]:
+        """Replay a recorded response as a stream paced like the original"""
+        claude_requests.inc(route="cassette")
+        entry = self.cassette.lookup("claude", *self._cassette_request(model, max_tokens, messages, kwargs))
+        text = "".join(block.get("text", "") for block in entry["response"].get("content") or [])
+        record_claude_usage(entry["response"].get("usage"))
+
+        first_token = self.cassette.delay(entry, "first_token")
+        await asyncio.sleep(first_token)
+        pieces = [text[i:i + 64] for i in range(0, len(text), 64)]
+        gap = max(0.0, self.cassette.delay(entry) - first_token) / max(1, len(pieces))
+        for piece in pieces:
+            yield piece
+            await asyncio.sleep(gap)
+
+    async def _adirect_stream(
+        self,
+        model: str,
+        max_tokens: int,
+        messages: List[Dict],
+        usage: Optional[Dict] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """Direct Anthropic streaming call on the shared async client"""
+        async with self._get_async_anthropic_client().messages.stream(
+            model=model,
+            max_tokens=max_tokens,
+            messages=messages,
+            **kwargs
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
+            final = await stream.get_final_message()
+            record_claude_usage(final.usage.model_dump())
+            if usage is not None:
+                usage.update(final.usage.model_dump())
+
+    async def _alava_stream(
+        self,
+        model: str,
+        max_tokens: int,
+        messages: List[Dict],
+        usage: Optional[Dict] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """Streaming request through Lava proxy (Anthropic SSE format)"""
+        payload = {
+            "model": model,
+            "max_tokens": max_tokens,
+            "messages": messages,
+            "stream": True,
+            **kwargs
+        }
+
+        session = await self._get_lava_session()
+        async with session.post(
+            self._lava_url(),
+            json=payload,
+            headers=self._lava_headers()
+        ) as response:
+            response.raise_for_status()
+
+            async for raw_line in response.content:
+                line = raw_line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+
+                event = json.loads(line[len("data:"):].strip())
+                if event.get("type") == "message_start":
+                    record_claude_usage(event.get("message", {}).get("usage"))
+                    if usage is not None:
+                        usage["input_tokens"] = event.get("message", {}).get("usage", {}).get("input_tokens")
+                elif event.get("type") == "content_block_delta":
+                    delta = event.get("delta", {})
+                    if delta.get("type") == "text_delta":
+                        yield delta.get("text", "")
+                elif event.get("type") == "message_delta":
+                    # Output tokens only; input was counted at message_start
+                    record_claude_usage({"output_tokens": event.get("usage", {}).get("output_tokens")})
+                    if usage is not None:
+                        usage["output_tokens"] = event.get("usage", {}).get("output_tokens")
+                    print(f"✅ Lava stream completed - Usage: {event.get('usage', {})}")
+                elif event.get("type") == "error":
+                    raise aiohttp.ClientPayloadError(str(event.get("error")))
+
+    async def aclose(self):
+        """Close pooled async connections"""
+        if self._lava_session is not None and not self._lava_session.closed:
+            await self._lava_session.close()
+        self._lava_session = None
+
+        if self.async_anthropic_client is not None:
+            await self.async_anthropic_client.close()
+        self.async_anthropic_client = None
+
+    def _get_async_anthropic_client(self) -> anthropic.AsyncAnthropic:
+        if self.async_anthropic_client is None:
+            # Retries are done by acreate_message so they go back through the governor
+            self.async_anthropic_client = anthropic.AsyncAnthropic(
+                api_key=self.anthropic_key,
+                timeout=self.request_timeout,
+                max_retries=0
+            )
+        return self.async_anthropic_client
+
+    async def _get_lava_session(self) -> aiohttp.ClientSession:
+        if self._lava_session is None or self._lava_session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_concurrency,
+                keepalive_timeout=60,
+            )
+            self._lava_session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+            )
+        return self._lava_session
+
+    def _lava_url(self) -> str:
+        return f"{self.lava_api_url}?u={self.anthropic_base_url}"
+
+    def _lava_headers(self) -> Dict:
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.lava_forward_token}",
+            "anthropic-version": "2023-06-01",
+            "x-api-key": self.anthropic_key,
+        }
+
+    def _report_lava_failure(self, error: Exception, status: Optional[int]):
+        """Log a failed Lava request, flagging credit/payment errors"""
+        fallbacks.inc(component="lava", reason="error")
+        # Check if it's a credit/payment error
+        is_payment_error = status in (402, 429)
+
+        error_msg = str(error).lower()
+        is_credit_error = 'credit' in error_msg or 'insufficient' in error_msg
+
+        if is_payment_error or is_credit_error:
+            print("⚠️  Lava credits exhausted or payment error detected")
+        else:
+            print(f"⚠️  Lava request failed: {str(error)}")
+
 
 # Global instance
 lava_claude_client = LavaClaudeClient()
@@ -0,0 +1,357 @@
+"""
+Offline load test of the agent pipeline
+Runs create_bureau() in-process against local Yelp and Claude stand-ins
+(stub_services.py), fires JobRequests at a configurable arrival rate and
+prints a JSON report: throughput, end-to-end latency percentiles, per-stage
+queue/service breakdown and event-loop lag
+
+    python loadtest.py --jobs 200 --rate 20 --claude-latency lognormal:0.8,0.5 \\
+        --env CLAUDE_RPM_LIMIT=100000 --output report.json
+
+Pipeline settings come from the environment as usual (--env sets them for
+the run). Caches and the professional index live in a temporary directory
+so runs do not touch, or benefit from, the real ones.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import logging
+import tempfile
+import threading
+import contextlib
+import subprocess
+from typing import Callable, Dict, List, Optional, Tuple
+from aiohttp import web
+from stub_services import LatencyDistribution, StubYelp, StubClaude, create_stub_app
+
+PROMPTS = [
+    "My kitchen sink is leaking under the cabinet and the pipe is dripping",
+    "Water heater stopped making hot water, need it repaired",
+    "Need an electrician to install three new outlets in the garage",
+    "Breaker keeps tripping when I run the microwave",
+    "AC is blowing warm air, need HVAC service before summer",
+    "Furnace makes a loud banging noise when it starts",
+    "Looking to remodel our master bathroom with a walk-in shower",
+    "Full kitchen renovation with new cabinets and countertops",
+    "Roof has a leak after the storm, shingles are missing",
+    "Paint the exterior of a two story house",
+    "Handyman to fix a squeaky door and hang some shelves",
+    "EMERGENCY: burst pipe flooding the basement right now",
+    "Urgent: no power in half the house and burning smell from the panel",
+    "Replace rotten deck boards and repair the railing",
+]
+
+CITIES = [
+    ("San Francisco", "CA"), ("Oakland", "CA"), ("Austin", "TX"), ("Seattle", "WA"),
+    ("Denver", "CO"), ("Chicago", "IL"), ("Boston", "MA"), ("Portland", "OR"),
+]
+
+
+def percentiles(values: List[float]) -> Dict:
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def pick(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p / 100.0 * len(ordered)))], 4)
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 4),
+        "p50": pick(50),
+        "p95": pick(95),
+        "p99": pick(99),
+        "max": round(ordered[-1], 4),
+    }
+
+
+# (seconds after the run starts, job payload)
+Schedule = List[Tuple[float, Dict]]
+
+
+def synthetic_schedule(args: argparse.Namespace) -> Schedule:
+    """
+    ``args.jobs`` jobs drawn from PROMPTS x CITIES (prompts get a detail so
+    they are not all identical), arriving at ``args.rate`` per second
+    """
+    rng = random.Random(args.seed)
+    schedule = []
+    at = 0.0
+    for i in range(args.jobs):
+        city, state = rng.choice(CITIES)
+        schedule.append((at, {
+            "job_id": f"load-{i}",
+            "prompt": f"{rng.choice(PROMPTS)} (unit {rng.randint(1, 400)})",
+            "city": city,
+            "state": state,
+        }))
+        if args.rate > 0:
+            at += rng.expovariate(args.rate) if args.arrival == "poisson" else 1.0 / args.rate
+    return schedule
+
+
+class StubServer:
+    """Runs the stub app on its own thread and event loop, off the loop being measured"""
+
+    def __init__(self, app: web.Application):
+        self.app = app
+        self.url: Optional[str] = None
+        self._loop = asyncio.new_event_loop()
+        self._runner: Optional[web.AppRunner] = None
+        self._thread = threading.Thread(target=self._loop.run_forever, name="stub-services", daemon=True)
+
+    def start(self) -> str:
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        return self.url
+
+    async def _start(self):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+
+class LoopLagMonitor:
+    """Samples how late the event loop wakes up; long lags mean something blocked it"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.lags: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - expected))
+
+    def stop(self) -> Dict:
+        if self._task is not None:
+            self._task.cancel()
+        report = percentiles(self.lags)
+        report["over_100ms"] = sum(1 for lag in self.lags if lag > 0.1)
+        return report
+
+
+def configure_environment(stub_url: str, workdir: str, overrides: List[str], use_lava: bool):
+    """Point the pipeline at the stubs; must run before the agents are imported"""
+    os.environ.update({
+        "YELP_API_KEY": "stub",
+        "YELP_API_HOST": stub_url,
+        "ANTHROPIC_API_KEY": "stub",
+        "ANTHROPIC_BASE_URL": stub_url,
+        "LAVA_API_URL": f"{stub_url}/v1/forward",
+        "LAVA_FORWARD_TOKEN": "stub",
+        "USE_LAVA": "true" if use_lava else "false",
+        "LLM_CACHE_PATH": os.path.join(workdir, "llm_cache.sqlite"),
+        "INTAKE_PROMPT_CACHE_PATH": os.path.join(workdir, "intake_prompts.json"),
+        "PROFESSIONAL_INDEX_PATH": os.path.join(workdir, "index"),
+        "JOB_STORE_BACKEND": "memory",
+    })
+    os.environ.pop("YELP_CACHE_PATH", None)
+
+    for override in overrides:
+        key, _, value = override.partition("=")
+        os.environ[key] = value
+
+
+async def run_load(args: argparse.Namespace, schedule: Schedule) -> Dict:
+    """Start the Bureau, submit the scheduled jobs and measure them"""
+    # Imported here so the agents read the environment set up for the run
+    import api_bridge
+    from models import JobRequest
+    from cassettes import get_cassette
+    from metrics import traces, claude_tokens, claude_requests, cache_lookups, fallbacks, prompt_tokens_saved
+
+    bureau = api_bridge.create_bureau()
+    bureau.add(api_bridge.api_client)
+    bureau_task = asyncio.create_task(bureau.run_async())
+
+    started = time.monotonic()
+    while api_bridge.agent_ctx is None:
+        if time.monotonic() - started > args.startup_timeout:
+            raise RuntimeError(f"Agents did not start within {args.startup_timeout}s")
+        await asyncio.sleep(0.1)
+    startup_seconds = time.monotonic() - started
+
+    run_id = f"{int(time.time())}"
+    limit = asyncio.Semaphore(args.max_in_flight) if args.max_in_flight > 0 else None
+    results: List[Dict] = []
+
+    async def run_job(job: Dict):
+        job_id = f"{job['job_id']}-{run_id}"
+        request = JobRequest(**{**job, "job_id": job_id}, trace_id=f"trace-{job_id}")
+        loop = asyncio.get_running_loop()
+        async with (limit or contextlib.nullcontext()):
+            pending = api_bridge.PendingJob(job_id=job_id, future=loop.create_future(), trace_id=request.trace_id)
+            api_bridge.pending_jobs[job_id] = pending
+            submitted = time.monotonic()
+            await api_bridge.agent_ctx.send(str(api_bridge.coordinator.address), request)
+            try:
+                result = await asyncio.wait_for(pending.future, timeout=args.job_timeout)
+                outcome = "failed" if "error" in result else "completed"
+            except asyncio.TimeoutError:
+                api_bridge.pending_jobs.pop(job_id, None)
+                outcome = "timed_out"
+            results.append({
+                "trace_id": request.trace_id,
+                "outcome": outcome,
+                "latency": time.monotonic() - submitted,
+            })
+
+    monitor = LoopLagMonitor()
+    monitor.start()
+    run_started = time.monotonic()
+
+    tasks = []
+    for at, job in schedule:
+        delay = run_started + at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(run_job(job)))
+    await asyncio.gather(*tasks)
+
+    duration = time.monotonic() - run_started
+    loop_lag = monitor.stop()
+    bureau_task.cancel()
+
+    stages: Dict[str, Dict[str, List[float]]] = {}
+    for result in results:
+        for stage, timings in (traces.get(result["trace_id"]) or {}).items():
+            for kind, seconds in timings.items():
+                stages.setdefault(stage, {}).setdefault(kind, []).append(seconds)
+
+    completed = [r["latency"] for r in results if r["outcome"] == "completed"]
+    cassette = get_cassette()
+    return {
+        "git_commit": git_commit(),
+        "startup_seconds": round(startup_seconds, 3),
+        "duration_seconds": round(duration, 3),
+        "throughput_jobs_per_sec": round(len(completed) / duration, 3) if duration else 0.0,
+        "outcomes": {
+            outcome: sum(1 for r in results if r["outcome"] == outcome)
+            for outcome in ("completed", "failed", "timed_out")
+        },
+        "latency": percentiles(completed),
+        "stages": {
+            stage: {kind: percentiles(values) for kind, values in kinds.items()}
+            for stage, kinds in sorted(stages.items())
+        },
+        "event_loop_lag": loop_lag,
+        "claude": {
+            "input_tokens": claude_tokens.value(direction="input"),
+            "output_tokens": claude_tokens.value(direction="output"),
+            "requests": {route: n for (route,), n in claude_requests.collect().items()},
+            "estimated_tokens_saved": {prompt: n for (prompt,), n in prompt_tokens_saved.collect().items()},
+        },
+        "cache_lookups": {f"{cache}:{result}": n for (cache, result), n in cache_lookups.collect().items()},
+        "fallbacks": {f"{component}:{reason}": n for (component, reason), n in fallbacks.collect().items()},
+        "cassette": cassette.stats() if cassette is not None else None,
+    }
+
+
+def run_offline(
+    args: argparse.Namespace,
+    build_schedule: Callable[[], Schedule],
+    env: Optional[Dict[str, str]] = None
+) -> Dict:
+    """
+    Run the pipeline against the stubs with ``env`` and ``args.env``
+    applied; ``build_schedule`` runs after the environment is set
+    """
+    rng = random.Random(args.seed)
+    yelp = StubYelp(LatencyDistribution.parse(args.yelp_latency, rng), args.yelp_error_rate, args.yelp_error_status, rng)
+    claude = StubClaude(
+        LatencyDistribution.parse(args.claude_latency, rng), args.claude_error_rate, args.claude_error_status, rng,
+        tokens_per_second=args.claude_tokens_per_second
+    )
+    server = StubServer(create_stub_app(yelp, claude))
+
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+
+    with tempfile.TemporaryDirectory(prefix="renova-loadtest-") as workdir:
+        configure_environment(server.start(), workdir, args.env, args.lava)
+        os.environ.update(env or {})
+        try:
+            # Agent prints go to stderr so stdout is just the report
+            with contextlib.redirect_stdout(sys.stderr):
+                report = asyncio.run(run_load(args, build_schedule()))
+        finally:
+            server.stop()
+
+    report["stubs"] = {"yelp": yelp.stats(), "claude": claude.stats()}
+    return report
+
+
+def write_report(report: Dict, path: Optional[str]):
+    output = json.dumps(report, indent=2)
+    if path:
+        with open(path, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def add_run_arguments(parser: argparse.ArgumentParser):
+    """Options shared by the load test and the regression runner"""
+    parser.add_argument("--max-in-flight", type=int, default=0, help="Cap on concurrent jobs (0 = open loop)")
+    parser.add_argument("--job-timeout", type=float, default=120.0)
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--claude-latency", default="lognormal:0.8,0.5")
+    parser.add_argument("--claude-error-rate", type=float, default=0.0)
+    parser.add_argument("--claude-error-status", type=int, default=529)
+    parser.add_argument("--claude-tokens-per-second", type=float, default=0.0, help="Streamed output speed (0 = instant)")
+    parser.add_argument("--yelp-latency", default="lognormal:0.2,0.4")
+    parser.add_argument("--yelp-error-rate", type=float, default=0.0)
+    parser.add_argument("--yelp-error-status", type=int, default=500)
+    parser.add_argument("--lava", action="store_true", help="Route Claude calls through the (stub) Lava proxy")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="Pipeline setting for this run")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    parser.add_argument("--verbose", action="store_true", help="Keep agent logs (otherwise only errors)")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline load test of the agent pipeline")
+    parser.add_argument("--jobs", type=int, default=100, help="Number of jobs to submit")
+    parser.add_argument("--rate", type=float, default=10.0, help="Arrival rate in jobs/sec (0 = all at once)")
+    parser.add_argument("--arrival", choices=("poisson", "uniform"), default="poisson")
+    add_run_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    report = {"config": vars(args)}
+    report.update(run_offline(args, lambda: synthetic_schedule(args)))
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
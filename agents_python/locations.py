@@ -0,0 +1,88 @@
+"""
+Location canonicalization for cache keys and Yelp queries
+"San Francisco,  california", "san francisco, CA" and "94102" all map to one key
+"""
+import os
+import re
+import csv
+from typing import Dict, Optional, Tuple
+
+STATE_ABBREVIATIONS = {
+    "alabama": "AL", "alaska": "AK", "arizona": "AZ", "arkansas": "AR",
+    "california": "CA", "colorado": "CO", "connecticut": "CT", "delaware": "DE",
+    "district of columbia": "DC", "florida": "FL", "georgia": "GA", "hawaii": "HI",
+    "idaho": "ID", "illinois": "IL", "indiana": "IN", "iowa": "IA",
+    "kansas": "KS", "kentucky": "KY", "louisiana": "LA", "maine": "ME",
+    "maryland": "MD", "massachusetts": "MA", "michigan": "MI", "minnesota": "MN",
+    "mississippi": "MS", "missouri": "MO", "montana": "MT", "nebraska": "NE",
+    "nevada": "NV", "new hampshire": "NH", "new jersey": "NJ", "new mexico": "NM",
+    "new york": "NY", "north carolina": "NC", "north dakota": "ND", "ohio": "OH",
+    "oklahoma": "OK", "oregon": "OR", "pennsylvania": "PA", "rhode island": "RI",
+    "south carolina": "SC", "south dakota": "SD", "tennessee": "TN", "texas": "TX",
+    "utah": "UT", "vermont": "VT", "virginia": "VA", "washington": "WA",
+    "west virginia": "WV", "wisconsin": "WI", "wyoming": "WY",
+}
+
+# Common city abbreviations seen in job submissions
+CITY_ALIASES = {
+    "sf": "san francisco",
+    "nyc": "new york",
+}
+
+ZIP_PATTERN = re.compile(r"^(\d{5})(?:-\d{4})?$")
+
+# Optional zip -> (city, state) table, loaded from a CSV with columns zip,city,state
+ZIP_CITY_PATH = os.getenv("ZIP_CITY_PATH", "")
+_zip_table: Optional[Dict[str, Tuple[str, str]]] = None
+
+
+def _load_zip_table() -> Dict[str, Tuple[str, str]]:
+    global _zip_table
+
+    if _zip_table is None:
+        _zip_table = {}
+        if ZIP_CITY_PATH and os.path.exists(ZIP_CITY_PATH):
+            with open(ZIP_CITY_PATH, newline="") as f:
+                for row in csv.DictReader(f):
+                    _zip_table[row["zip"].strip()[:5]] = (row["city"].strip(), row["state"].strip())
+    return _zip_table
+
+
+def normalize_state(state: str) -> str:
+    """Full state name or abbreviation -> two-letter code"""
+    state = " ".join(state.split()).lower().rstrip(".")
+    if len(state) == 2:
+        return state.upper()
+    return STATE_ABBREVIATIONS.get(state, state.title())
+
+
+def canonical_location(location: str) -> str:
+    """
+    Canonical "City, ST" form of a free-form location
+
+    Collapses case and whitespace, abbreviates state names and resolves
+    bare zip codes to a city when a zip table is configured. Unknown
+    zips are kept as the 5-digit zip.
+    """
+    location = " ".join(location.split()).strip(" ,")
+    if not location:
+        return ""
+
+    zip_match = ZIP_PATTERN.match(location)
+    if zip_match:
+        zip_code = zip_match.group(1)
+        city_state = _load_zip_table().get(zip_code)
+        if city_state:
+            return canonical_location(f"{city_state[0]}, {city_state[1]}")
+        return zip_code
+
+    parts = [p.strip() for p in location.split(",") if p.strip()]
+    city = CITY_ALIASES.get(parts[0].lower(), parts[0].lower()).title()
+    if len(parts) == 1:
+        return city
+
+    # Drop a trailing zip from "CA 94102"
+    state = re.sub(r"\s*\d{5}(?:-\d{4})?$", "", parts[1])
+    if not state:
+        return city
+    return f"{city}, {normalize_state(state)}"
@@ -4,10 +4,19 @@ Fetch.ai uAgent for Agentverse deployment
 """
 import os
 import json
+import asyncio
 from datetime import datetime
+from typing import Awaitable, Callable
 from uagents import Agent, Context, Protocol
 from models import MatchRequest, MatchResults, ProgressUpdate, ErrorMessage
-from lava_client import lava_claude_client
+from lava_client import lava_claude_client, URGENCY_PRIORITY
+from vector_index import get_professional_index
+from preranker import prerank_candidates
+from micro_batcher import MicroBatcher
+from json_stream import IncrementalArrayParser
+from candidate_codec import decode_candidates
+from prompt_builder import CandidateSection, build_candidate_section
+from metrics import fallbacks, prompt_candidates_dropped, prompt_tokens_saved, timed_stage
 
 # Create agent
 matcher_agent = Agent(
@@ -15,36 +24,73 @@ matcher_agent = Agent(
     seed="renova_matcher_seed_phrase_2025",
     port=8004,
     endpoint=["http://localhost:8004/submit"],
+    handle_messages_concurrently=True,
 )
 
 # Use Lava-enabled Claude client
 claude_client = lava_claude_client
 
+# Number of indexed professionals to pull per job
+INDEX_QUERY_K = int(os.getenv("MATCHER_INDEX_QUERY_K", "50"))
+
+# Number of pre-ranked candidates sent to Claude
+MATCHER_TOP_K = int(os.getenv("MATCHER_TOP_K", "10"))
+
+# Estimated tokens for one job's scope and candidate table in a ranking
+# prompt; the weakest pre-ranked candidates are left out beyond it
+MATCHER_PROMPT_TOKEN_BUDGET = int(os.getenv("MATCHER_PROMPT_TOKEN_BUDGET", "1500"))
+
+# Optional cross-job micro-batching of ranking calls
+MATCHER_BATCH_ENABLED = os.getenv("MATCHER_BATCH_ENABLED", "false").lower() == "true"
+MATCHER_BATCH_WINDOW_MS = float(os.getenv("MATCHER_BATCH_WINDOW_MS", "100"))
+MATCHER_BATCH_MAX_SIZE = int(os.getenv("MATCHER_BATCH_MAX_SIZE", "4"))
+
+# Stream the ranking and send each match as soon as it is parsed
+# (ignored when micro-batching is enabled)
+MATCHER_STREAMING = os.getenv("MATCHER_STREAMING", "false").lower() == "true"
+
 # Define protocol
 matcher_protocol = Protocol("MatcherProtocol")
 
 
-async def rank_with_claude(job_scope: dict, candidates: list, ctx: Context) -> list:
-    """Use Claude to rank and explain matches"""
-    try:
-        ctx.logger.info(f"Ranking {len(candidates)} candidates with Claude")
+def candidate_section(job_scope: dict, candidates: list, ctx: Context, prompt: str) -> CandidateSection:
+    """Fit a job's scope and candidates into the prompt budget and report the savings"""
+    section = build_candidate_section(job_scope, candidates[:MATCHER_TOP_K], MATCHER_PROMPT_TOKEN_BUDGET)
+    prompt_tokens_saved.inc(section.tokens_saved, prompt=prompt)
+    if section.dropped:
+        prompt_candidates_dropped.inc(section.dropped, prompt=prompt)
+    ctx.logger.info(
+        f"Prompt section ~{section.tokens} tokens for {section.included} candidates "
+        f"(~{section.tokens_saved} saved, {section.dropped} over budget)"
+    )
+    return section
 
-        # Format candidates for Claude
-        candidates_text = "\n\n".join([
-            f"{i+1}. {c['name']} - {c['trade']} in {c['city']}, {c['state']}\n"
-            f"   Services: {', '.join(c.get('services', []))}\n"
-            f"   Rating: {c.get('rating', 'N/A')}\n"
-            f"   Price: {c.get('price_band', 'medium')}"
-            for i, c in enumerate(candidates[:10])  # Limit to top 10
-        ])
 
-        prompt = f"""You are matching a customer's project with contractors.
+def default_matches(candidates: list) -> list:
+    """Default scoring used when Claude ranking fails"""
+    fallbacks.inc(component="matcher", reason="default_matches")
+    return [
+        {
+            "professional_id": c["id"],
+            "score": 95 - (i * 5),  # Simple descending scores
+            "reason": f"{c['name']} is a qualified {c['trade']} professional in your area with {c.get('rating', 'N/A')} ratings.",
+            "concerns": None
+        }
+        for i, c in enumerate(candidates[:MATCHER_TOP_K])
+    ]
+
+
+def build_ranking_prompt(job_scope: dict, candidates: list, ctx: Context) -> str:
+    """Prompt asking Claude to rank one job's candidates as a JSON array"""
+    section = candidate_section(job_scope, candidates, ctx, "ranking")
+
+    return f"""You are matching a customer's project with contractors.
 
 Project Requirements:
-{json.dumps(job_scope, indent=2)}
+{section.scope}
 
-Candidate Contractors:
-{candidates_text}
+Candidate Contractors (one per line, columns in the first line):
+{section.table}
 
 Rank these contractors and provide:
 1. A score (0-100) for each based on fit
@@ -54,7 +100,7 @@ Rank these contractors and provide:
 Return JSON array ONLY:
 [
   {{
-    "professional_id": "id",
+    "professional_id": "id column",
     "score": 95,
     "reason": "Excellent match because...",
     "concerns": "optional concerns"
@@ -63,10 +109,19 @@ Return JSON array ONLY:
 
 Sort by score descending."""
 
-        response = claude_client.create_message(
+
+async def rank_with_claude(job_scope: dict, candidates: list, ctx: Context) -> list:
+    """Use Claude to rank and explain matches"""
+    try:
+        ctx.logger.info(f"Ranking {len(candidates)} candidates with Claude")
+
+        prompt = build_ranking_prompt(job_scope, candidates, ctx)
+
+        response = await claude_client.acreate_message(
             model="claude-3-opus-20240229",
             max_tokens=2048,
-            messages=[{"role": "user", "content": prompt}]
+            messages=[{"role": "user", "content": prompt}],
+            urgency=job_scope.get("urgency", "normal")
         )
 
         content = response["content"][0]["text"]
@@ -86,18 +141,168 @@ Sort by score descending."""
     except Exception as e:
         ctx.logger.error(f"Claude ranking failed: {str(e)}")
         # Return default scoring
-        return [
-            {
-                "professional_id": c["id"],
-                "score": 95 - (i * 5),  # Simple descending scores
-                "reason": f"{c['name']} is a qualified {c['trade']} professional in your area with {c.get('rating', 'N/A')} ratings.",
-                "concerns": None
-            }
-            for i, c in enumerate(candidates[:10])
+        return default_matches(candidates)
+
+
+async def rank_with_claude_streaming(
+    job_scope: dict,
+    candidates: list,
+    ctx: Context,
+    on_match: Callable[[dict], Awaitable[None]]
+) -> list:
+    """
+    Stream Claude's ranking and hand each match to ``on_match`` as soon
+    as its JSON object is complete; returns all matches, best first
+    """
+    matches = []
+    try:
+        ctx.logger.info(f"Streaming ranking of {len(candidates)} candidates with Claude")
+
+        parser = IncrementalArrayParser()
+        stream = claude_client.astream_message(
+            model="claude-3-opus-20240229",
+            max_tokens=2048,
+            messages=[{"role": "user", "content": build_ranking_prompt(job_scope, candidates, ctx)}],
+            urgency=job_scope.get("urgency", "normal")
+        )
+        async for text in stream:
+            for match in parser.feed(text):
+                matches.append(match)
+                await on_match(match)
+
+        if not matches:
+            raise ValueError("No JSON array found in Claude response")
+
+    except Exception as e:
+        ctx.logger.error(f"Claude streaming ranking failed: {str(e)}")
+        if not matches:
+            # Return default scoring
+            return default_matches(candidates)
+
+    return sorted(matches, key=lambda m: m.get("score", 0), reverse=True)
+
+
+async def rank_batch_with_claude(entries: list) -> list:
+    """
+    Rank several jobs in one Claude call
+
+    Each entry is (job_id, job_scope, candidates, ctx). Jobs missing or
+    malformed in the batched response are re-ranked individually.
+    """
+    if len(entries) == 1:
+        job_id, job_scope, candidates, ctx = entries[0]
+        return [await rank_with_claude(job_scope, candidates, ctx)]
+
+    ctx = entries[0][3]
+    results = {}
+
+    try:
+        ctx.logger.info(f"Ranking {len(entries)} jobs in one Claude call")
+
+        sections = [
+            (job_id, candidate_section(job_scope, candidates, job_ctx, "batch_ranking"))
+            for job_id, job_scope, candidates, job_ctx in entries
         ]
+        jobs_text = "\n\n".join([
+            f"### Job {job_id}\n"
+            f"Project Requirements: {section.scope}\n"
+            f"Candidate Contractors (one per line, columns in the first line):\n{section.table}"
+            for job_id, section in sections
+        ])
+
+        prompt = f"""You are matching several customers' projects with contractors.
+Rank the candidates of each job independently.
+
+{jobs_text}
+
+For every job, rank its contractors and provide:
+1. A score (0-100) for each based on fit
+2. A brief reason why they're a good match
+3. Any concerns or caveats
+
+Return a JSON object ONLY, mapping each job id to its ranked array:
+{{
+  "job_id": [
+    {{
+      "professional_id": "id column",
+      "score": 95,
+      "reason": "Excellent match because...",
+      "concerns": "optional concerns"
+    }}
+  ]
+}}
+
+Sort each array by score descending."""
+
+        # The batch waits in the governor queue at its most urgent job's priority
+        urgency = min(
+            (job_scope.get("urgency", "normal") for _, job_scope, _, _ in entries),
+            key=lambda u: URGENCY_PRIORITY.get(u, URGENCY_PRIORITY["normal"])
+        )
+        response = await claude_client.acreate_message(
+            model="claude-3-opus-20240229",
+            max_tokens=min(4096, 1024 * len(entries)),
+            messages=[{"role": "user", "content": prompt}],
+            urgency=urgency
+        )
+
+        content = response["content"][0]["text"]
+
+        json_start = content.find('{')
+        json_end = content.rfind('}') + 1
+        if json_start >= 0 and json_end > json_start:
+            parsed = json.loads(content[json_start:json_end])
+            if isinstance(parsed, dict):
+                results = parsed
+        else:
+            raise ValueError("No JSON object found in Claude response")
+
+    except Exception as e:
+        ctx.logger.error(f"Batched Claude ranking failed: {str(e)}")
+
+    # Isolate per-job failures: anything not ranked in the batch goes alone
+    async def resolve(entry):
+        job_id, job_scope, candidates, job_ctx = entry
+        matches = results.get(job_id)
+        if isinstance(matches, list) and all(isinstance(m, dict) and "professional_id" in m for m in matches):
+            return matches
+        job_ctx.logger.warning(f"Job {job_id} missing from batched ranking, ranking individually")
+        return await rank_with_claude(job_scope, candidates, job_ctx)
+
+    return await asyncio.gather(*(resolve(entry) for entry in entries))
+
+
+ranking_batcher = MicroBatcher(
+    rank_batch_with_claude,
+    window=MATCHER_BATCH_WINDOW_MS / 1000.0,
+    max_size=MATCHER_BATCH_MAX_SIZE,
+) if MATCHER_BATCH_ENABLED else None
+
+
+def search_professional_index(job_scope: dict, state: str) -> list:
+    index = get_professional_index()
+    index.refresh()
+    return index.search_job(job_scope, k=INDEX_QUERY_K, state=state)
+
+
+async def find_indexed_candidates(job_scope: dict, location: dict, existing: list, ctx: Context) -> list:
+    """Query the professional index by job scope, skipping known candidates"""
+    try:
+        # The index lock is also held by the indexer's writes; wait for it
+        # in a worker thread rather than on the shared event loop
+        results = await asyncio.to_thread(search_professional_index, job_scope, location.get("state"))
+    except Exception as e:
+        ctx.logger.warning(f"Professional index query failed: {str(e)}")
+        return []
+
+    seen = {c["id"] for c in existing}
+    indexed = [r for r in results if r["id"] not in seen]
+    ctx.logger.info(f"Found {len(indexed)} additional candidates in professional index")
+    return indexed
 
 
 @matcher_protocol.on_message(model=MatchRequest)
+@timed_stage("match")
 async def handle_match_request(ctx: Context, sender: str, msg: MatchRequest):
     """Find and rank contractor matches"""
     ctx.logger.info(f"Received match request for job {msg.job_id}")
@@ -114,21 +319,42 @@ async def handle_match_request(ctx: Context, sender: str, msg: MatchRequest):
             )
         )
 
-        # In a real implementation, this would:
-        # 1. Query ChromaDB for vector similarity
-        # 2. Apply business filters
-        # 3. Re-rank with Claude
-
-        # For this demo, we'll assume candidates are passed in the request
-        # In production, integrate with ChromaDB client here
-        candidates = msg.job_scope.get("candidates", [])
+        # Candidates passed in the request (fresh from the scraper) come
+        # first, then similar professionals from the local vector index
+        if msg.candidates is not None:
+            candidates = decode_candidates(msg.candidates)
+        else:
+            candidates = list(msg.job_scope.get("candidates", []))
+        candidates.extend(await find_indexed_candidates(msg.job_scope, msg.location, candidates, ctx))
 
         if not candidates:
             ctx.logger.warning("No candidates provided in match request")
-            candidates = []
 
-        # Rank with Claude
-        matches = await rank_with_claude(msg.job_scope, candidates, ctx)
+        # Score the whole pool and keep only the best for Claude
+        pool_size = len(candidates)
+        candidates = prerank_candidates(msg.job_scope, msg.location, candidates, k=MATCHER_TOP_K)
+        ctx.logger.info(f"Pre-ranked {pool_size} candidates, sending top {len(candidates)} to Claude")
+
+        # Rank with Claude (emergencies skip the batching window)
+        if ranking_batcher is not None and msg.job_scope.get("urgency") != "emergency":
+            matches = await ranking_batcher.submit((msg.job_id, msg.job_scope, candidates, ctx))
+        elif MATCHER_STREAMING:
+            async def send_partial(match: dict):
+                await ctx.send(
+                    sender,
+                    MatchResults(
+                        job_id=msg.job_id,
+                        matches=[match],
+                        count=1,
+                        success=True,
+                        partial=True,
+                        trace_id=msg.trace_id
+                    )
+                )
+
+            matches = await rank_with_claude_streaming(msg.job_scope, candidates, ctx, send_partial)
+        else:
+            matches = await rank_with_claude(msg.job_scope, candidates, ctx)
 
         ctx.logger.info(f"Ranked {len(matches)} matches")
 
@@ -139,7 +365,8 @@ async def handle_match_request(ctx: Context, sender: str, msg: MatchRequest):
                 job_id=msg.job_id,
                 matches=matches,
                 count=len(matches),
-                success=True
+                success=True,
+                trace_id=msg.trace_id
             )
         )
 
@@ -156,6 +383,12 @@ async def handle_match_request(ctx: Context, sender: str, msg: MatchRequest):
         )
 
 
+@matcher_agent.on_event("shutdown")
+async def close_claude_client(ctx: Context):
+    """Release pooled Claude/Lava connections"""
+    await claude_client.aclose()
+
+
 # Include protocol
 matcher_agent.include(matcher_protocol)
 
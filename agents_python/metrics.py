@@ -0,0 +1,280 @@
+"""
+In-process pipeline metrics rendered in the Prometheus text format
+Counters, gauges and histograms shared by every agent in the process, plus
+a bounded log of per-trace stage timings; the API bridge serves them at
+/metrics and /api/traces/{trace_id}
+"""
+import time
+import uuid
+import functools
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonic count per label set"""
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def collect(self) -> Dict[LabelValues, float]:
+        """Current value of every label set"""
+        with self._lock:
+            return dict(self._values)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+
+class Gauge(Counter):
+    """Current value per label set (set when /metrics is scraped)"""
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram per label set"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # label values -> [bucket counts..., sum, count]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels) -> int:
+        series = self._values.get(self._key(labels))
+        return series[-1] if series else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._values.items())
+
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {round(series[-2], 6)}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """All metrics of the process, in registration order"""
+
+    def __init__(self):
+        self._metrics: "OrderedDict[str, _Metric]" = OrderedDict()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class TraceLog:
+    """
+    Stage timings of the most recent ``max_traces`` traces
+
+    Each trace maps stage -> {"queue": seconds, "service": seconds}, so a
+    slow job can be broken down without a tracing backend.
+    """
+
+    def __init__(self, max_traces: int = 1000):
+        self.max_traces = max_traces
+        self._traces: "OrderedDict[str, Dict[str, Dict[str, float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, trace_id: Optional[str], stage: str, kind: str, seconds: float):
+        if not trace_id:
+            return
+        with self._lock:
+            trace = self._traces.get(trace_id)
+            if trace is None:
+                trace = self._traces[trace_id] = {}
+                while len(self._traces) > self.max_traces:
+                    self._traces.popitem(last=False)
+            trace.setdefault(stage, {})[kind] = round(seconds, 6)
+
+    def get(self, trace_id: str) -> Optional[Dict[str, Dict[str, float]]]:
+        with self._lock:
+            trace = self._traces.get(trace_id)
+            return {stage: dict(timings) for stage, timings in trace.items()} if trace is not None else None
+
+
+registry = MetricsRegistry()
+traces = TraceLog()
+
+stage_queue_seconds = registry.histogram(
+    "renova_stage_queue_seconds",
+    "Time a stage message waited in the coordinator scheduler before dispatch",
+    ("stage", "urgency"),
+)
+stage_service_seconds = registry.histogram(
+    "renova_stage_service_seconds",
+    "Time an agent spent handling a stage message",
+    ("stage",),
+)
+job_duration_seconds = registry.histogram(
+    "renova_job_duration_seconds",
+    "End-to-end job latency seen by the API bridge",
+    ("outcome",),
+)
+claude_tokens = registry.counter(
+    "renova_claude_tokens_total",
+    "Claude tokens reported by the API",
+    ("direction",),
+)
+claude_requests = registry.counter(
+    "renova_claude_requests_total",
+    "Claude calls by route (lava, direct, cache)",
+    ("route",),
+)
+cache_lookups = registry.counter(
+    "renova_cache_lookups_total",
+    "Cache lookups by cache and result",
+    ("cache", "result"),
+)
+fallbacks = registry.counter(
+    "renova_fallbacks_total",
+    "Times a component fell back to a cheaper or secondary path",
+    ("component", "reason"),
+)
+prompt_tokens_saved = registry.counter(
+    "renova_prompt_tokens_saved_total",
+    "Estimated Claude input tokens saved by compact prompts over the previous format",
+    ("prompt",),
+)
+prompt_candidates_dropped = registry.counter(
+    "renova_prompt_candidates_dropped_total",
+    "Candidates left out of a prompt by its token budget",
+    ("prompt",),
+)
+
+
+def record_stage_queue(stage: str, urgency: str, trace_id: Optional[str], seconds: float):
+    stage_queue_seconds.observe(seconds, stage=stage, urgency=urgency)
+    traces.record(trace_id, stage, "queue", seconds)
+
+
+def record_claude_usage(usage: Optional[Dict]):
+    """Count input/output tokens from a Claude ``usage`` block"""
+    if not usage:
+        return
+    claude_tokens.inc(usage.get("input_tokens") or 0, direction="input")
+    claude_tokens.inc(usage.get("output_tokens") or 0, direction="output")
+
+
+def timed_stage(stage: str) -> Callable:
+    """
+    Decorator for agent message handlers: records the handler's service
+    time for ``stage`` (and the message's trace, if it carries one)
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(ctx, sender, msg):
+            started = time.monotonic()
+            try:
+                await handler(ctx, sender, msg)
+            finally:
+                seconds = time.monotonic() - started
+                stage_service_seconds.observe(seconds, stage=stage)
+                traces.record(getattr(msg, "trace_id", None), stage, "service", seconds)
+        return wrapper
+    return decorator
@@ -13,6 +13,13 @@ class JobRequest(Model):
     state: str
     zip_code: Optional[str] = None
     photo_urls: List[str] = []
+    trace_id: Optional[str] = None  # Carried through every stage of the job
+
+
+class BatchJobRequest(Model):
+    """Many job requests submitted together (fields as in JobRequest)"""
+    batch_id: str
+    jobs: List[dict]
 
 
 class JobScope(Model):
@@ -24,6 +31,10 @@ class JobScope(Model):
     project_type: str
     budget_hint: Optional[str] = None
     location_requirements: Optional[str] = None
+    city: Optional[str] = None
+    state: Optional[str] = None
+    zip_code: Optional[str] = None
+    trace_id: Optional[str] = None
 
 
 class ProfessionalData(Model):
@@ -44,8 +55,11 @@ class ProfessionalData(Model):
 class ProfessionalsList(Model):
     """List of professionals from ScraperAgent"""
     job_id: str
-    professionals: List[dict]  # Will be serialized ProfessionalData
+    professionals: List[dict] = []  # Serialized ProfessionalData, when not packed
     count: int
+    packed: Optional[dict] = None  # candidate_codec payload (replaces professionals)
+    trade: Optional[str] = None  # Trade the professionals were searched for
+    trace_id: Optional[str] = None
 
 
 class IndexingComplete(Model):
@@ -60,6 +74,8 @@ class MatchRequest(Model):
     job_id: str
     job_scope: dict  # Serialized JobScope
     location: dict  # {city, state}
+    trace_id: Optional[str] = None
+    candidates: Optional[dict] = None  # candidate_codec payload of the professionals to rank
 
 
 class Match(Model):
@@ -76,6 +92,8 @@ class MatchResults(Model):
     matches: List[dict]  # Serialized Match objects
     count: int
     success: bool
+    partial: bool = False  # True for a single streamed match ahead of the final results
+    trace_id: Optional[str] = None
 
 
 class ProgressUpdate(Model):
@@ -92,3 +110,4 @@ class ErrorMessage(Model):
     agent: str
     error: str
     timestamp: str
+    trade: Optional[str] = None  # Trade being scraped, for ScraperAgent errors
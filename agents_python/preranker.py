@@ -0,0 +1,112 @@
+"""
+Vectorized structured pre-ranker for MatcherAgent
+Scores every candidate in one NumPy pass so only the top-k reach Claude
+"""
+import os
+import numpy as np
+from typing import Dict, List
+
+# Relative weight of each feature in the pre-rank score
+PRERANK_WEIGHTS = {
+    "rating": float(os.getenv("PRERANK_WEIGHT_RATING", "0.30")),
+    "price": float(os.getenv("PRERANK_WEIGHT_PRICE", "0.15")),
+    "services": float(os.getenv("PRERANK_WEIGHT_SERVICES", "0.25")),
+    "trade": float(os.getenv("PRERANK_WEIGHT_TRADE", "0.20")),
+    "location": float(os.getenv("PRERANK_WEIGHT_LOCATION", "0.10")),
+}
+
+PRICE_LEVELS = {"$": 1, "$$": 2, "$$$": 3, "$$$$": 4}
+BUDGET_LEVELS = {"low": 1, "medium": 2, "high": 3, "premium": 4}
+
+
+def _tokens(values) -> set:
+    return {t for v in values for t in str(v).lower().split()}
+
+
+def extract_features(candidates: List[Dict], job_services: set) -> Dict[str, np.ndarray]:
+    """
+    Column arrays of the raw candidate fields, built in a single pass
+
+    This is the only per-candidate Python loop; all scoring happens on
+    the resulting arrays.
+    """
+    ratings, prices, overlap = [], [], []
+    trades, cities, states = [], [], []
+
+    for c in candidates:
+        ratings.append(c.get("rating") or 0.0)
+        prices.append(PRICE_LEVELS.get(c.get("price_band") or "", 0))
+        overlap.append(len(job_services & _tokens(c.get("services", []))) if job_services else 0)
+        trades.append((c.get("trade") or "").lower())
+        cities.append((c.get("city") or "").lower())
+        states.append((c.get("state") or "").lower())
+
+    return {
+        "rating": np.array(ratings, dtype=np.float32),
+        "price": np.array(prices, dtype=np.float32),
+        "overlap": np.array(overlap, dtype=np.float32),
+        "trade": np.array(trades),
+        "city": np.array(cities),
+        "state": np.array(states),
+    }
+
+
+def score_candidates(job_scope: Dict, location: Dict, candidates: List[Dict]) -> np.ndarray:
+    """Weighted feature score in [0, 1] for every candidate"""
+    n = len(candidates)
+    if n == 0:
+        return np.zeros(0, dtype=np.float32)
+
+    job_services = _tokens(job_scope.get("services", []))
+    f = extract_features(candidates, job_services)
+
+    # Rating, scaled to [0, 1]
+    rating_score = np.clip(f["rating"] / 5.0, 0.0, 1.0)
+
+    # Price band distance from the budget hint (neutral when either is unknown)
+    budget = BUDGET_LEVELS.get((job_scope.get("budget_hint") or "").lower(), 0)
+    if budget:
+        price_score = np.where(f["price"] > 0, 1.0 - np.abs(f["price"] - budget) / 3.0, 0.5)
+    else:
+        price_score = np.full(n, 0.5, dtype=np.float32)
+
+    # Fraction of the job's service words the candidate offers
+    service_score = f["overlap"] / len(job_services) if job_services else np.zeros(n, dtype=np.float32)
+
+    # Exact trade and location matches
+    trade_score = (f["trade"] == (job_scope.get("trade") or "").lower()).astype(np.float32)
+    state_match = f["state"] == (location.get("state") or "").lower()
+    city_match = f["city"] == (location.get("city") or "").lower()
+    location_score = 0.5 * state_match + 0.5 * (city_match & state_match)
+
+    w = PRERANK_WEIGHTS
+    total = sum(w.values()) or 1.0
+    return (
+        w["rating"] * rating_score
+        + w["price"] * price_score
+        + w["services"] * service_score
+        + w["trade"] * trade_score
+        + w["location"] * location_score
+    ) / total
+
+
+def prerank_candidates(
+    job_scope: Dict,
+    location: Dict,
+    candidates: List[Dict],
+    k: int,
+) -> List[Dict]:
+    """Top-k candidates by pre-rank score, best first"""
+    if len(candidates) == 0:
+        return []
+
+    scores = score_candidates(job_scope, location, candidates)
+
+    if len(candidates) > k:
+        top = np.sort(np.argpartition(-scores, k)[:k])
+    else:
+        top = np.arange(len(candidates))
+    # Stable sort keeps the incoming order (fresh scrape first) on ties
+    top = top[np.argsort(-scores[top], kind="stable")]
+
+    return [candidates[i] for i in top]
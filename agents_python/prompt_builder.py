@@ -0,0 +1,113 @@
+"""
+Token-budgeted prompt sections for Claude ranking calls
+The job scope is serialized compactly without its candidates, candidates go
+in a pipe-separated table (one row each, best first), and rows are added
+until the prompt reaches its token budget
+"""
+import os
+import json
+from dataclasses import dataclass
+from typing import Dict, List
+
+# Rough characters per token for English mixed with JSON; errs on the high side
+CHARS_PER_TOKEN = float(os.getenv("PROMPT_CHARS_PER_TOKEN", "3.5"))
+
+# Job scope fields that never go into a prompt (candidates have their own table)
+SCOPE_OMIT = ("candidates",)
+
+CANDIDATE_COLUMNS = ("id", "name", "trade", "city", "state", "services", "rating", "price")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate Claude token count of ``text`` (no tokenizer round trip)"""
+    if not text:
+        return 0
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def compact_scope(job_scope: Dict) -> str:
+    """The job scope as single-line JSON, without candidates or empty fields"""
+    return json.dumps(
+        {k: v for k, v in job_scope.items() if k not in SCOPE_OMIT and v not in (None, "", [], {})},
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+
+
+def _cell(value) -> str:
+    if isinstance(value, (list, tuple)):
+        value = ";".join(str(v) for v in value)
+    return " ".join(str(value if value is not None else "").split()).replace("|", "/")
+
+
+def candidate_row(candidate: Dict) -> str:
+    return "|".join([
+        _cell(candidate.get("id")),
+        _cell(candidate.get("name")),
+        _cell(candidate.get("trade")),
+        _cell(candidate.get("city")),
+        _cell(candidate.get("state")),
+        _cell(candidate.get("services", [])),
+        _cell(candidate.get("rating", "")),
+        _cell(candidate.get("price_band") or "medium"),
+    ])
+
+
+def verbose_tokens(job_scope: Dict, candidates: List[Dict]) -> int:
+    """
+    Estimated tokens of the previous prompt format: the whole scope
+    pretty-printed (candidates included) plus a multi-line entry per candidate
+    """
+    listing = "\n\n".join(
+        f"{i + 1}. {c.get('name')} - {c.get('trade')} in {c.get('city')}, {c.get('state')}\n"
+        f"   Services: {', '.join(c.get('services', []))}\n"
+        f"   Rating: {c.get('rating', 'N/A')}\n"
+        f"   Price: {c.get('price_band', 'medium')}"
+        for i, c in enumerate(candidates)
+    )
+    return estimate_tokens(json.dumps(job_scope, indent=2)) + estimate_tokens(listing)
+
+
+@dataclass
+class CandidateSection:
+    """One job's scope and candidate table, fitted to a token budget"""
+    scope: str
+    table: str
+    included: int
+    dropped: int
+    tokens: int
+    baseline_tokens: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.baseline_tokens - self.tokens)
+
+
+def build_candidate_section(job_scope: Dict, candidates: List[Dict], budget_tokens: int) -> CandidateSection:
+    """
+    Compact scope plus as many candidate rows as fit in ``budget_tokens``
+
+    Candidates are expected best first (pre-ranked), so the ones cut by
+    the budget are the weakest. At least one row is always kept.
+    """
+    scope = compact_scope(job_scope)
+    header = "|".join(CANDIDATE_COLUMNS)
+    used = estimate_tokens(scope) + estimate_tokens(header)
+
+    rows = []
+    for candidate in candidates:
+        row = candidate_row(candidate)
+        cost = estimate_tokens(row)
+        if rows and used + cost > budget_tokens:
+            break
+        rows.append(row)
+        used += cost
+
+    return CandidateSection(
+        scope=scope,
+        table="\n".join([header] + rows),
+        included=len(rows),
+        dropped=len(candidates) - len(rows),
+        tokens=used,
+        baseline_tokens=verbose_tokens(job_scope, candidates),
+    )
@@ -0,0 +1,198 @@
+"""
+Near-duplicate prompt cache for IntakeAgent
+Reuses the JobScope fields extracted for a previous, sufficiently similar prompt
+"""
+import os
+import re
+import json
+import math
+import zlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# Words that carry no signal about trade, services or urgency
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "to", "for", "of", "in", "on", "at", "my",
+    "our", "i", "we", "me", "is", "are", "it", "this", "that", "with", "be",
+    "need", "needs", "want", "looking", "please", "someone", "help", "get",
+    "have", "has", "can", "could", "would", "some", "from",
+}
+
+NGRAM_SIZE = 3
+VECTOR_BUCKETS = 1 << 20
+
+
+def normalize_prompt(prompt: str) -> List[str]:
+    """Lowercase, strip punctuation and drop stopwords"""
+    words = re.findall(r"[a-z0-9]+", prompt.lower())
+    return [w for w in words if w not in STOPWORDS]
+
+
+def vectorize(tokens: List[str]) -> Dict[int, float]:
+    """
+    Hashed, L2-normalized vector of word unigrams and character n-grams
+
+    Character n-grams make the vector tolerant to plurals and small
+    spelling differences ("leak" / "leaking" / "leaky").
+    """
+    counts: Dict[int, float] = {}
+    for token in tokens:
+        features = [f"w:{token}"]
+        padded = f"#{token}#"
+        features.extend(
+            f"c:{padded[i:i + NGRAM_SIZE]}" for i in range(max(1, len(padded) - NGRAM_SIZE + 1))
+        )
+        for feature in features:
+            bucket = zlib.crc32(feature.encode("utf-8")) % VECTOR_BUCKETS
+            counts[bucket] = counts.get(bucket, 0.0) + 1.0
+
+    norm = math.sqrt(sum(v * v for v in counts.values()))
+    if norm == 0:
+        return {}
+    return {k: v / norm for k, v in counts.items()}
+
+
+def cosine(a: Dict[int, float], b: Dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+class SimilarPromptCache:
+    """
+    Bounded similarity index of past prompts and their extracted scopes
+
+    Candidates are shortlisted through an inverted word index and scored
+    by cosine similarity of hashed n-gram vectors. Matches at or above
+    ``threshold`` are hits; anything lower is left for Claude.
+    """
+
+    def __init__(self, threshold: float = 0.85, max_entries: int = 2000, path: Optional[str] = None):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.path = path
+
+        # entry id -> {"prompt", "tokens", "vector", "scope"}
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._index: Dict[str, set] = {}
+        self._next_id = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.low_confidence = 0
+
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def lookup(self, prompt: str) -> Optional[Tuple[Dict, float]]:
+        """Return (scope, similarity) for the best match above threshold"""
+        tokens = normalize_prompt(prompt)
+        vector = vectorize(tokens)
+
+        with self._lock:
+            best_id, best_score = self._best_match(tokens, vector)
+
+            if best_id is not None and best_score >= self.threshold:
+                self._entries.move_to_end(best_id)
+                self.hits += 1
+                return dict(self._entries[best_id]["scope"]), best_score
+
+            if best_id is not None:
+                self.low_confidence += 1
+            self.misses += 1
+            return None
+
+    def add(self, prompt: str, scope: Dict):
+        """Remember the scope extracted for a prompt"""
+        tokens = normalize_prompt(prompt)
+        if not tokens:
+            return
+
+        with self._lock:
+            self._insert(prompt, tokens, dict(scope))
+            self._dirty = True
+
+    def items(self) -> List[Tuple[str, Dict]]:
+        """(prompt, scope) pairs currently cached, oldest first"""
+        with self._lock:
+            return [(entry["prompt"], entry["scope"]) for entry in self._entries.values()]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "low_confidence": self.low_confidence,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "threshold": self.threshold,
+            }
+
+    def save(self, path: Optional[str] = None):
+        """Persist prompts and scopes as JSON (vectors are rebuilt on load)"""
+        path = path or self.path
+        if not path or not self._dirty:
+            return
+
+        with self._lock:
+            self._dirty = False
+            data = [
+                {"prompt": entry["prompt"], "scope": entry["scope"]}
+                for entry in self._entries.values()
+            ]
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str):
+        with open(path) as f:
+            data = json.load(f)
+
+        with self._lock:
+            for item in data:
+                tokens = normalize_prompt(item["prompt"])
+                if tokens:
+                    self._insert(item["prompt"], tokens, item["scope"])
+
+    def _best_match(self, tokens: List[str], vector: Dict[int, float]) -> Tuple[Optional[int], float]:
+        candidate_ids = set()
+        for token in set(tokens):
+            candidate_ids.update(self._index.get(token, ()))
+
+        best_id, best_score = None, 0.0
+        for entry_id in candidate_ids:
+            score = cosine(vector, self._entries[entry_id]["vector"])
+            if score > best_score:
+                best_id, best_score = entry_id, score
+        return best_id, best_score
+
+    def _insert(self, prompt: str, tokens: List[str], scope: Dict):
+        entry_id = self._next_id
+        self._next_id += 1
+
+        self._entries[entry_id] = {
+            "prompt": prompt,
+            "tokens": tokens,
+            "vector": vectorize(tokens),
+            "scope": scope,
+        }
+        for token in set(tokens):
+            self._index.setdefault(token, set()).add(entry_id)
+
+        while len(self._entries) > self.max_entries:
+            old_id, old_entry = self._entries.popitem(last=False)
+            for token in set(old_entry["tokens"]):
+                ids = self._index.get(token)
+                if ids is not None:
+                    ids.discard(old_id)
+                    if not ids:
+                        del self._index[token]
@@ -0,0 +1,96 @@
+"""
+Token-bucket rate limiter with an optional daily cap
+Used to keep outbound API calls (e.g. Yelp) under the provider's limits
+"""
+import time
+import asyncio
+from datetime import datetime, timezone
+from typing import Optional
+
+
+class RateLimitExceeded(Exception):
+    """Raised when the daily cap is used up"""
+
+
+class TokenBucket:
+    """
+    Allows ``rate`` calls per second with bursts of up to ``capacity``,
+    and at most ``daily_limit`` calls per UTC day (0 = unlimited)
+
+    ``acquire`` waits for a token; it raises RateLimitExceeded instead of
+    waiting when the daily cap is exhausted, since that only resets at
+    midnight UTC.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, daily_limit: int = 0):
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, got {rate}")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.daily_limit = daily_limit
+
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = None
+        self._day = self._today()
+        self.used_today = 0
+
+        self.acquired = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+        self.rejected = 0
+
+    @staticmethod
+    def _today() -> str:
+        return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _take_daily(self):
+        today = self._today()
+        if today != self._day:
+            self._day = today
+            self.used_today = 0
+        if self.daily_limit and self.used_today >= self.daily_limit:
+            self.rejected += 1
+            raise RateLimitExceeded(f"Daily limit of {self.daily_limit} calls reached")
+        self.used_today += 1
+
+    async def acquire(self):
+        """Wait until a call is allowed"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        # Each caller reserves its token under the lock (the balance may go
+        # negative) and sleeps outside it, so waiters are served in FIFO
+        # order without queueing behind each other's sleeps
+        async with self._lock:
+            self._take_daily()
+            self._refill()
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+        if wait:
+            self.waited += 1
+            self.wait_seconds += wait
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                # Hand the reserved token back to later callers
+                self._tokens += 1
+                raise
+        self.acquired += 1
+
+    def stats(self) -> dict:
+        return {
+            "rate": self.rate,
+            "acquired": self.acquired,
+            "waited": self.waited,
+            "avg_wait": round(self.wait_seconds / self.waited, 4) if self.waited else 0.0,
+            "used_today": self.used_today,
+            "daily_limit": self.daily_limit,
+            "rejected": self.rejected,
+        }
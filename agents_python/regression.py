@@ -0,0 +1,135 @@
+"""
+Performance regression runner
+Replays a recorded cassette (jobs with their arrival times, Claude and Yelp
+responses with their latencies) through the pipeline offline, then checks
+the report against budgets: absolute limits and allowed change relative to
+a baseline report. Exits non-zero when a budget is exceeded.
+
+    python regression.py --cassette traffic.jsonl.gz --output baseline.json
+    python regression.py --cassette traffic.jsonl.gz --baseline baseline.json
+
+Budgets map a dotted report path to ``{"max": x}``, ``{"min": x}``,
+``{"max_increase_pct": p}`` or ``{"max_decrease_pct": p}`` (the last two
+need --baseline); --budgets takes a JSON file that extends DEFAULT_BUDGETS.
+"""
+import os
+import sys
+import json
+import argparse
+from typing import Dict, List, Optional
+from cassettes import Cassette
+from loadtest import Schedule, add_run_arguments, run_offline, write_report
+
+DEFAULT_BUDGETS = {
+    "outcomes.failed": {"max": 0},
+    "outcomes.timed_out": {"max": 0},
+    "cassette.misses": {"max": 0},
+    "throughput_jobs_per_sec": {"max_decrease_pct": 10},
+    "latency.p50": {"max_increase_pct": 15},
+    "latency.p95": {"max_increase_pct": 20},
+    "latency.p99": {"max_increase_pct": 25},
+    "claude.input_tokens": {"max_increase_pct": 5},
+    "claude.output_tokens": {"max_increase_pct": 5},
+}
+
+
+def recorded_schedule(path: str, arrival_scale: float) -> Schedule:
+    """The cassette's jobs at their recorded arrival offsets (times ``arrival_scale``)"""
+    entries = Cassette(path, "replay").jobs()
+    if not entries:
+        raise ValueError(f"Cassette {path} has no recorded jobs")
+    first = entries[0]["at"]
+    return [
+        ((entry["at"] - first) * arrival_scale, {**entry["job"], "job_id": f"replay-{i}"})
+        for i, entry in enumerate(entries)
+    ]
+
+
+def report_value(report: Dict, path: str) -> Optional[float]:
+    value = report
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value if isinstance(value, (int, float)) else None
+
+
+def check_budgets(report: Dict, budgets: Dict[str, Dict], baseline: Optional[Dict] = None) -> List[Dict]:
+    """One check per budget rule; relative rules are skipped without a baseline"""
+    checks = []
+    for path, rules in budgets.items():
+        value = report_value(report, path)
+        previous = report_value(baseline, path) if baseline else None
+        for rule, limit in rules.items():
+            check = {"metric": path, "rule": rule, "limit": limit, "value": value}
+            if rule in ("max_increase_pct", "max_decrease_pct"):
+                if baseline is None:
+                    continue
+                check["baseline"] = previous
+                if value is None or previous is None:
+                    check["passed"] = False
+                    check["reason"] = "missing from report or baseline"
+                elif previous == 0:
+                    check["passed"] = value == 0 if rule == "max_increase_pct" else True
+                else:
+                    change = (value - previous) / previous * 100
+                    check["change_pct"] = round(change, 2)
+                    check["passed"] = change <= limit if rule == "max_increase_pct" else -change <= limit
+            elif rule in ("max", "min"):
+                if value is None:
+                    check["passed"] = False
+                    check["reason"] = "missing from report"
+                else:
+                    check["passed"] = value <= limit if rule == "max" else value >= limit
+            else:
+                raise ValueError(f"Unknown budget rule {rule!r} for {path}")
+            checks.append(check)
+    return checks
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Replay a cassette and check performance budgets")
+    parser.add_argument("--cassette", required=True, help="Recording made with CASSETTE_MODE=record")
+    parser.add_argument("--baseline", help="Earlier report to compare against")
+    parser.add_argument("--budgets", help="JSON file of budgets (extends the defaults)")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiplier on recorded call latencies")
+    parser.add_argument("--arrival-scale", type=float, default=1.0,
+                        help="Multiplier on recorded arrival times (0 = all jobs at once)")
+    add_run_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    budgets = dict(DEFAULT_BUDGETS)
+    if args.budgets:
+        with open(args.budgets) as f:
+            budgets.update(json.load(f))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    # Calls are served from the cassette; the stubs only answer anything it lacks
+    env = {
+        "CASSETTE_MODE": "replay",
+        "CASSETTE_PATH": os.path.abspath(args.cassette),
+        "CASSETTE_LATENCY_SCALE": str(args.latency_scale),
+    }
+    report = {"config": vars(args)}
+    report.update(run_offline(args, lambda: recorded_schedule(args.cassette, args.arrival_scale), env))
+
+    checks = check_budgets(report, budgets, baseline)
+    report["checks"] = checks
+    report["passed"] = all(check["passed"] for check in checks)
+    write_report(report, args.output)
+
+    for check in checks:
+        if not check["passed"]:
+            print(f"FAILED {check['metric']} {check['rule']}={check['limit']}: "
+                  f"{check['value']} (baseline {check.get('baseline')})", file=sys.stderr)
+    return 0 if report["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
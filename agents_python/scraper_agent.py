@@ -3,10 +3,20 @@ ScraperAgent - Finds professionals using Yelp API
 Fetch.ai uAgent for Agentverse deployment
 """
 import os
-import requests
+import time
+import asyncio
+import aiohttp
 from datetime import datetime
+from typing import Optional
 from uagents import Agent, Context, Protocol
 from models import JobScope, ProfessionalsList, ProgressUpdate, ErrorMessage
+from cache import TTLCache, make_cache_key
+from locations import canonical_location
+from single_flight import SingleFlight
+from rate_limiter import TokenBucket
+from metrics import cache_lookups, fallbacks, timed_stage
+from cassettes import get_cassette
+from candidate_codec import encode_candidates
 
 # Create agent
 scraper_agent = Agent(
@@ -14,11 +24,53 @@ scraper_agent = Agent(
     seed="renova_scraper_seed_phrase_2025",
     port=8002,
     endpoint=["http://localhost:8002/submit"],
+    handle_messages_concurrently=True,
 )
 
 # Yelp API configuration
 YELP_API_KEY = os.getenv("YELP_API_KEY")
-YELP_API_URL = "https://api.yelp.com/v3/businesses/search"
+YELP_API_HOST = os.getenv("YELP_API_HOST", "https://api.yelp.com")
+YELP_API_URL = f"{YELP_API_HOST}/v3/businesses/search"
+
+# Connection pool configuration
+YELP_TIMEOUT = float(os.getenv("YELP_TIMEOUT", "10"))
+YELP_MAX_CONNECTIONS = int(os.getenv("YELP_MAX_CONNECTIONS", "32"))
+YELP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("YELP_MAX_CONNECTIONS_PER_HOST", "8"))
+YELP_KEEPALIVE_TIMEOUT = float(os.getenv("YELP_KEEPALIVE_TIMEOUT", "60"))
+
+# Shared HTTP session (created lazily, reused across all searches)
+_yelp_session: Optional[aiohttp.ClientSession] = None
+
+# Search results cache: entries are fresh for YELP_CACHE_TTL seconds, then
+# served stale for up to YELP_CACHE_STALE_TTL more while a refresh runs
+YELP_CACHE_TTL = float(os.getenv("YELP_CACHE_TTL", "3600"))
+YELP_CACHE_STALE_TTL = float(os.getenv("YELP_CACHE_STALE_TTL", "86400"))
+yelp_cache = TTLCache(
+    max_entries=int(os.getenv("YELP_CACHE_MAX_ENTRIES", "2048")),
+    ttl=YELP_CACHE_TTL + YELP_CACHE_STALE_TTL,
+    db_path=os.getenv("YELP_CACHE_PATH") or None,
+)
+_yelp_refreshing = set()
+_yelp_refresh_tasks = set()
+
+# Concurrent identical searches share one Yelp call
+yelp_flight = SingleFlight()
+
+# Yelp rate limits (YELP_DAILY_LIMIT=0 disables the daily cap)
+yelp_rate_limiter = TokenBucket(
+    rate=float(os.getenv("YELP_QPS", "10")),
+    capacity=float(os.getenv("YELP_BURST", "10")),
+    daily_limit=int(os.getenv("YELP_DAILY_LIMIT", "5000")),
+)
+
+# Fan-out mode: search several related categories, YELP_FANOUT_DEPTH
+# results deep each (Yelp pages hold at most 50), all pages concurrently
+YELP_FANOUT = os.getenv("YELP_FANOUT", "false").lower() == "true"
+YELP_FANOUT_DEPTH = int(os.getenv("YELP_FANOUT_DEPTH", "100"))
+YELP_FANOUT_PAGE_SIZE = 50
+YELP_FANOUT_MAX_RESULTS = int(os.getenv("YELP_FANOUT_MAX_RESULTS", "200"))
+# Yelp rejects offset + limit beyond this
+YELP_MAX_OFFSET = 240
 
 # Trade to Yelp category mapping
 TRADE_CATEGORIES = {
@@ -32,61 +84,284 @@ TRADE_CATEGORIES = {
     "Painting": "painters",
 }
 
+# Related Yelp categories per trade for fan-out, primary category first
+TRADE_RELATED_CATEGORIES = {
+    "HVAC": ["hvac"],
+    "Plumbing": ["plumbing", "waterheaterinstallrepair"],
+    "Electrical": ["electricians", "lighting"],
+    "Remodeling": ["contractors", "carpenters", "cabinetry", "countertopinstall", "flooring"],
+    "General Contractor": ["contractors", "carpenters", "masonry_concrete"],
+    "Handyman": ["handyman", "carpenters"],
+    "Roofing": ["roofing", "gutterservices"],
+    "Painting": ["painters", "drywall"],
+}
+
 # Define protocol
 scraper_protocol = Protocol("ProfessionalScrapingProtocol")
 
 
-async def search_yelp(trade: str, location: str, ctx: Context, limit: int = 8) -> list:
-    """Search Yelp for professionals"""
+async def get_yelp_session() -> aiohttp.ClientSession:
+    """
+    Get the shared Yelp HTTP session, creating it on first use
+
+    The session keeps a pool of keep-alive connections so concurrent
+    searches reuse TLS connections instead of opening a new one per call.
+    """
+    global _yelp_session
+
+    if _yelp_session is None or _yelp_session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=YELP_MAX_CONNECTIONS,
+            limit_per_host=YELP_MAX_CONNECTIONS_PER_HOST,
+            keepalive_timeout=YELP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=300,
+        )
+        _yelp_session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=YELP_TIMEOUT),
+            headers={"Authorization": f"Bearer {YELP_API_KEY}"},
+        )
+
+    return _yelp_session
+
+
+async def close_yelp_session():
+    """Close the shared Yelp HTTP session"""
+    global _yelp_session
+
+    if _yelp_session is not None and not _yelp_session.closed:
+        await _yelp_session.close()
+    _yelp_session = None
+
+
+def yelp_business_to_professional(biz: dict, trade: str) -> dict:
+    """Transform a Yelp business into our professional format"""
+    category_title = biz.get("categories", [{}])[0].get("title", "")
+    return {
+        "id": f"yelp_{biz['id']}",
+        "name": biz["name"],
+        "trade": trade,
+        "city": biz["location"]["city"],
+        "state": biz["location"]["state"],
+        "services": (category_title or trade).split(),
+        "rating": biz.get("rating", 0.0),
+        "price_band": biz.get("price", "$$"),
+        "website": biz.get("url", ""),
+        "bio": f"{biz['name']} - {category_title}",
+        "license": ""
+    }
+
+
+def _slim_business(biz: dict) -> dict:
+    """Keep only the Yelp fields we use, to keep cache entries small"""
+    return {
+        "id": biz["id"],
+        "name": biz["name"],
+        "location": {
+            "city": biz["location"]["city"],
+            "state": biz["location"]["state"],
+        },
+        "categories": biz.get("categories", [{}])[:1],
+        "rating": biz.get("rating", 0.0),
+        "price": biz.get("price", "$$"),
+        "url": biz.get("url", ""),
+    }
+
+
+async def fetch_yelp_businesses(category: str, location: str, limit: int, sort_by: str, offset: int = 0) -> list:
+    """
+    Fetch one page of Yelp businesses (raises on HTTP errors or when rate
+    limited); recorded or replayed when a cassette is active
+    """
+    params = {
+        "categories": category,
+        "location": location,
+        "limit": limit,
+        "sort_by": sort_by
+    }
+    if offset:
+        params["offset"] = offset
+
+    cassette = get_cassette()
+    key = make_cache_key(**params)
+    if cassette is not None and cassette.replaying:
+        return await cassette.areplay("yelp", key, shape=category)
+
+    # Replays never reach Yelp, so only real requests spend rate-limit tokens
+    await yelp_rate_limiter.acquire()
+
+    started = time.monotonic()
+    session = await get_yelp_session()
+    async with session.get(YELP_API_URL, params=params) as response:
+        response.raise_for_status()
+        data = await response.json()
+
+    businesses = [_slim_business(biz) for biz in data.get("businesses", [])]
+    if cassette is not None and cassette.recording:
+        cassette.record("yelp", key, businesses, time.monotonic() - started, shape=category)
+    return businesses
+
+
+async def _fetch_and_cache(key: str, category: str, location: str, limit: int, sort_by: str, offset: int = 0) -> list:
+    """Fetch a page and store it under the search's cache key (single-flight)"""
+    async def fetch():
+        businesses = await fetch_yelp_businesses(category, location, limit, sort_by, offset)
+        await yelp_cache.aset(key, {"fetched_at": time.time(), "businesses": businesses})
+        return businesses
+
+    return await yelp_flight.do(key, fetch)
+
+
+async def _refresh_yelp_cache(key: str, category: str, location: str, limit: int, sort_by: str, offset: int, ctx: Context):
+    """Background refresh of a stale cache entry"""
+    try:
+        await _fetch_and_cache(key, category, location, limit, sort_by, offset)
+        ctx.logger.info(f"Refreshed Yelp cache: category={category}, location={location}")
+    except Exception as e:
+        ctx.logger.warning(f"Yelp cache refresh failed: {str(e)}")
+    finally:
+        _yelp_refreshing.discard(key)
+
+
+async def get_yelp_page(
+    category: str,
+    location: str,
+    ctx: Context,
+    limit: int,
+    sort_by: str = "rating",
+    offset: int = 0
+) -> list:
+    """
+    One page of Yelp businesses for a canonical location, from cache when
+    possible (raises if it has to be fetched and the fetch fails)
+    """
+    key = make_cache_key(category=category, location=location.lower(), limit=limit, sort_by=sort_by, offset=offset)
+
+    cached = await yelp_cache.aget(key)
+    if cached is not None:
+        age = time.time() - cached["fetched_at"]
+        if age >= YELP_CACHE_TTL and key not in _yelp_refreshing:
+            # Stale: serve it now and revalidate in the background
+            _yelp_refreshing.add(key)
+            task = asyncio.create_task(
+                _refresh_yelp_cache(key, category, location, limit, sort_by, offset, ctx)
+            )
+            _yelp_refresh_tasks.add(task)
+            task.add_done_callback(_yelp_refresh_tasks.discard)
+
+        ctx.logger.info(f"Yelp cache hit: category={category}, location={location}, offset={offset}, age={age:.0f}s")
+        cache_lookups.inc(cache="yelp", result="hit" if age < YELP_CACHE_TTL else "stale")
+        return cached["businesses"]
+
+    if yelp_flight.in_flight(key):
+        ctx.logger.info(f"Joining in-flight Yelp search: category={category}, location={location}, offset={offset}")
+        cache_lookups.inc(cache="yelp", result="coalesced")
+    else:
+        ctx.logger.info(f"Searching Yelp: category={category}, location={location}, offset={offset}")
+        cache_lookups.inc(cache="yelp", result="miss")
+
+    return await _fetch_and_cache(key, category, location, limit, sort_by, offset)
+
+
+async def search_yelp(
+    trade: str,
+    location: str,
+    ctx: Context,
+    limit: int = 8,
+    sort_by: str = "rating"
+) -> list:
+    """Search Yelp for professionals, serving cached results when possible"""
     if not YELP_API_KEY:
         ctx.logger.warning("No Yelp API key, using fallback")
         return []
 
-    try:
-        category = TRADE_CATEGORIES.get(trade, "contractors")
-        ctx.logger.info(f"Searching Yelp: trade={trade}, category={category}, location={location}")
-
-        headers = {"Authorization": f"Bearer {YELP_API_KEY}"}
-        params = {
-            "categories": category,
-            "location": location,
-            "limit": limit,
-            "sort_by": "rating"
-        }
+    category = TRADE_CATEGORIES.get(trade, "contractors")
+    location = canonical_location(location) or location
 
-        response = requests.get(YELP_API_URL, headers=headers, params=params, timeout=10)
-        response.raise_for_status()
-
-        data = response.json()
-        businesses = data.get("businesses", [])
+    try:
+        businesses = await get_yelp_page(category, location, ctx, limit, sort_by)
 
         ctx.logger.info(f"Found {len(businesses)} businesses from Yelp")
 
         # Transform to our format
-        professionals = []
-        for biz in businesses:
-            professional = {
-                "id": f"yelp_{biz['id']}",
-                "name": biz["name"],
-                "trade": trade,
-                "city": biz["location"]["city"],
-                "state": biz["location"]["state"],
-                "services": biz.get("categories", [{}])[0].get("title", trade).split(),
-                "rating": biz.get("rating", 0.0),
-                "price_band": biz.get("price", "$$"),
-                "website": biz.get("url", ""),
-                "bio": f"{biz['name']} - {biz.get('categories', [{}])[0].get('title', '')}",
-                "license": ""
-            }
-            professionals.append(professional)
-
-        return professionals
+        return [yelp_business_to_professional(biz, trade) for biz in businesses]
 
     except Exception as e:
         ctx.logger.error(f"Yelp search failed: {str(e)}")
         return []
 
 
+async def search_yelp_fanout(
+    trade: str,
+    location: str,
+    ctx: Context,
+    sort_by: str = "rating"
+) -> list:
+    """
+    Deep search: every related category of the trade, paged to
+    YELP_FANOUT_DEPTH, all pages fetched concurrently
+
+    Pages share the cache, single-flight and rate limiter with
+    search_yelp. Failed pages are skipped; businesses listed under
+    several categories are kept once.
+    """
+    if not YELP_API_KEY:
+        ctx.logger.warning("No Yelp API key, using fallback")
+        return []
+
+    categories = TRADE_RELATED_CATEGORIES.get(trade) or [TRADE_CATEGORIES.get(trade, "contractors")]
+    location = canonical_location(location) or location
+    depth = min(YELP_FANOUT_DEPTH, YELP_MAX_OFFSET)
+
+    pages = [
+        (category, offset)
+        for category in categories
+        for offset in range(0, depth, YELP_FANOUT_PAGE_SIZE)
+    ]
+    started = time.time()
+    results = await asyncio.gather(
+        *[
+            get_yelp_page(category, location, ctx, min(YELP_FANOUT_PAGE_SIZE, depth - offset), sort_by, offset)
+            for category, offset in pages
+        ],
+        return_exceptions=True
+    )
+
+    professionals = []
+    seen = set()
+    failed = 0
+    for result in results:
+        if isinstance(result, Exception):
+            failed += 1
+            continue
+        for biz in result:
+            if biz["id"] not in seen:
+                seen.add(biz["id"])
+                professionals.append(yelp_business_to_professional(biz, trade))
+
+    if failed:
+        ctx.logger.warning(f"{failed} of {len(pages)} Yelp pages failed: {next(r for r in results if isinstance(r, Exception))}")
+    ctx.logger.info(
+        f"Yelp fan-out: {len(categories)} categories, {len(pages)} pages, "
+        f"{len(professionals)} unique businesses in {time.time() - started:.2f}s"
+    )
+
+    return professionals[:YELP_FANOUT_MAX_RESULTS]
+
+
+def scope_location(msg: JobScope) -> str:
+    """
+    Yelp location for a job scope: its city and state, else its zip code
+    (resolved by canonical_location or passed to Yelp as is), else San
+    Francisco
+    """
+    if msg.city:
+        return f"{msg.city}, {msg.state or 'CA'}"
+    if msg.zip_code:
+        return msg.zip_code.strip()
+    return f"San Francisco, {msg.state or 'CA'}"
+
+
 def generate_template_professionals(trade: str, location: str, count: int = 8) -> list:
     """Generate template professionals as fallback"""
     import random
@@ -113,14 +388,49 @@ def generate_template_professionals(trade: str, location: str, count: int = 8) -
             "price_band": random.choice(["$$", "$$$"]),
             "website": f"https://example.com/{prof_id}",
             "bio": f"Professional {trade} services",
-            "license": f"LIC{random.randint(100000, 999999)}"
+            "license": f"LIC{random.randint(100000, 999999)}",
+            # Made-up placeholders: shown for this job but never indexed
+            "template": True
         }
         professionals.append(professional)
 
     return professionals
 
 
+@scraper_agent.on_event("startup")
+async def warm_yelp_session(ctx: Context):
+    """Open the Yelp connection pool before the first job arrives"""
+    if not YELP_API_KEY:
+        return
+
+    try:
+        session = await get_yelp_session()
+        # Establish a keep-alive connection (DNS + TLS) so the first search is fast
+        async with session.head(YELP_API_HOST) as response:
+            await response.read()
+        ctx.logger.info("Yelp connection pool warmed")
+    except Exception as e:
+        ctx.logger.warning(f"Yelp warm-up failed: {str(e)}")
+
+
+@scraper_agent.on_interval(period=60.0)
+async def log_yelp_stats(ctx: Context):
+    """Periodically report Yelp cache and request coalescing stats"""
+    if yelp_flight.calls:
+        ctx.logger.info(
+            f"Yelp stats: cache={yelp_cache.stats()}, single_flight={yelp_flight.stats()}, "
+            f"rate_limiter={yelp_rate_limiter.stats()}"
+        )
+
+
+@scraper_agent.on_event("shutdown")
+async def shutdown_yelp_session(ctx: Context):
+    """Release pooled Yelp connections"""
+    await close_yelp_session()
+
+
 @scraper_protocol.on_message(model=JobScope)
+@timed_stage("scrape")
 async def handle_job_scope(ctx: Context, sender: str, msg: JobScope):
     """Find professionals based on job scope"""
     ctx.logger.info(f"Received job scope for {msg.job_id}: trade={msg.trade}")
@@ -137,15 +447,18 @@ async def handle_job_scope(ctx: Context, sender: str, msg: JobScope):
             )
         )
 
-        # Construct location string
-        location = f"{msg.job_scope.get('city', 'San Francisco')}, {msg.job_scope.get('state', 'CA')}"
+        location = scope_location(msg)
 
         # Try Yelp first
-        professionals = await search_yelp(msg.trade, location, ctx)
+        if YELP_FANOUT:
+            professionals = await search_yelp_fanout(msg.trade, location, ctx)
+        else:
+            professionals = await search_yelp(msg.trade, location, ctx)
 
         # Fallback to templates if Yelp fails
         if not professionals:
             ctx.logger.warning("Using template professionals as fallback")
+            fallbacks.inc(component="scraper", reason="templates")
             professionals = generate_template_professionals(msg.trade, location)
 
         ctx.logger.info(f"Found {len(professionals)} professionals")
@@ -155,8 +468,10 @@ async def handle_job_scope(ctx: Context, sender: str, msg: JobScope):
             sender,
             ProfessionalsList(
                 job_id=msg.job_id,
-                professionals=professionals,
-                count=len(professionals)
+                packed=encode_candidates(professionals),
+                count=len(professionals),
+                trade=msg.trade,
+                trace_id=msg.trace_id
             )
         )
 
@@ -168,7 +483,8 @@ async def handle_job_scope(ctx: Context, sender: str, msg: JobScope):
                 job_id=msg.job_id,
                 agent="scraper_agent",
                 error=str(e),
-                timestamp=datetime.utcnow().isoformat()
+                timestamp=datetime.utcnow().isoformat(),
+                trade=msg.trade
             )
         )
 
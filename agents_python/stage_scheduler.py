@@ -0,0 +1,209 @@
+"""
+Urgency-aware stage scheduler for the coordinator
+Holds pipeline stage transitions (intake, scrape, match) in per-urgency
+queues and dispatches them within a per-stage concurrency budget
+"""
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from uagents import Context
+from metrics import record_stage_queue
+
+URGENCY_CLASSES = ("emergency", "high", "normal", "low")
+
+DEFAULT_WEIGHTS = {"emergency": 8, "high": 4, "normal": 2, "low": 1}
+
+
+def parse_weights(spec: str) -> Dict[str, int]:
+    """``"emergency:8,high:4,normal:2,low:1"`` -> weights (missing classes keep defaults)"""
+    weights = dict(DEFAULT_WEIGHTS)
+    for part in (spec or "").split(","):
+        if ":" in part:
+            name, value = part.split(":", 1)
+            if name.strip() in weights:
+                weights[name.strip()] = max(1, int(value))
+    return weights
+
+
+class PendingStage:
+    """One queued stage transition: a message to send when it is dispatched"""
+    __slots__ = ("job_id", "urgency", "ctx", "destination", "message", "queued_at")
+
+    def __init__(self, job_id: str, urgency: str, ctx: Context, destination: str, message: Any):
+        self.job_id = job_id
+        self.urgency = urgency
+        self.ctx = ctx
+        self.destination = destination
+        self.message = message
+        self.queued_at = time.monotonic()
+
+
+class StageQueue:
+    """
+    Weighted-fair queues of one stage
+
+    Classes are served by stride scheduling: each dispatch advances the
+    class's pass by 1/weight and the non-empty class with the lowest pass
+    goes next, so under contention emergency:high:normal:low get slots in
+    proportion to their weights. A head that has waited longer than
+    ``aging`` seconds is served first regardless, so low urgency work is
+    delayed but never starved. Emergencies may exceed the budget by
+    ``emergency_headroom`` slots.
+    """
+
+    def __init__(self, stage: str, budget: int, weights: Dict[str, int], aging: float, emergency_headroom: int):
+        self.stage = stage
+        self.budget = budget
+        self.weights = weights
+        self.aging = aging
+        self.emergency_headroom = emergency_headroom
+
+        self.queues: Dict[str, Deque[PendingStage]] = {u: deque() for u in URGENCY_CLASSES}
+        self.passes: Dict[str, float] = {u: 0.0 for u in URGENCY_CLASSES}
+        # job_id -> (urgency, dispatched_at)
+        self.in_flight: Dict[str, Tuple[str, float]] = {}
+
+    def push(self, item: PendingStage):
+        queue = self.queues[item.urgency]
+        if not queue:
+            # A class returning from idle starts level with the active ones
+            # instead of cashing in credit from while it had no work
+            active = [self.passes[u] for u in URGENCY_CLASSES if self.queues[u]]
+            if active:
+                self.passes[item.urgency] = max(self.passes[item.urgency], min(active))
+        queue.append(item)
+
+    def remove_job(self, job_id: str):
+        for queue in self.queues.values():
+            for item in [i for i in queue if i.job_id == job_id]:
+                queue.remove(item)
+
+    def pop_ready(self) -> List[PendingStage]:
+        """Items that may be dispatched now, in dispatch order"""
+        ready = []
+        now = time.monotonic()
+        while True:
+            urgency = self._next_class(now)
+            if urgency is None:
+                return ready
+
+            limit = self.budget + (self.emergency_headroom if urgency == "emergency" else 0)
+            if len(self.in_flight) >= limit:
+                if urgency == "emergency" or not self.queues["emergency"]:
+                    return ready
+                # The budget is full for everyone else; only emergencies may go
+                urgency = "emergency"
+                if len(self.in_flight) >= self.budget + self.emergency_headroom:
+                    return ready
+
+            item = self.queues[urgency].popleft()
+            self.passes[urgency] += 1.0 / self.weights[urgency]
+            self.in_flight[item.job_id] = (urgency, now)
+            ready.append(item)
+
+    def _next_class(self, now: float) -> Optional[str]:
+        heads = [u for u in URGENCY_CLASSES if self.queues[u]]
+        if not heads:
+            return None
+
+        # Aging: anything waiting too long goes first, oldest first
+        aged = [u for u in heads if now - self.queues[u][0].queued_at >= self.aging]
+        if aged:
+            return min(aged, key=lambda u: self.queues[u][0].queued_at)
+
+        # Ties go to the more urgent class (URGENCY_CLASSES order)
+        return min(heads, key=lambda u: self.passes[u])
+
+
+class StageScheduler:
+    """
+    Per-stage weighted-fair dispatch of coordinator messages
+
+    ``submit`` queues a message for a job's stage and sends whatever the
+    stage's budget allows; ``complete`` frees the job's slot when the
+    stage reports back and sends the next queued messages.
+    """
+
+    def __init__(
+        self,
+        budgets: Dict[str, int],
+        weights: Optional[Dict[str, int]] = None,
+        aging: float = 30.0,
+        emergency_headroom: int = 4,
+        stage_timeout: float = 300.0,
+    ):
+        weights = weights or dict(DEFAULT_WEIGHTS)
+        self.stage_timeout = stage_timeout
+        self.stages: Dict[str, StageQueue] = {
+            stage: StageQueue(stage, budget, weights, aging, emergency_headroom)
+            for stage, budget in budgets.items()
+        }
+
+        # Per stage and class: [dispatched, total queue seconds, max queue seconds]
+        self._waits = {
+            stage: {u: [0, 0.0, 0.0] for u in URGENCY_CLASSES} for stage in budgets
+        }
+        self.expired = 0
+
+    async def submit(self, ctx: Context, stage: str, job_id: str, urgency: str, destination: str, message: Any):
+        urgency = urgency if urgency in URGENCY_CLASSES else "normal"
+        self.stages[stage].push(PendingStage(job_id, urgency, ctx, destination, message))
+        await self._pump(stage)
+
+    async def complete(self, stage: str, job_id: str):
+        """The job's stage finished (or failed); dispatch queued work"""
+        if self.stages[stage].in_flight.pop(job_id, None) is not None:
+            await self._pump(stage)
+
+    async def cancel_job(self, job_id: str):
+        """Drop everything queued or in flight for a job (e.g. after an error)"""
+        for stage, queue in self.stages.items():
+            queue.remove_job(job_id)
+            await self.complete(stage, job_id)
+
+    async def expire_stale(self) -> int:
+        """Free slots held longer than ``stage_timeout`` by stages that never reported back"""
+        cutoff = time.monotonic() - self.stage_timeout
+        expired = 0
+        for stage, queue in self.stages.items():
+            for job_id in [j for j, (_, started) in queue.in_flight.items() if started < cutoff]:
+                del queue.in_flight[job_id]
+                expired += 1
+            await self._pump(stage)
+        self.expired += expired
+        return expired
+
+    async def _pump(self, stage: str):
+        for item in self.stages[stage].pop_ready():
+            waited = time.monotonic() - item.queued_at
+            stats = self._waits[stage][item.urgency]
+            stats[0] += 1
+            stats[1] += waited
+            stats[2] = max(stats[2], waited)
+            record_stage_queue(stage, item.urgency, getattr(item.message, "trace_id", None), waited)
+
+            try:
+                await item.ctx.send(item.destination, item.message)
+            except Exception as e:
+                item.ctx.logger.error(f"Failed to dispatch {stage} for {item.job_id}: {str(e)}")
+                self.stages[stage].in_flight.pop(item.job_id, None)
+
+    def stats(self) -> Dict:
+        stats = {
+            stage: {
+                "in_flight": len(queue.in_flight),
+                "budget": queue.budget,
+                "queued": {u: len(q) for u, q in queue.queues.items()},
+                "queue_time": {
+                    u: {
+                        "count": count,
+                        "avg": round(total / count, 4) if count else 0.0,
+                        "max": round(longest, 4),
+                    }
+                    for u, (count, total, longest) in self._waits[stage].items()
+                },
+            }
+            for stage, queue in self.stages.items()
+        }
+        stats["expired"] = self.expired
+        return stats
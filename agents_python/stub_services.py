@@ -0,0 +1,271 @@
+"""
+Local stand-ins for the Yelp search API and the Anthropic/Lava messages API
+Used by the load-test harness to run the pipeline offline: responses have
+the real shapes, with configurable latency and error rates
+"""
+import json
+import math
+import random
+import re
+import zlib
+import asyncio
+from typing import Dict, List, Optional
+from aiohttp import web
+from trade_classifier import classify_trade, classify_urgency
+from prompt_builder import CANDIDATE_COLUMNS
+
+
+class LatencyDistribution:
+    """
+    Response delay in seconds, parsed from a spec string:
+    ``fixed:0.2``, ``uniform:0.1,0.5``, ``exp:0.3`` (mean) or
+    ``lognormal:0.8,0.5`` (median, sigma)
+    """
+
+    def __init__(self, kind: str, params: List[float], rng: random.Random):
+        self.kind = kind
+        self.params = params
+        self.rng = rng
+
+    @classmethod
+    def parse(cls, spec: str, rng: Optional[random.Random] = None) -> "LatencyDistribution":
+        kind, _, args = spec.partition(":")
+        params = [float(p) for p in args.split(",") if p]
+        expected = {"fixed": 1, "uniform": 2, "exp": 1, "lognormal": 2}
+        if kind not in expected or len(params) != expected[kind]:
+            raise ValueError(f"Invalid latency spec {spec!r} (e.g. fixed:0.2, uniform:0.1,0.5, exp:0.3, lognormal:0.8,0.5)")
+        return cls(kind, params, rng or random.Random())
+
+    def sample(self) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return self.rng.uniform(*self.params)
+        if self.kind == "exp":
+            return self.rng.expovariate(1.0 / self.params[0]) if self.params[0] > 0 else 0.0
+        median, sigma = self.params
+        return self.rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+
+    def __str__(self) -> str:
+        return f"{self.kind}:{','.join(str(p) for p in self.params)}"
+
+
+class StubService:
+    """Shared latency/error behaviour and request counters of one stub"""
+
+    def __init__(self, latency: LatencyDistribution, error_rate: float, error_status: int, rng: random.Random):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rng = rng
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def delay(self) -> Optional[web.Response]:
+        """Wait out the sampled latency; an error response if this request should fail"""
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency.sample())
+        finally:
+            self.in_flight -= 1
+
+        if self.rng.random() < self.error_rate:
+            self.errors += 1
+            return self.error_response()
+        return None
+
+    def error_response(self) -> web.Response:
+        raise NotImplementedError
+
+    def stats(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "max_in_flight": self.max_in_flight,
+            "latency": str(self.latency),
+            "error_rate": self.error_rate,
+        }
+
+
+class StubYelp(StubService):
+    """``GET /v3/businesses/search`` returning generated businesses"""
+
+    def error_response(self) -> web.Response:
+        return web.json_response(
+            {"error": {"code": "STUB_ERROR", "description": "Injected failure"}},
+            status=self.error_status
+        )
+
+    async def search(self, request: web.Request) -> web.Response:
+        error = await self.delay()
+        if error is not None:
+            return error
+
+        category = request.query.get("categories", "contractors")
+        location = request.query.get("location", "San Francisco, CA")
+        limit = min(50, int(request.query.get("limit", "20")))
+        offset = int(request.query.get("offset", "0"))
+        city, _, state = location.partition(",")
+
+        # Deterministic per (category, location, offset) like a real index
+        rng = random.Random(f"{category}|{location}|{offset}")
+        businesses = [
+            {
+                "id": f"stub-{category}-{zlib.crc32(location.encode()) % 10000}-{offset + i}",
+                "name": f"{city.strip().title()} {category.title()} Co. #{offset + i + 1}",
+                "location": {"city": city.strip().title(), "state": state.strip().upper() or "CA"},
+                "categories": [{"alias": category, "title": category.title()}],
+                "rating": round(rng.uniform(3.0, 5.0), 1),
+                "price": rng.choice(["$", "$$", "$$$"]),
+                "url": f"https://www.yelp.com/biz/stub-{offset + i}",
+            }
+            for i in range(limit)
+        ]
+        return web.json_response({"businesses": businesses, "total": offset + limit * 4})
+
+
+# Claude names the profession rather than the category, e.g. "Plumber"
+TRADE_TITLES = {
+    "HVAC": "HVAC Technician",
+    "Plumbing": "Plumber",
+    "Electrical": "Electrician",
+    "Roofing": "Roofer",
+    "Painting": "Painter",
+}
+
+
+class StubClaude(StubService):
+    """
+    ``POST /v1/messages`` (and the Lava forward URL) answering the
+    pipeline's intake and ranking prompts with plausible JSON
+    """
+
+    def __init__(self, *args, tokens_per_second: float = 0.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Output generation speed for streamed responses (0 = instant)
+        self.tokens_per_second = tokens_per_second
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def error_response(self) -> web.Response:
+        error_type = {429: "rate_limit_error", 529: "overloaded_error"}.get(self.error_status, "api_error")
+        return web.json_response(
+            {"type": "error", "error": {"type": error_type, "message": "Injected failure"}},
+            status=self.error_status,
+            headers={"retry-after": "1"} if self.error_status == 429 else None
+        )
+
+    async def messages(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        error = await self.delay()
+        if error is not None:
+            return error
+
+        prompt = "\n".join(
+            m["content"] if isinstance(m["content"], str) else json.dumps(m["content"])
+            for m in body.get("messages", [])
+        )
+        text = self.answer(prompt)
+        usage = {"input_tokens": len(prompt) // 4 + 1, "output_tokens": len(text) // 4 + 1}
+        self.input_tokens += usage["input_tokens"]
+        self.output_tokens += usage["output_tokens"]
+
+        if body.get("stream"):
+            return await self.stream(request, body.get("model", "stub"), text, usage)
+
+        return web.json_response({
+            "id": f"msg_stub_{self.requests}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "stub"),
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": usage,
+        })
+
+    async def stream(self, request: web.Request, model: str, text: str, usage: Dict) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        async def send(event_type: str, data: Dict):
+            await response.write(f"event: {event_type}\ndata: {json.dumps({'type': event_type, **data})}\n\n".encode())
+
+        await send("message_start", {"message": {
+            "id": f"msg_stub_{self.requests}", "type": "message", "role": "assistant", "model": model,
+            "content": [], "stop_reason": None, "stop_sequence": None,
+            "usage": {"input_tokens": usage["input_tokens"], "output_tokens": 1},
+        }})
+        await send("content_block_start", {"index": 0, "content_block": {"type": "text", "text": ""}})
+        chunk = 64
+        for i in range(0, len(text), chunk):
+            if self.tokens_per_second > 0:
+                await asyncio.sleep(chunk / 4 / self.tokens_per_second)
+            await send("content_block_delta", {"index": 0, "delta": {"type": "text_delta", "text": text[i:i + chunk]}})
+        await send("content_block_stop", {"index": 0})
+        await send("message_delta", {"delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                     "usage": {"output_tokens": usage["output_tokens"]}})
+        await send("message_stop", {})
+        await response.write_eof()
+        return response
+
+    def answer(self, prompt: str) -> str:
+        if "Analyze this job request" in prompt:
+            description = prompt.split("Job Description:", 1)[-1].split("Extract:", 1)[0]
+            trade, _ = classify_trade(description)
+            return json.dumps({
+                "trade": TRADE_TITLES.get(trade, trade),
+                "services": [f"{trade.lower()} service"],
+                "urgency": classify_urgency(description)[0],
+                "budget_hint": "medium",
+                "project_type": "repair",
+                "location_requirements": "",
+            })
+
+        jobs = re.findall(r"^### Job (\S+)", prompt, flags=re.MULTILINE)
+        if jobs:
+            sections = re.split(r"^### Job \S+", prompt, flags=re.MULTILINE)[1:]
+            return json.dumps({job_id: self.rank(section) for job_id, section in zip(jobs, sections)})
+
+        return json.dumps(self.rank(prompt))
+
+    def rank(self, prompt: str) -> List[Dict]:
+        header = "|".join(CANDIDATE_COLUMNS)
+        rows = [
+            line.split("|") for line in prompt.splitlines()
+            if line != header and line.count("|") == len(CANDIDATE_COLUMNS) - 1
+        ]
+        return [
+            {
+                "professional_id": row[0],
+                "score": max(0, 95 - 5 * i),
+                "reason": f"{row[1]} covers the requested services nearby.",
+                "concerns": None,
+            }
+            for i, row in enumerate(rows)
+        ]
+
+    def stats(self) -> Dict:
+        return {
+            **super().stats(),
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+        }
+
+
+def create_stub_app(yelp: StubYelp, claude: StubClaude) -> web.Application:
+    """One app serving both stubs; Lava forwards are answered like direct calls"""
+    app = web.Application(client_max_size=16 * 1024 * 1024)
+    app.router.add_get("/v3/businesses/search", yelp.search)
+    app.router.add_post("/v1/messages", claude.messages)
+    app.router.add_post("/v1/forward", claude.messages)
+    app.router.add_head("/", _ok)
+    return app
+
+
+async def _ok(request: web.Request) -> web.Response:
+    return web.Response()
@@ -0,0 +1,11 @@
+"""
+Agent modules import each other as top-level modules (``from metrics
+import ...``), so tests run with agents_python on the path
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep the module-level Claude client from opening the on-disk response cache
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
@@ -0,0 +1,75 @@
+import pytest
+
+import candidate_codec
+from candidate_codec import candidate_count, decode_candidates, encode_candidates
+
+CANDIDATES = [
+    {
+        "id": f"yelp_{i}",
+        "name": f"Business {i}",
+        "trade": "Plumbing",
+        "city": "San Francisco",
+        "state": "CA",
+        "services": ["Plumbing", "Water Heaters"] if i % 2 else ["Plumbing"],
+        "rating": 4.5 - i / 10,
+        "price_band": "$$" if i % 3 else None,
+    }
+    for i in range(60)
+]
+
+
+@pytest.fixture
+def separate_processes(monkeypatch):
+    monkeypatch.setattr(candidate_codec, "_shared_process", False)
+
+
+@pytest.mark.parametrize("transport", ["inline", "columns", "msgpack"])
+def test_round_trip(separate_processes, transport):
+    if transport == "msgpack":
+        pytest.importorskip("msgpack")
+    payload = encode_candidates(CANDIDATES, transport=transport)
+
+    assert payload["format"] == transport
+    assert candidate_count(payload) == len(CANDIDATES)
+    assert decode_candidates(payload) == CANDIDATES
+
+
+@pytest.mark.parametrize("transport", ["columns", "msgpack"])
+def test_absent_fields_stay_absent(separate_processes, transport):
+    if transport == "msgpack":
+        pytest.importorskip("msgpack")
+    # Template fallbacks carry fields real businesses do not, and vice versa
+    candidates = [dict(c, template=True) if i % 7 == 0 else dict(c) for i, c in enumerate(CANDIDATES)]
+    del candidates[1]["price_band"]
+
+    decoded = decode_candidates(encode_candidates(candidates, transport=transport))
+    assert decoded == candidates
+    assert "template" not in decoded[1] and "price_band" not in decoded[1]
+
+
+def test_columns_intern_repeated_strings(separate_processes):
+    payload = encode_candidates(CANDIDATES, transport="columns")
+    assert payload["data"].count("San Francisco") == 1
+
+
+def test_refs_keep_each_trade(monkeypatch):
+    monkeypatch.setattr(candidate_codec, "_shared_process", True)
+    monkeypatch.setattr(candidate_codec, "catalog", candidate_codec.CandidateCatalog())
+    plumber = dict(CANDIDATES[0])
+    hvac = dict(plumber, trade="HVAC")
+
+    plumbing_payload = encode_candidates([plumber])
+    hvac_payload = encode_candidates([hvac])
+
+    assert plumbing_payload["format"] == "refs"
+    assert decode_candidates(plumbing_payload) == [plumber]
+    assert decode_candidates(hvac_payload) == [hvac]
+
+    # Decoded candidates are copies; editing one leaves the catalog intact
+    decode_candidates(plumbing_payload)[0]["rating"] = 0
+    assert decode_candidates(plumbing_payload) == [plumber]
+
+
+def test_empty_payloads():
+    assert decode_candidates(None) == []
+    assert candidate_count(None) == 0
@@ -0,0 +1,114 @@
+import asyncio
+
+import anthropic
+import httpx
+
+from lava_client import ClaudeGovernor, LavaClaudeClient
+
+
+def test_admits_in_urgency_order():
+    async def scenario():
+        governor = ClaudeGovernor(max_concurrency=1, emergency_reserve=0.0)
+        first = await governor.acquire("normal")
+        admitted = []
+
+        async def call(urgency):
+            ticket = await governor.acquire(urgency)
+            admitted.append(urgency)
+            governor.release(ticket)
+
+        tasks = []
+        for urgency in ("low", "normal", "emergency", "high"):
+            tasks.append(asyncio.create_task(call(urgency)))
+            await asyncio.sleep(0)
+
+        governor.release(first)
+        await asyncio.gather(*tasks)
+        return admitted
+
+    assert asyncio.run(scenario()) == ["emergency", "high", "normal", "low"]
+
+
+def test_emergency_reserve_admits_emergencies_when_saturated():
+    async def scenario():
+        governor = ClaudeGovernor(max_concurrency=5, emergency_reserve=0.2)
+        tickets = [await governor.acquire("normal") for _ in range(4)]
+
+        blocked = asyncio.create_task(governor.acquire("high"))
+        emergency = await asyncio.wait_for(governor.acquire("emergency"), timeout=1)
+        await asyncio.sleep(0)
+        assert not blocked.done()
+
+        governor.release(emergency)
+        await asyncio.sleep(0)
+        assert not blocked.done()
+
+        governor.release(tickets[0])
+        await asyncio.wait_for(blocked, timeout=1)
+
+    asyncio.run(scenario())
+
+
+def test_rate_limit_backs_off_and_recovers():
+    async def scenario():
+        governor = ClaudeGovernor()
+        assert governor.on_rate_limited() == 1.0
+        assert governor.on_rate_limited() == 2.0
+        assert governor.on_rate_limited(retry_after=10.0) == 10.0
+        assert governor.rate_scale == 0.125
+
+        # Admission is paused, whatever the urgency
+        waiting = asyncio.create_task(governor.acquire("emergency"))
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        waiting.cancel()
+
+        governor.on_success()
+        assert governor.rate_scale == 0.175
+        assert governor.on_rate_limited() == 1.0
+
+    asyncio.run(scenario())
+
+
+def test_failed_calls_free_their_token_estimate():
+    async def scenario():
+        governor = ClaudeGovernor(tokens_per_minute=1000, emergency_reserve=0.0)
+        ticket = await governor.acquire("normal", tokens=800)
+        governor.release(ticket, 0)
+        assert governor.stats()["tokens_last_minute"] == 0
+
+        ticket = await asyncio.wait_for(governor.acquire("normal", tokens=800), timeout=1)
+        governor.release(ticket)
+        assert governor.stats()["tokens_last_minute"] == 800
+
+    asyncio.run(scenario())
+
+
+def test_retry_backoff_does_not_hold_a_slot():
+    async def scenario():
+        client = LavaClaudeClient()
+        client.use_lava = False
+        client.governor = ClaudeGovernor(max_concurrency=1, emergency_reserve=0.0)
+        calls = []
+
+        async def flaky_request(model, max_tokens, messages, **kwargs):
+            calls.append(messages[0]["content"])
+            if len(calls) == 1:
+                raise anthropic.APIConnectionError(request=httpx.Request("POST", "https://example.invalid"))
+            return {"content": [{"type": "text", "text": "ok"}], "usage": {}}
+
+        client._adirect_request = flaky_request
+        messages = [{"role": "user", "content": "retried"}]
+        retried = asyncio.create_task(client.acreate_message("m", 10, messages, use_cache=False))
+        while not calls:
+            await asyncio.sleep(0.01)
+
+        # The retried call is sleeping through its backoff; this one gets in
+        other = [{"role": "user", "content": "other"}]
+        await asyncio.wait_for(client.acreate_message("m", 10, other, use_cache=False), timeout=0.5)
+        assert calls == ["retried", "other"]
+
+        await retried
+        assert calls == ["retried", "other", "retried"]
+
+    asyncio.run(scenario())
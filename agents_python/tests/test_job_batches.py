@@ -0,0 +1,41 @@
+from job_batches import JobBatch
+
+JOBS = [
+    {"job_id": "j1", "prompt": "Fix my leaking sink"},
+    {"job_id": "j2", "prompt": "fix my  LEAKING sink"},
+    {"job_id": "j3", "prompt": "Paint the fence"},
+]
+
+
+def make_batch():
+    return JobBatch.from_jobs("batch", "sender", JOBS, intake_concurrency=2)
+
+
+def test_intake_failure_fails_every_job_sharing_the_prompt():
+    batch = make_batch()
+    batch.next_intake()
+
+    assert sorted(batch.failed("j1")) == ["j1", "j2"]
+    assert "j1" not in batch.intake_in_flight
+
+
+def test_scrape_failure_fails_the_group_and_frees_its_key():
+    batch = make_batch()
+    batch.join_scrape_group("j1", "Plumbing", "San Francisco", "CA")
+    batch.join_scrape_group("j2", "Plumbing", "San Francisco", "CA")
+
+    assert batch.failed("j1") == ["j1", "j2"]
+
+    # A later job with the same key starts a fresh scrape
+    group, is_new = batch.join_scrape_group("j3", "Plumbing", "San Francisco", "CA")
+    assert is_new and group.leader == "j3"
+
+
+def test_failure_after_scrape_only_fails_the_job():
+    batch = make_batch()
+    group, _ = batch.join_scrape_group("j1", "Plumbing", "San Francisco", "CA")
+    batch.join_scrape_group("j2", "Plumbing", "San Francisco", "CA")
+    group.professionals = {"format": "inline", "candidates": []}
+
+    assert batch.failed("j1") == ["j1"]
+    assert batch.failed("j3") == ["j3"]
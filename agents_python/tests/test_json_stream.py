@@ -0,0 +1,30 @@
+import json
+
+from json_stream import IncrementalArrayParser
+
+ITEMS = [
+    {"id": "a", "reason": "handles {braces} and \"quotes\" in text", "score": 9},
+    {"id": "b", "nested": {"tags": ["x", "]"]}, "score": 7.5},
+    {"id": "c", "reason": "back\\slash", "score": 0},
+]
+
+
+def test_emits_objects_across_chunk_boundaries():
+    text = "Here are the matches:\n" + json.dumps(ITEMS) + "\nHope this helps {}"
+    parser = IncrementalArrayParser()
+    emitted = []
+    for char in text:
+        emitted.extend(parser.feed(char))
+
+    assert emitted == ITEMS
+    assert parser.done
+    assert parser.feed('[{"id": "late"}]') == []
+
+
+def test_emits_each_object_as_soon_as_it_closes():
+    parser = IncrementalArrayParser()
+    assert parser.feed('[{"id": "a"}, {"id": ') == [{"id": "a"}]
+    assert parser.feed('"b"}') == [{"id": "b"}]
+    assert not parser.done
+    assert parser.feed("]") == []
+    assert parser.done
@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+import pytest
+
+from rate_limiter import RateLimitExceeded, TokenBucket
+
+
+def test_rejects_non_positive_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+
+
+def test_waiters_are_spaced_by_the_rate_in_order():
+    async def scenario():
+        bucket = TokenBucket(rate=20, capacity=1)
+        started = time.monotonic()
+        finished = []
+
+        async def call(i):
+            await bucket.acquire()
+            finished.append((i, time.monotonic() - started))
+
+        await asyncio.gather(*(call(i) for i in range(5)))
+        return finished
+
+    finished = asyncio.run(scenario())
+    assert [i for i, _ in finished] == list(range(5))
+    assert finished[-1][1] == pytest.approx(0.2, abs=0.05)
+
+
+def test_cancelled_waiter_returns_its_token():
+    async def scenario():
+        bucket = TokenBucket(rate=10, capacity=1)
+        await bucket.acquire()
+        waiter = asyncio.create_task(bucket.acquire())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        started = time.monotonic()
+        await bucket.acquire()
+        return time.monotonic() - started
+
+    # About 0.09s with the token handed back, 0.19s without
+    assert asyncio.run(scenario()) < 0.15
+
+
+def test_daily_limit():
+    async def scenario():
+        bucket = TokenBucket(rate=100, daily_limit=2)
+        await bucket.acquire()
+        await bucket.acquire()
+        with pytest.raises(RateLimitExceeded):
+            await bucket.acquire()
+
+    asyncio.run(scenario())
@@ -0,0 +1,70 @@
+import asyncio
+
+from stage_scheduler import DEFAULT_WEIGHTS, PendingStage, StageQueue, StageScheduler, parse_weights
+
+
+def make_queue(budget=100, aging=60.0, emergency_headroom=0):
+    return StageQueue("match", budget, dict(DEFAULT_WEIGHTS), aging, emergency_headroom)
+
+
+def push(queue, job_id, urgency):
+    item = PendingStage(job_id, urgency, None, "agent", None)
+    queue.push(item)
+    return item
+
+
+def test_parse_weights_keeps_defaults():
+    assert parse_weights("high:6,bogus:3,low:0") == {"emergency": 8, "high": 6, "normal": 2, "low": 1}
+
+
+def test_stride_shares_slots_by_weight():
+    queue = make_queue()
+    for i in range(20):
+        push(queue, f"high-{i}", "high")
+        push(queue, f"low-{i}", "low")
+
+    first = [item.urgency for item in queue.pop_ready()[:10]]
+    assert first.count("high") == 8
+    assert first.count("low") == 2
+
+
+def test_aged_head_is_served_first():
+    queue = make_queue(budget=1, aging=5.0)
+    push(queue, "old", "low").queued_at -= 10.0
+    push(queue, "new", "emergency")
+
+    assert [item.job_id for item in queue.pop_ready()] == ["old"]
+
+
+def test_emergencies_use_headroom_over_a_full_budget():
+    queue = make_queue(budget=1, emergency_headroom=1)
+    push(queue, "n1", "normal")
+    assert [item.job_id for item in queue.pop_ready()] == ["n1"]
+
+    push(queue, "n2", "normal")
+    push(queue, "e1", "emergency")
+    push(queue, "e2", "emergency")
+    assert [item.job_id for item in queue.pop_ready()] == ["e1"]
+    assert [item.job_id for item in queue.queues["normal"]] == ["n2"]
+
+
+class FakeContext:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, destination, message):
+        self.sent.append(message)
+
+
+def test_scheduler_dispatches_next_job_on_complete():
+    async def scenario():
+        scheduler = StageScheduler({"match": 1})
+        ctx = FakeContext()
+        await scheduler.submit(ctx, "match", "a", "normal", "matcher", "msg-a")
+        await scheduler.submit(ctx, "match", "b", "normal", "matcher", "msg-b")
+        assert ctx.sent == ["msg-a"]
+
+        await scheduler.complete("match", "a")
+        assert ctx.sent == ["msg-a", "msg-b"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,294 @@
+"""
+Cheap local job classifier
+Keyword rules over the trades ScraperAgent knows (TRADE_CATEGORIES) plus a
+small naive Bayes model trained on Claude-labelled prompts, used to
+classify prompts without calling Claude
+"""
+import re
+import math
+import threading
+from typing import Dict, List, Optional, Tuple
+from prompt_cache import normalize_prompt
+
+# Keywords per trade; multi-word phrases count double
+TRADE_KEYWORDS = {
+    "HVAC": [
+        "hvac", "ac", "a/c", "air conditioning", "air conditioner", "furnace",
+        "heater", "heating", "heat pump", "thermostat", "duct", "ducts",
+        "ductwork", "ventilation", "cooling", "mini split",
+    ],
+    "Plumbing": [
+        "plumber", "plumbing", "leak", "leaky", "leaking", "faucet", "toilet",
+        "drain", "clog", "clogged", "pipe", "pipes", "water heater", "sewer",
+        "sink", "shower", "garbage disposal",
+    ],
+    "Electrical": [
+        "electrician", "electrical", "wiring", "rewire", "outlet", "outlets",
+        "breaker", "panel", "circuit", "light fixture", "lighting",
+        "ev charger", "ceiling fan",
+    ],
+    "Roofing": [
+        "roof", "roofing", "roofer", "shingle", "shingles", "gutter",
+        "gutters", "skylight",
+    ],
+    "Painting": [
+        "paint", "painting", "painter", "repaint", "stain", "staining",
+    ],
+    "Remodeling": [
+        "remodel", "remodeling", "renovation", "renovate", "kitchen remodel",
+        "bathroom remodel", "cabinets", "countertops",
+    ],
+    "Handyman": [
+        "handyman", "mount", "mounting", "assemble", "assembly", "furniture",
+        "shelf", "shelves", "odd jobs",
+    ],
+    "General Contractor": [
+        "contractor", "general contractor", "construction", "addition", "adu",
+        "build", "foundation",
+    ],
+}
+
+
+# Urgency keywords, checked from most to least urgent
+URGENCY_KEYWORDS = [
+    ("emergency", [
+        "emergency", "flood", "flooding", "flooded", "burst", "gas leak",
+        "no heat", "sparking", "smoke", "fire", "sewage",
+    ]),
+    ("high", [
+        "asap", "urgent", "urgently", "immediately", "right away", "today",
+        "tonight", "as soon as possible",
+    ]),
+    ("low", [
+        "no rush", "sometime", "eventually", "next month", "next year",
+        "planning", "whenever", "flexible",
+    ]),
+]
+
+PROJECT_TYPE_KEYWORDS = {
+    "repair": [
+        "repair", "fix", "broken", "broke", "leak", "leaky", "leaking",
+        "not working", "not cooling", "not heating", "clogged", "clog",
+        "damaged", "stopped working",
+    ],
+    "installation": [
+        "install", "installation", "installed", "replace", "replacement",
+        "new", "put in", "upgrade", "mount",
+    ],
+    "maintenance": [
+        "maintenance", "tune up", "tune-up", "inspection", "inspect",
+        "cleaning", "clean", "annual", "service",
+    ],
+    "renovation": [
+        "remodel", "remodeling", "renovation", "renovate", "redo", "addition",
+    ],
+}
+
+
+def _phrase_pattern(phrase: str) -> re.Pattern:
+    return re.compile(r"(?<![a-z0-9])" + re.escape(phrase) + r"(?![a-z0-9])")
+
+
+_TRADE_PATTERNS = {
+    trade: [(_phrase_pattern(k), 2.0 if " " in k else 1.0) for k in keywords]
+    for trade, keywords in TRADE_KEYWORDS.items()
+}
+
+
+_URGENCY_PATTERNS = [
+    (urgency, [_phrase_pattern(k) for k in keywords]) for urgency, keywords in URGENCY_KEYWORDS
+]
+
+_PROJECT_TYPE_PATTERNS = {
+    project_type: [_phrase_pattern(k) for k in keywords]
+    for project_type, keywords in PROJECT_TYPE_KEYWORDS.items()
+}
+
+
+def trade_scores(prompt: str) -> Dict[str, float]:
+    """Keyword score of every trade for a prompt"""
+    text = prompt.lower()
+    return {
+        trade: sum(weight for pattern, weight in patterns if pattern.search(text))
+        for trade, patterns in _TRADE_PATTERNS.items()
+    }
+
+
+def classify_trade(prompt: str) -> Tuple[str, float]:
+    """
+    Best-guess trade and a confidence in [0, 1]
+
+    Confidence is the winning trade's share of all keyword evidence,
+    damped when there is only a single weak hit.
+    """
+    scores = trade_scores(prompt)
+    total = sum(scores.values())
+    if total == 0:
+        return "General Contractor", 0.0
+
+    trade = max(scores, key=scores.get)
+    top = scores[trade]
+    confidence = (top / total) * min(1.0, top / 2.0)
+    return trade, round(confidence, 3)
+
+
+def matched_trade_keywords(prompt: str, trade: str) -> List[str]:
+    """Keywords of a trade that appear in the prompt"""
+    text = prompt.lower()
+    return [
+        keyword for keyword, (pattern, _) in zip(TRADE_KEYWORDS[trade], _TRADE_PATTERNS[trade])
+        if pattern.search(text)
+    ]
+
+
+def classify_urgency(prompt: str) -> Tuple[str, bool]:
+    """Urgency level and whether any keyword matched (default "normal")"""
+    text = prompt.lower()
+    for urgency, patterns in _URGENCY_PATTERNS:
+        if any(p.search(text) for p in patterns):
+            return urgency, True
+    return "normal", False
+
+
+def classify_project_type(prompt: str) -> Tuple[str, bool]:
+    """Project type and whether any keyword matched (default "repair")"""
+    text = prompt.lower()
+    counts = {
+        project_type: sum(1 for p in patterns if p.search(text))
+        for project_type, patterns in _PROJECT_TYPE_PATTERNS.items()
+    }
+    best = max(counts, key=counts.get)
+    if counts[best] == 0:
+        return "repair", False
+    return best, True
+
+
+# Trade names Claude uses that the keyword rules do not cover
+TRADE_SYNONYMS = {
+    "carpenter": "Handyman",
+    "carpentry": "Handyman",
+    "builder": "General Contractor",
+    "gc": "General Contractor",
+    "heating and cooling": "HVAC",
+    "drywall": "Painting",
+}
+
+
+def canonical_trade(trade: str) -> Optional[str]:
+    """
+    Map a free-form trade name (e.g. "Plumber", "HVAC Technician" from
+    Claude) onto a known trade: exact name, synonym, then keyword match
+    """
+    lowered = (trade or "").strip().lower()
+    if not lowered:
+        return None
+    for known in TRADE_KEYWORDS:
+        if known.lower() == lowered:
+            return known
+    if lowered in TRADE_SYNONYMS:
+        return TRADE_SYNONYMS[lowered]
+
+    scores = trade_scores(lowered)
+    best = max(scores, key=scores.get)
+    return best if scores[best] > 0 else None
+
+
+def same_trade(a: Optional[str], b: Optional[str]) -> bool:
+    """Whether two trade names mean the same known trade"""
+    return (canonical_trade(a) or a) == (canonical_trade(b) or b)
+
+
+class NaiveBayesTradeModel:
+    """
+    Multinomial naive Bayes over normalized prompt words
+
+    Learns online from Claude-labelled prompts so the fast path picks up
+    vocabulary the keyword rules miss.
+    """
+
+    def __init__(self, min_examples: int = 20, alpha: float = 1.0):
+        self.min_examples = min_examples
+        self.alpha = alpha
+        self.trade_counts: Dict[str, int] = {}
+        self.word_counts: Dict[str, Dict[str, int]] = {}
+        self.word_totals: Dict[str, int] = {}
+        self.vocabulary = set()
+        self.examples = 0
+        self._lock = threading.Lock()
+
+    def learn(self, prompt: str, trade: str):
+        trade = canonical_trade(trade)
+        if trade is None:
+            return
+
+        words = normalize_prompt(prompt)
+        with self._lock:
+            self.examples += 1
+            self.trade_counts[trade] = self.trade_counts.get(trade, 0) + 1
+            counts = self.word_counts.setdefault(trade, {})
+            for word in words:
+                counts[word] = counts.get(word, 0) + 1
+                self.vocabulary.add(word)
+            self.word_totals[trade] = self.word_totals.get(trade, 0) + len(words)
+
+    def predict(self, prompt: str) -> Optional[Tuple[str, float]]:
+        """(trade, posterior probability), or None until trained"""
+        with self._lock:
+            if self.examples < self.min_examples:
+                return None
+
+            words = [w for w in normalize_prompt(prompt) if w in self.vocabulary]
+            if not words:
+                return None
+
+            vocab_size = len(self.vocabulary)
+            log_posteriors = {}
+            for trade, count in self.trade_counts.items():
+                counts = self.word_counts[trade]
+                denominator = self.word_totals[trade] + self.alpha * vocab_size
+                log_posteriors[trade] = math.log(count / self.examples) + sum(
+                    math.log((counts.get(w, 0) + self.alpha) / denominator) for w in words
+                )
+
+        best = max(log_posteriors, key=log_posteriors.get)
+        top = log_posteriors[best]
+        normalizer = sum(math.exp(v - top) for v in log_posteriors.values())
+        return best, 1.0 / normalizer
+
+
+def classify_job(prompt: str, model: Optional[NaiveBayesTradeModel] = None) -> Dict:
+    """
+    Full local classification: JobScope fields plus a confidence
+
+    Trade confidence comes from the keyword rules, reinforced when the
+    naive Bayes model agrees and reduced when it disagrees. A prompt with
+    no project-type keyword is marked less certain.
+    """
+    trade, confidence = classify_trade(prompt)
+
+    prediction = model.predict(prompt) if model is not None else None
+    if prediction is not None:
+        model_trade, probability = prediction
+        if model_trade == trade:
+            confidence = 1.0 - (1.0 - confidence) * (1.0 - probability)
+        elif probability > confidence:
+            trade, confidence = model_trade, probability - 0.5 * confidence
+        else:
+            confidence = confidence - 0.5 * probability
+
+    urgency, _ = classify_urgency(prompt)
+    project_type, project_type_matched = classify_project_type(prompt)
+    if not project_type_matched:
+        confidence *= 0.8
+
+    services = [f"{keyword} {project_type}" for keyword in matched_trade_keywords(prompt, trade)[:3]]
+
+    return {
+        "trade": trade,
+        "services": services or [f"{trade.lower()} {project_type}"],
+        "urgency": urgency,
+        "project_type": project_type,
+        "budget_hint": None,
+        "location_requirements": None,
+        "confidence": round(max(0.0, confidence), 3),
+    }
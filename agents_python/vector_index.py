@@ -0,0 +1,440 @@
+"""
+Local approximate nearest-neighbor index of professionals
+IVF (inverted file) index over hashed text embeddings, stored in
+memory-mapped NumPy arrays so it opens instantly and can be shared
+between processes
+"""
+import os
+import json
+import threading
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from prompt_cache import normalize_prompt, vectorize
+
+EMBEDDING_DIM = int(os.getenv("INDEX_EMBEDDING_DIM", "256"))
+
+# Train the IVF quantizer once this many professionals are indexed, and
+# retrain whenever the index doubles in size
+IVF_TRAIN_MIN = int(os.getenv("INDEX_IVF_TRAIN_MIN", "256"))
+IVF_DEFAULT_PROBES = int(os.getenv("INDEX_IVF_PROBES", "8"))
+
+DEFAULT_INDEX_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".cache", "professional_index"
+)
+
+
+def embed_text(text: str, dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """Dense, L2-normalized hashed n-gram embedding of free text"""
+    vec = np.zeros(dim, dtype=np.float32)
+    for bucket, weight in vectorize(normalize_prompt(text)).items():
+        vec[bucket % dim] += weight
+
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+def professional_text(professional: dict) -> str:
+    return " ".join([
+        professional.get("trade", ""),
+        " ".join(professional.get("services", [])),
+        professional.get("name", ""),
+        professional.get("bio") or "",
+    ])
+
+
+def row_key(professional: dict) -> str:
+    """Row key: the scraper stamps the searched trade, so one business can be several rows"""
+    return f"{professional['id']}\t{professional.get('trade') or ''}"
+
+
+def job_scope_text(job_scope: dict) -> str:
+    return " ".join([
+        job_scope.get("trade", ""),
+        " ".join(job_scope.get("services", [])),
+        job_scope.get("project_type") or "",
+    ])
+
+
+class ProfessionalIndex:
+    """
+    IVF index of ProfessionalData records
+
+    Files under ``path``:
+        vectors.f32   float32 (capacity, dim) embeddings
+        lists.i32     int32 IVF list of each row (-1 before training)
+        trades.i32    int32 trade code of each row (metadata filter)
+        states.i32    int32 state code of each row (metadata filter)
+        centroids.npy IVF centroids
+        records.jsonl append-only professional records (last write wins per row)
+        ids.txt       append-only row key of each row, one per line
+        meta.json     row count, capacity and filter vocabularies
+
+    Rows are keyed by (id, trade), so a business found by searches for
+    two trades is filtered, and returned, under each of them.
+
+    One process (IndexerAgent) writes; any number of processes can read
+    and call ``refresh()`` to pick up new rows. Writes and searches are
+    meant to run in worker threads (``asyncio.to_thread``). Searches only
+    wait for in-memory updates: file appends, flushes and IVF retraining
+    happen outside the search lock, serialized by a separate write lock.
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH, dim: int = EMBEDDING_DIM):
+        self.path = path
+        self.dim = dim
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._meta_mtime = 0.0
+        self._records_offset = 0
+        # Row key -> record
+        self.records: Dict[str, dict] = {}
+        self._training = False
+        self._retrained_rows: Optional[set] = None
+
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    # ------------------------------------------------------------------
+    # Loading and storage
+    # ------------------------------------------------------------------
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        meta_path = self._file("meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            self._meta_mtime = os.path.getmtime(meta_path)
+        else:
+            meta = {
+                "dim": self.dim, "count": 0, "capacity": 0, "trained_count": 0,
+                "ids": [], "trades": [], "states": [],
+            }
+
+        if meta["dim"] != self.dim:
+            raise ValueError(f"Index at {self.path} has dim {meta['dim']}, expected {self.dim}")
+
+        self.count = meta["count"]
+        self.capacity = meta["capacity"]
+        self.trained_count = meta["trained_count"]
+        self.trade_vocab: List[str] = meta["trades"]
+        self.state_vocab: List[str] = meta["states"]
+
+        self._map_arrays()
+
+        self.keys: List[str] = self._read_keys(meta)
+        self.row_of = {key: row for row, key in enumerate(self.keys)}
+
+        centroids_path = self._file("centroids.npy")
+        self.centroids = np.load(centroids_path) if os.path.exists(centroids_path) else None
+
+        self._read_records()
+
+    def _map_arrays(self):
+        if self.capacity == 0:
+            self.vectors = np.zeros((0, self.dim), dtype=np.float32)
+            self.lists = np.zeros(0, dtype=np.int32)
+            self.trade_codes = np.zeros(0, dtype=np.int32)
+            self.state_codes = np.zeros(0, dtype=np.int32)
+            return
+
+        self.vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r+",
+                                 shape=(self.capacity, self.dim))
+        self.lists = np.memmap(self._file("lists.i32"), dtype=np.int32, mode="r+",
+                               shape=(self.capacity,))
+        self.trade_codes = np.memmap(self._file("trades.i32"), dtype=np.int32, mode="r+",
+                                     shape=(self.capacity,))
+        self.state_codes = np.memmap(self._file("states.i32"), dtype=np.int32, mode="r+",
+                                     shape=(self.capacity,))
+
+    def _read_keys(self, meta: Dict) -> List[str]:
+        ids_path = self._file("ids.txt")
+        if os.path.exists(ids_path):
+            with open(ids_path) as f:
+                # Lines past ``count`` belong to a write that did not finish
+                lines = [line.rstrip("\n") for line, _ in zip(f, range(self.count))]
+        else:
+            # Older indexes kept the ids in meta.json
+            lines = meta.get("ids", [])
+            if lines:
+                with open(ids_path, "w") as f:
+                    f.writelines(pid + "\n" for pid in lines)
+
+        # Rows written before rows were keyed by trade hold a bare id; the
+        # row's trade code says which trade it was last indexed under
+        return [
+            line if "\t" in line else f"{line}\t{self.trade_vocab[self.trade_codes[row]]}"
+            for row, line in enumerate(lines)
+        ]
+
+    def _read_records(self):
+        records_path = self._file("records.jsonl")
+        if not os.path.exists(records_path):
+            return
+
+        with open(records_path) as f:
+            f.seek(self._records_offset)
+            for line in f:
+                if line.endswith("\n"):
+                    record = json.loads(line)
+                    self.records[row_key(record)] = record
+                    self._records_offset += len(line.encode("utf-8"))
+
+    def _grow(self, needed: int):
+        """Grow the memory-mapped arrays to hold at least ``needed`` rows"""
+        new_capacity = max(needed, self.capacity * 2, 1024)
+
+        for name, dtype, width in (
+            ("vectors.f32", np.float32, self.dim),
+            ("lists.i32", np.int32, 1),
+            ("trades.i32", np.int32, 1),
+            ("states.i32", np.int32, 1),
+        ):
+            shape = (new_capacity, width) if width > 1 else (new_capacity,)
+            tmp_path = self._file(f"{name}.tmp")
+            grown = np.memmap(tmp_path, dtype=dtype, mode="w+", shape=shape)
+            if name == "lists.i32":
+                grown[:] = -1
+            if self.capacity:
+                old = np.memmap(self._file(name), dtype=dtype, mode="r",
+                                shape=(self.capacity, width) if width > 1 else (self.capacity,))
+                grown[:self.capacity] = old
+                del old
+            grown.flush()
+            del grown
+            os.replace(tmp_path, self._file(name))
+
+        self.capacity = new_capacity
+        self._map_arrays()
+
+    def _save_meta(self):
+        meta = {
+            "dim": self.dim,
+            "count": self.count,
+            "capacity": self.capacity,
+            "trained_count": self.trained_count,
+            "trades": self.trade_vocab,
+            "states": self.state_vocab,
+        }
+        tmp_path = self._file("meta.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._file("meta.json"))
+        self._meta_mtime = os.path.getmtime(self._file("meta.json"))
+
+    def refresh(self):
+        """Pick up rows written by another process since the last load"""
+        if self._write_lock.locked():
+            # This process is writing; its rows are already in memory
+            return
+        meta_path = self._file("meta.json")
+        if os.path.exists(meta_path) and os.path.getmtime(meta_path) != self._meta_mtime:
+            with self._lock:
+                self._load()
+
+    def __len__(self) -> int:
+        return self.count
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _code(vocab: List[str], value: str) -> int:
+        try:
+            return vocab.index(value)
+        except ValueError:
+            vocab.append(value)
+            return len(vocab) - 1
+
+    def upsert(self, professionals: List[dict]) -> List[str]:
+        """
+        Insert or update professionals; returns the indexed ids
+
+        Records identical to the stored ones are skipped, so re-scraping
+        the same businesses costs no writes.
+        """
+        ids = [p["id"] for p in professionals]
+        with self._write_lock:
+            with self._lock:
+                professionals = [p for p in professionals if self.records.get(row_key(p)) != p]
+                if not professionals:
+                    return ids
+
+                new_rows = len({row_key(p) for p in professionals} - self.row_of.keys())
+                if self.count + new_rows > self.capacity:
+                    self._grow(self.count + new_rows)
+
+                embeddings = np.stack([embed_text(professional_text(p), self.dim) for p in professionals])
+                rows, new_keys = [], []
+                for professional in professionals:
+                    key = row_key(professional)
+                    row = self.row_of.get(key)
+                    if row is None:
+                        row = self.count
+                        self.count += 1
+                        self.keys.append(key)
+                        self.row_of[key] = row
+                        new_keys.append(key)
+                    rows.append(row)
+                    self.trade_codes[row] = self._code(self.trade_vocab, professional.get("trade", ""))
+                    self.state_codes[row] = self._code(self.state_vocab, (professional.get("state") or "").upper())
+
+                rows = np.array(rows, dtype=np.int64)
+                self.vectors[rows] = embeddings
+                if self.centroids is not None:
+                    self.lists[rows] = np.argmax(embeddings @ self.centroids.T, axis=1)
+                if self._retrained_rows is not None:
+                    self._retrained_rows.update(rows.tolist())
+
+                lines = [json.dumps(professional) + "\n" for professional in professionals]
+                for professional in professionals:
+                    self.records[row_key(professional)] = professional
+                self._records_offset += sum(len(line.encode("utf-8")) for line in lines)
+
+                needs_training = (
+                    not self._training
+                    and self.count >= IVF_TRAIN_MIN
+                    and self.count >= 2 * max(self.trained_count, 1)
+                )
+
+            # Rows are written before meta.json publishes the new count
+            if new_keys:
+                with open(self._file("ids.txt"), "a") as f:
+                    f.writelines(key + "\n" for key in new_keys)
+            with open(self._file("records.jsonl"), "a") as f:
+                f.writelines(lines)
+
+            self.vectors.flush()
+            self.lists.flush()
+            self.trade_codes.flush()
+            self.state_codes.flush()
+            self._save_meta()
+
+        if needs_training:
+            self.train()
+        return ids
+
+    def train(self, iterations: int = 10, sample_size: int = 20000):
+        """
+        Train IVF centroids with spherical k-means and reassign all rows
+
+        k-means and the reassignment run on a snapshot without holding the
+        lock; only swapping in the result does, and rows written meanwhile
+        are reassigned then.
+        """
+        with self._lock:
+            if self.count == 0 or self._training:
+                return
+            self._training = True
+            self._retrained_rows = set()
+            count = self.count
+            rng = np.random.default_rng(0)
+            sample_rows = rng.choice(count, size=min(count, sample_size), replace=False)
+            sample = np.array(self.vectors[np.sort(sample_rows)])
+            vectors = self.vectors
+
+        try:
+            n_lists = int(min(1024, max(1, np.sqrt(count))))
+            centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+            for _ in range(iterations):
+                assignments = np.argmax(sample @ centroids.T, axis=1)
+                for c in range(n_lists):
+                    members = sample[assignments == c]
+                    if len(members):
+                        centroid = members.sum(axis=0)
+                        norm = np.linalg.norm(centroid)
+                        centroids[c] = centroid / norm if norm else centroid
+            centroids = centroids.astype(np.float32)
+
+            # Reassign in chunks to bound memory
+            lists = np.empty(count, dtype=np.int32)
+            for start in range(0, count, 8192):
+                end = min(start + 8192, count)
+                lists[start:end] = np.argmax(vectors[start:end] @ centroids.T, axis=1)
+
+            with self._write_lock:
+                with self._lock:
+                    self.lists[:count] = lists
+                    changed = sorted(self._retrained_rows | set(range(count, self.count)))
+                    if changed:
+                        self.lists[changed] = np.argmax(self.vectors[changed] @ centroids.T, axis=1)
+                    self.centroids = centroids
+                    self.trained_count = count
+
+                self.lists.flush()
+                np.save(self._file("centroids.npy"), centroids)
+                self._save_meta()
+        finally:
+            with self._lock:
+                self._training = False
+                self._retrained_rows = None
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int = 50,
+        trade: Optional[str] = None,
+        state: Optional[str] = None,
+        n_probe: int = IVF_DEFAULT_PROBES,
+    ) -> List[Tuple[dict, float]]:
+        """Top-k (record, similarity) pairs, optionally filtered by trade/state"""
+        with self._lock:
+            if self.count == 0:
+                return []
+
+            mask = np.ones(self.count, dtype=bool)
+            if self.centroids is not None:
+                probes = np.argsort(-(self.centroids @ query))[:n_probe]
+                mask &= np.isin(self.lists[:self.count], probes)
+            if trade:
+                if trade not in self.trade_vocab:
+                    return []
+                mask &= self.trade_codes[:self.count] == self.trade_vocab.index(trade)
+            if state:
+                state = state.upper()
+                if state not in self.state_vocab:
+                    return []
+                mask &= self.state_codes[:self.count] == self.state_vocab.index(state)
+
+            rows = np.flatnonzero(mask)
+            if len(rows) == 0:
+                return []
+
+            scores = self.vectors[rows] @ query
+            if len(rows) > k:
+                top = np.argpartition(-scores, k)[:k]
+            else:
+                top = np.arange(len(rows))
+            top = top[np.argsort(-scores[top])]
+
+            return [
+                (self.records[self.keys[rows[i]]], float(scores[i]))
+                for i in top
+                if self.keys[rows[i]] in self.records
+            ]
+
+    def search_job(self, job_scope: dict, k: int = 50, state: Optional[str] = None) -> List[dict]:
+        """Professionals most similar to a job scope, filtered by its trade"""
+        query = embed_text(job_scope_text(job_scope), self.dim)
+        return [record for record, _ in self.search(query, k=k, trade=job_scope.get("trade"), state=state)]
+
+
+_professional_index: Optional[ProfessionalIndex] = None
+
+
+def get_professional_index() -> ProfessionalIndex:
+    """Process-wide index shared by IndexerAgent and MatcherAgent"""
+    global _professional_index
+
+    if _professional_index is None:
+        _professional_index = ProfessionalIndex(
+            os.getenv("PROFESSIONAL_INDEX_PATH", DEFAULT_INDEX_PATH)
+        )
+    return _professional_index